@@ -0,0 +1,253 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set
+
+from singleflight import SingleFlight
+from wildberries_parser.serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+
+class CachePolicy:
+    """Параметры кэширования для одного типа ресурса"""
+
+    def __init__(self, ttl: float, stale_ttl: float = 0, disk: bool = False):
+        self.ttl = ttl              # сколько секунд значение считается свежим
+        self.stale_ttl = stale_ttl  # сколько еще секунд можно отдавать устаревшее значение
+        self.disk = disk            # сохранять ли значение на диск
+
+
+class ResponseCache:
+    """LRU-кэш в памяти с TTL, дисковым уровнем и stale-while-revalidate.
+
+    Память ограничена и числом записей (max_entries), и суммарным размером
+    значений (max_memory_bytes, по длине сериализованного JSON).
+
+    Свежее значение отдается сразу. Устаревшее (в пределах stale_ttl) тоже
+    отдается сразу, а обновление запускается одной фоновой задачей на ключ.
+    Одновременные промахи по одному ключу ждут одну общую загрузку.
+
+    Дисковый уровень читается и пишется в потоках (asyncio.to_thread); не чаще
+    раза в sweep_interval секунд с диска удаляются файлы старше ttl + stale_ttl
+    своего ресурса и самые старые сверх max_disk_bytes.
+    """
+
+    def __init__(self, policies: Dict[str, CachePolicy], max_entries: int = 10000,
+                 max_memory_bytes: int = 256 * 1024 ** 2,
+                 disk_dir: Optional[Path] = None, max_disk_bytes: int = 512 * 1024 ** 2,
+                 sweep_interval: float = 3600):
+        self.policies = policies
+        self.max_entries = max_entries
+        self.max_memory_bytes = max_memory_bytes
+        self._memory_bytes = 0
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.max_disk_bytes = max_disk_bytes
+        self.sweep_interval = sweep_interval
+        self._swept_at = 0.0
+        self._disk_tasks: Set[asyncio.Task] = set()
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # (value, stored_at, size)
+        self._refreshing: Dict[tuple, asyncio.Task] = {}
+        self._flights = SingleFlight()
+        self._stats: Dict[str, Dict[str, int]] = {
+            resource: {"hits": 0, "stale_hits": 0, "misses": 0} for resource in policies
+        }
+
+    async def get_or_fetch(self, resource: str, key: Hashable,
+                           fetcher: Callable[[], Awaitable[Any]]) -> Any:
+        policy = self.policies[resource]
+        cache_key = (resource, key)
+        entry = await self._get_entry(cache_key, policy)
+
+        if entry is not None:
+            value, stored_at, _ = entry
+            age = time.time() - stored_at
+            if age < policy.ttl:
+                self._stats[resource]["hits"] += 1
+                return value
+            if age < policy.ttl + policy.stale_ttl:
+                self._stats[resource]["stale_hits"] += 1
+                self._schedule_refresh(cache_key, fetcher)
+                return value
+
+        self._stats[resource]["misses"] += 1
+        return await self._fetch(cache_key, fetcher)
+
+    async def peek(self, resource: str, key: Hashable) -> Any:
+        """Возвращает закэшированное значение (даже устаревшее) без загрузки"""
+        entry = await self._get_entry((resource, key), self.policies[resource])
+        return entry[0] if entry else None
+
+    async def lookup(self, resource: str, key: Hashable) -> Any:
+        """Свежее значение без загрузки (None при промахе); учитывается в статистике"""
+        policy = self.policies[resource]
+        entry = await self._get_entry((resource, key), policy)
+        if entry is not None and time.time() - entry[1] < policy.ttl:
+            self._stats[resource]["hits"] += 1
+            return entry[0]
+        self._stats[resource]["misses"] += 1
+        return None
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Счетчики попаданий и промахов get_or_fetch по типам ресурсов"""
+        result = {}
+        for resource, counters in self._stats.items():
+            total = sum(counters.values())
+            hit_rate = (counters["hits"] + counters["stale_hits"]) / total if total else 0.0
+            result[resource] = {**counters, "hit_rate": round(hit_rate, 4)}
+        return result
+
+    def set(self, resource: str, key: Hashable, value: Any):
+        self._store((resource, key), value, time.time())
+
+    def clear(self):
+        """Очищает уровень в памяти (диск не трогает)"""
+        self._entries.clear()
+        self._memory_bytes = 0
+
+    async def flush(self):
+        """Дожидается начатых записей на диск (при остановке приложения)"""
+        while self._disk_tasks:
+            await asyncio.gather(*self._disk_tasks, return_exceptions=True)
+
+    async def _fetch(self, cache_key, fetcher):
+        return await self._flights.do(cache_key, lambda: self._load(cache_key, fetcher))
+
+    async def _load(self, cache_key, fetcher):
+        value = await fetcher()
+        # Пустые результаты (ошибки, 404) не кэшируем
+        if value:
+            self._store(cache_key, value, time.time())
+        return value
+
+    def _schedule_refresh(self, cache_key, fetcher):
+        if cache_key in self._refreshing or self._flights.in_flight(cache_key):
+            return
+
+        async def _refresh():
+            try:
+                await self._fetch(cache_key, fetcher)
+            except Exception as e:
+                logger.warning(f"Background refresh of {cache_key} failed: {e}")
+            finally:
+                self._refreshing.pop(cache_key, None)
+
+        self._refreshing[cache_key] = asyncio.create_task(_refresh())
+
+    async def _get_entry(self, cache_key, policy: CachePolicy):
+        entry = self._entries.get(cache_key)
+        if entry is not None:
+            self._entries.move_to_end(cache_key)
+        elif policy.disk and self.disk_dir is not None:
+            entry = await asyncio.to_thread(self._read_disk, cache_key)
+            # Пока файл читался, могло появиться более новое значение
+            if cache_key in self._entries:
+                entry = self._entries[cache_key]
+            elif entry is not None and not self._expired(entry, policy):
+                self._remember(cache_key, entry)
+
+        if entry is not None and self._expired(entry, policy):
+            return None
+        return entry
+
+    @staticmethod
+    def _expired(entry, policy: CachePolicy) -> bool:
+        return time.time() - entry[1] >= policy.ttl + policy.stale_ttl
+
+    def _store(self, cache_key, value, stored_at):
+        self._remember(cache_key, (value, stored_at, len(dumps(value))))
+        if self.policies[cache_key[0]].disk and self.disk_dir is not None:
+            self._run_disk_task(self._write_disk, cache_key, value, stored_at)
+            if stored_at - self._swept_at >= self.sweep_interval:
+                self._swept_at = stored_at
+                self._run_disk_task(self._sweep_disk)
+
+    def _run_disk_task(self, func, *args):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:  # вне цикла событий (скрипты) - синхронно
+            func(*args)
+            return
+        task = loop.create_task(asyncio.to_thread(func, *args))
+        self._disk_tasks.add(task)
+        task.add_done_callback(self._disk_tasks.discard)
+
+    def _remember(self, cache_key, entry):
+        old = self._entries.pop(cache_key, None)
+        if old is not None:
+            self._memory_bytes -= old[2]
+        if entry[2] > self.max_memory_bytes:
+            return  # одно значение больше всего бюджета - только на диске
+        self._entries[cache_key] = entry
+        self._memory_bytes += entry[2]
+        while len(self._entries) > self.max_entries or self._memory_bytes > self.max_memory_bytes:
+            self._memory_bytes -= self._entries.popitem(last=False)[1][2]
+
+    def _disk_path(self, cache_key) -> Optional[Path]:
+        if self.disk_dir is None:
+            return None
+        resource, key = cache_key
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return self.disk_dir / resource / digest[:2] / f"{digest}.json"
+
+    def _read_disk(self, cache_key):
+        path = self._disk_path(cache_key)
+        if path is None or not path.exists():
+            return None
+        try:
+            raw = path.read_bytes()
+            payload = loads(raw)
+            return payload['value'], payload['stored_at'], len(raw)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Broken cache file {path}: {e}")
+            return None
+
+    def _write_disk(self, cache_key, value, stored_at):
+        path = self._disk_path(cache_key)
+        if path is None:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Свое имя временного файла у каждого потока: записи одного ключа не мешают друг другу
+            tmp_path = path.with_suffix(f'.{threading.get_ident()}.tmp')
+            tmp_path.write_bytes(dumps({'value': value, 'stored_at': stored_at}))
+            os.replace(tmp_path, path)
+        except (OSError, TypeError) as e:
+            logger.warning(f"Failed to write cache file {path}: {e}")
+
+    def _sweep_disk(self) -> int:
+        """Удаляет просроченные файлы, затем самые старые, пока объем не уложится в max_disk_bytes"""
+        now = time.time()
+        removed = 0
+        files = []
+        for resource, policy in self.policies.items():
+            if not policy.disk:
+                continue
+            max_age = policy.ttl + policy.stale_ttl
+            for path in (self.disk_dir / resource).glob('*/*.json'):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                if now - stat.st_mtime >= max_age:
+                    path.unlink(missing_ok=True)
+                    removed += 1
+                else:
+                    files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        if total > self.max_disk_bytes:
+            for _, size, path in sorted(files):
+                if total <= self.max_disk_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+                removed += 1
+        if removed:
+            logger.info(f"Removed {removed} cache files, {total} bytes left on disk")
+        return removed
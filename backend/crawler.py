@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+# Пакет wildberries_parser лежит в корне проекта, а API запускается из backend/
+PROJECT_ROOT = Path(__file__).parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+os.environ.setdefault("SCRAPY_SETTINGS_MODULE", "wildberries_parser.settings")
+
+from itemadapter import ItemAdapter
+from scrapy import signals
+from scrapy.crawler import CrawlerRunner
+from scrapy.utils.project import get_project_settings
+from scrapy.utils.reactor import install_reactor
+
+logger = logging.getLogger(__name__)
+
+
+class CrawlError(Exception):
+    """Паук завершился с ошибкой"""
+
+
+class CrawlEngine:
+    """Долгоживущий Twisted reactor в отдельном потоке для запуска пауков внутри API.
+
+    Пауки запускаются через общий CrawlerRunner, поэтому несколько краулов
+    выполняются параллельно, а собранные items возвращаются в память без файлов.
+    """
+
+    def __init__(self, max_concurrent_crawls: int = 8, settings_overrides: Optional[Dict[str, Any]] = None):
+        self.max_concurrent_crawls = max_concurrent_crawls
+        # FEEDS из настроек проекта рассчитаны на запуск через CLI, внутри API они не нужны
+        self.settings_overrides = {"FEEDS": {}, "LOG_LEVEL": "INFO", **(settings_overrides or {})}
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._reactor = None
+        self._runner: Optional[CrawlerRunner] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def start(self):
+        """Запускает reactor в фоновом потоке и ждет его готовности"""
+        if self._thread is not None:
+            return
+        self._semaphore = asyncio.Semaphore(self.max_concurrent_crawls)
+        self._thread = threading.Thread(target=self._run_reactor, name="scrapy-reactor", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        logger.info("Crawl engine started")
+
+    def _run_reactor(self):
+        settings = get_project_settings()
+        settings.setdict(self.settings_overrides, priority="cmdline")
+
+        if settings.get("TWISTED_REACTOR"):
+            install_reactor(settings["TWISTED_REACTOR"], settings.get("ASYNCIO_EVENT_LOOP"))
+        from twisted.internet import reactor
+
+        self._reactor = reactor
+        self._runner = CrawlerRunner(settings)
+        reactor.callWhenRunning(self._ready.set)
+        reactor.run(installSignalHandlers=False)
+
+    def stop(self):
+        """Останавливает все активные краулы и reactor"""
+        if self._thread is None:
+            return
+
+        def _shutdown():
+            d = self._runner.stop()
+            d.addBoth(lambda _: self._reactor.stop())
+
+        self._reactor.callFromThread(_shutdown)
+        self._thread.join(timeout=30)
+        self._thread = None
+        logger.info("Crawl engine stopped")
+
+    async def crawl(self, spider: str, timeout: float = 300, **spider_kwargs) -> List[Dict[str, Any]]:
+        """Запускает паука по имени и возвращает собранные items"""
+        return [item async for item in self.stream(spider, timeout=timeout, **spider_kwargs)]
+
+    async def stream(self, spider: str, timeout: float = 300, **spider_kwargs) -> AsyncIterator[Dict[str, Any]]:
+        """Запускает паука и отдает items по мере их получения.
+
+        Если потребитель прекращает чтение раньше времени, краул останавливается.
+        """
+        if self._thread is None:
+            raise CrawlError("Crawl engine is not running")
+
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            queue: asyncio.Queue = asyncio.Queue()
+            job: Dict[str, Any] = {}
+            finished = False
+
+            def put(message):
+                loop.call_soon_threadsafe(queue.put_nowait, message)
+
+            self._reactor.callFromThread(self._schedule, spider, spider_kwargs, put, job)
+            deadline = loop.time() + timeout
+            try:
+                while True:
+                    message = await asyncio.wait_for(queue.get(), max(deadline - loop.time(), 0))
+                    if message is _FINISHED:
+                        finished = True
+                        return
+                    if isinstance(message, CrawlError):
+                        finished = True
+                        raise message
+                    yield message
+            finally:
+                if not finished:
+                    self._reactor.callFromThread(self._stop_crawler, job)
+
+    def _schedule(self, spider, spider_kwargs, put, job):
+        """Выполняется в потоке reactor: создает краулер и передает items в очередь"""
+
+        def on_item_scraped(item, response, spider):
+            put(ItemAdapter(item).asdict())
+
+        try:
+            crawler = self._runner.create_crawler(spider)
+            crawler.signals.connect(on_item_scraped, signal=signals.item_scraped, weak=False)
+            job["crawler"] = crawler
+            d = self._runner.crawl(crawler, **spider_kwargs)
+        except Exception as e:
+            put(CrawlError(str(e)))
+            return
+
+        d.addCallbacks(lambda _: put(_FINISHED), lambda failure: put(CrawlError(str(failure.value))))
+
+    @staticmethod
+    def _stop_crawler(job):
+        crawler = job.get("crawler")
+        if crawler is not None and crawler.crawling:
+            crawler.stop()
+
+
+# Маркер завершения краула в очереди items
+_FINISHED = object()
+
+
+crawl_engine = CrawlEngine()
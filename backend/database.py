@@ -1,8 +1,14 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime
+import asyncio
+import logging
+from collections import Counter
+from sqlalchemy import Column, Index, Integer, String, DateTime, event, func, insert, select, text, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
@@ -19,19 +25,170 @@ class SearchHistory(Base):
     max_price = Column(Integer, nullable=True)
     search_date = Column(DateTime, default=datetime.utcnow)
 
+    # id в конце индексов - для keyset-пагинации по (search_date, id)
+    __table_args__ = (
+        Index('ix_search_history_date', 'search_date', 'id'),
+        Index('ix_search_history_query', 'query', 'search_date', 'id'),
+        Index('ix_search_history_category', 'category', 'search_date', 'id'),
+    )
+
+
+class SearchQueryStats(Base):
+    """Сколько раз искали каждый запрос (обновляется вместе с записью истории)"""
+    __tablename__ = 'search_query_stats'
+
+    query = Column(String(255), primary_key=True)
+    searches = Column(Integer, nullable=False, default=0)
+    last_searched = Column(DateTime, nullable=False)
+
+    __table_args__ = (Index('ix_search_query_stats_searches', 'searches'),)
+
+
+class SearchHourlyStats(Base):
+    """Число поисков за каждый час (UTC)"""
+    __tablename__ = 'search_hourly_stats'
+
+    hour = Column(DateTime, primary_key=True)
+    searches = Column(Integer, nullable=False, default=0)
+
+
+engine = create_async_engine('sqlite+aiosqlite:///searches.db')
+SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL: чтение истории не ждет записи пакета
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
 
-engine = create_engine('sqlite:///searches.db')
-Base.metadata.create_all(engine)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def _create_schema(conn):
+    Base.metadata.create_all(conn)
+    # create_all не добавляет индексы к уже существующей таблице
+    for index in SearchHistory.__table__.indexes:
+        index.create(conn, checkfirst=True)
 
 
-def get_db():
+async def init_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(_create_schema)
+        # Агрегаты для истории, записанной до их появления, считаются один раз
+        has_stats = await conn.scalar(select(SearchQueryStats.query).limit(1))
+        if has_stats is None and await conn.scalar(select(SearchHistory.id).limit(1)) is not None:
+            logger.info("Building search history rollups")
+            await conn.execute(text(
+                "INSERT INTO search_query_stats (query, searches, last_searched) "
+                "SELECT query, COUNT(*), MAX(search_date) FROM search_history GROUP BY query"
+            ))
+            await conn.execute(text(
+                "INSERT INTO search_hourly_stats (hour, searches) "
+                "SELECT strftime('%Y-%m-%d %H:00:00.000000', search_date), COUNT(*) "
+                "FROM search_history GROUP BY 1"
+            ))
+
+
+async def get_db():
     """Генератор сессий для работы с базой данных"""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+    async with SessionLocal() as session:
+        yield session
+
+
+class HistoryWriter:
+    """Очередь записей истории поиска с групповым коммитом.
+
+    save_search только кладет строку в очередь; фоновая задача забирает все
+    накопившиеся строки (до batch_size, ожидая еще flush_interval секунд после
+    первой) и вставляет их одной транзакцией вместе с приращениями агрегатов
+    search_query_stats и search_hourly_stats.
+    """
+
+    def __init__(self, batch_size: int = 500, flush_interval: float = 0.05, max_pending: int = 100000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._batch: List[Dict[str, Any]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._writing: Optional[asyncio.Future] = None
+        self.dropped = 0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Останавливает запись, дописав все, что осталось в очереди"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._writing is not None:
+            await self._writing
+        while self._batch or not self._queue.empty():
+            await self._flush()
+
+    def put(self, row: Dict[str, Any]):
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Search history queue is full, {self.dropped} rows dropped")
+
+    async def _run(self):
+        while True:
+            self._batch.append(await self._queue.get())
+            # Ждем, пока к первой строке добавятся другие
+            await asyncio.sleep(self.flush_interval)
+            await self._flush()
+
+    async def _flush(self):
+        rows = self._batch
+        while len(rows) < self.batch_size and not self._queue.empty():
+            rows.append(self._queue.get_nowait())
+        self._batch = []
+        # shield: остановка во время вставки не теряет пакет
+        self._writing = asyncio.ensure_future(self._write(rows))
+        await asyncio.shield(self._writing)
+
+    async def _write(self, rows: List[Dict[str, Any]]):
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(insert(SearchHistory), rows)
+                await _update_rollups(conn, rows)
+        except Exception as e:
+            logger.error(f"Failed to save {len(rows)} search history rows: {e}")
+
+
+async def _update_rollups(conn, rows: List[Dict[str, Any]]):
+    queries = Counter(row["query"] for row in rows)
+    last_searched = {}
+    for row in rows:
+        last_searched[row["query"]] = max(row["search_date"], last_searched.get(row["query"], row["search_date"]))
+    stmt = sqlite_insert(SearchQueryStats)
+    await conn.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[SearchQueryStats.query],
+            set_={
+                "searches": SearchQueryStats.searches + stmt.excluded.searches,
+                "last_searched": func.max(SearchQueryStats.last_searched, stmt.excluded.last_searched),
+            }
+        ),
+        [{"query": q, "searches": n, "last_searched": last_searched[q]} for q, n in queries.items()]
+    )
+
+    hours = Counter(row["search_date"].replace(minute=0, second=0, microsecond=0) for row in rows)
+    stmt = sqlite_insert(SearchHourlyStats)
+    await conn.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[SearchHourlyStats.hour],
+            set_={"searches": SearchHourlyStats.searches + stmt.excluded.searches}
+        ),
+        [{"hour": hour, "searches": n} for hour, n in hours.items()]
+    )
+
+
+history_writer = HistoryWriter()
 
 
 def save_search(
@@ -42,38 +199,123 @@ def save_search(
         min_price: Optional[float] = None,
         max_price: Optional[float] = None
 ):
-    """Сохраняет историю поиска в базу данных"""
-    with SessionLocal() as session:
-        search = SearchHistory(
-            query=query,
-            category=category,
-            pages=pages,
-            items_count=limit,
-            min_price=int(min_price * 100) if min_price is not None else None,
-            max_price=int(max_price * 100) if max_price is not None else None
-        )
-        session.add(search)
-        session.commit()
-
-
-def get_history(limit: int = 100) -> List[Dict[str, Any]]:
-    """Получает историю поисковых запросов в виде словарей"""
-    with SessionLocal() as session:
-        searches = session.query(SearchHistory) \
-            .order_by(SearchHistory.search_date.desc()) \
-            .limit(limit) \
-            .all()
+    """Ставит запись истории поиска в очередь на запись (не блокирует)"""
+    history_writer.put({
+        "query": query,
+        "category": category,
+        "pages": pages,
+        "items_count": limit,
+        "min_price": int(min_price * 100) if min_price is not None else None,
+        "max_price": int(max_price * 100) if max_price is not None else None,
+        "search_date": datetime.utcnow(),
+    })
+
+
+# Сколько разных запросов просматривает поиск истории по префиксу
+HISTORY_PREFIX_MAX_QUERIES = 50
+
+
+def _history_row(s: SearchHistory) -> Dict[str, Any]:
+    return {
+        "id": s.id,
+        "query": s.query,
+        "category": s.category,
+        "pages": s.pages,
+        "items_count": s.items_count,
+        "min_price": s.min_price,
+        "max_price": s.max_price,
+        "search_date": s.search_date
+    }
+
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    return f"{row['search_date'].isoformat()}_{row['id']}"
+
 
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """(search_date, id) последней строки предыдущей страницы; ValueError, если курсор испорчен"""
+    date, _, row_id = cursor.rpartition('_')
+    return datetime.fromisoformat(date), int(row_id)
+
+
+async def get_history(
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        query: Optional[str] = None,
+        query_prefix: Optional[str] = None,
+        category: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Страница истории поиска (новые сверху) и курсор следующей страницы.
+
+    Пагинация по (search_date, id), поэтому страница читается по индексу
+    независимо от того, насколько она далеко от начала. query - точное
+    совпадение (индекс query, search_date, id). query_prefix раскрывается в
+    HISTORY_PREFIX_MAX_QUERIES последних подходящих запросов из search_query_stats:
+    по каждому читается не больше limit + 1 строк, страницы сливаются.
+    """
+    conditions = []
+    if cursor:
+        conditions.append(tuple_(SearchHistory.search_date, SearchHistory.id) < decode_cursor(cursor))
+    if category:
+        conditions.append(SearchHistory.category == category)
+    if since is not None:
+        conditions.append(SearchHistory.search_date >= since)
+    if until is not None:
+        conditions.append(SearchHistory.search_date < until)
+
+    def page(*where):
+        return (select(SearchHistory).where(*conditions, *where)
+                .order_by(SearchHistory.search_date.desc(), SearchHistory.id.desc()).limit(limit + 1))
+
+    async with SessionLocal() as session:
         # Преобразуем объекты в словари до закрытия сессии
+        if query:
+            rows = [_history_row(s) for s in (await session.execute(page(SearchHistory.query == query))).scalars()]
+        elif query_prefix:
+            # Диапазон вместо LIKE: LIKE в SQLite без учета регистра и не использует индекс
+            queries = (await session.execute(
+                select(SearchQueryStats.query)
+                .where(SearchQueryStats.query >= query_prefix,
+                       SearchQueryStats.query < query_prefix + '\U0010ffff')
+                .order_by(SearchQueryStats.last_searched.desc())
+                .limit(HISTORY_PREFIX_MAX_QUERIES)
+            )).scalars().all()
+            rows = []
+            for matched in queries:
+                rows += [_history_row(s) for s in (await session.execute(page(SearchHistory.query == matched))).scalars()]
+            rows.sort(key=lambda row: (row['search_date'], row['id']), reverse=True)
+            rows = rows[:limit + 1]
+        else:
+            rows = [_history_row(s) for s in (await session.execute(page())).scalars()]
+
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+async def get_top_queries(limit: int = 20, query_prefix: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Самые частые запросы из агрегата search_query_stats"""
+    stmt = select(SearchQueryStats)
+    if query_prefix:
+        stmt = stmt.where(SearchQueryStats.query >= query_prefix,
+                          SearchQueryStats.query < query_prefix + '\U0010ffff')
+    stmt = stmt.order_by(SearchQueryStats.searches.desc()).limit(limit)
+    async with SessionLocal() as session:
         return [
-            {
-                "query": s.query,
-                "category": s.category,
-                "pages": s.pages,
-                "items_count": s.items_count,
-                "min_price": s.min_price,
-                "max_price": s.max_price,
-                "search_date": s.search_date
-            }
-            for s in searches
-        ]
\ No newline at end of file
+            {"query": s.query, "searches": s.searches, "last_searched": s.last_searched}
+            for s in (await session.execute(stmt)).scalars()
+        ]
+
+
+async def get_hourly_counts(since: Optional[datetime] = None,
+                            until: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Число поисков по часам за период из агрегата search_hourly_stats"""
+    stmt = select(SearchHourlyStats)
+    if since is not None:
+        stmt = stmt.where(SearchHourlyStats.hour >= since.replace(minute=0, second=0, microsecond=0))
+    if until is not None:
+        stmt = stmt.where(SearchHourlyStats.hour < until)
+    stmt = stmt.order_by(SearchHourlyStats.hour)
+    async with SessionLocal() as session:
+        return [{"hour": s.hour, "searches": s.searches} for s in (await session.execute(stmt)).scalars()]
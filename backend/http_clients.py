@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Настройки пула (можно переопределить через переменные окружения)
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "200"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "50"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", "16"))
+
+MISTRAL_API_URL = os.getenv("MISTRAL_API_URL", "https://api.mistral.ai")
+MISTRAL_TIMEOUT = float(os.getenv("MISTRAL_TIMEOUT", "30"))
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class PerHostLimitTransport(httpx.AsyncHTTPTransport):
+    """Транспорт, ограничивающий число одновременных запросов к одному хосту"""
+
+    def __init__(self, max_per_host: int = HTTP_MAX_PER_HOST, **kwargs):
+        super().__init__(**kwargs)
+        self._semaphores = defaultdict(lambda: asyncio.Semaphore(max_per_host))
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        async with self._semaphores[request.url.host]:
+            return await super().handle_async_request(request)
+
+
+def _make_client(timeout: float, **kwargs) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    transport = PerHostLimitTransport(http2=HTTP2_AVAILABLE, limits=limits)
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(timeout, connect=HTTP_CONNECT_TIMEOUT),
+        **kwargs
+    )
+
+
+class HttpClients:
+    """Пул HTTP-клиентов на время жизни приложения.
+
+    Соединения с wbbasket.ru и api.mistral.ai переиспользуются между запросами,
+    поэтому DNS, TCP и TLS оплачиваются один раз на соединение, а не на запрос.
+    """
+
+    def __init__(self):
+        self.wb: Optional[httpx.AsyncClient] = None
+        self.mistral: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        self.wb = _make_client(HTTP_TIMEOUT)
+        self.mistral = _make_client(MISTRAL_TIMEOUT, base_url=MISTRAL_API_URL)
+        logger.info(f"HTTP clients started (http2={HTTP2_AVAILABLE})")
+
+    async def close(self):
+        for client in (self.wb, self.mistral):
+            if client is not None:
+                await client.aclose()
+        self.wb = self.mistral = None
+
+
+http_clients = HttpClients()
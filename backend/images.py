@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+try:
+    from PIL import Image
+except ImportError:  # без Pillow миниатюры не строятся, отдается оригинал
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_WIDTHS = (96, 200, 300)
+
+# Расширение файла в кэше по типу содержимого
+IMAGE_EXTENSIONS = {"image/webp": ".webp", "image/jpeg": ".jpg", "image/png": ".png", "image/gif": ".gif"}
+
+
+def detect_content_type(data: bytes) -> str:
+    """MIME-тип изображения по сигнатуре (CDN отдает и webp, и jpeg)"""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    return "application/octet-stream"
+
+
+class ImageCache:
+    """Дисковый content-addressed кэш изображений с LRU-вытеснением по объему.
+
+    Файлы хранятся по sha256 содержимого (одинаковые картинки - один файл),
+    ключи вида "<product_id>/<n>/<size>" ссылаются на них через индекс в SQLite.
+    Время последнего обращения копится в памяти и пишется в индекс пачкой
+    (не чаще touch_interval секунд), а не коммитом на каждое попадание.
+    """
+
+    def __init__(self, root, max_bytes: int = 2 * 1024 ** 3, touch_interval: float = 30.0):
+        self.root = Path(root)
+        self.blobs_dir = self.root / "blobs"
+        self.blobs_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {}  # sha -> время обращения, еще не записанное в индекс
+        self._touched_flushed = time.monotonic()
+        self._conn = sqlite3.connect(str(self.root / "index.sqlite3"), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            "sha TEXT PRIMARY KEY, size INTEGER NOT NULL, last_access REAL NOT NULL, content_type TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_blobs_access ON blobs (last_access)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS image_keys (key TEXT PRIMARY KEY, sha TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_image_keys_sha ON image_keys (sha)")
+        self._migrate_content_types()
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def _migrate_content_types(self):
+        """Кэш прошлой версии: все файлы назывались .webp, тип не хранился"""
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(blobs)")]
+        if "content_type" not in columns:
+            self._conn.execute("ALTER TABLE blobs ADD COLUMN content_type TEXT")
+        for (sha,) in self._conn.execute("SELECT sha FROM blobs WHERE content_type IS NULL").fetchall():
+            legacy_path = self.blobs_dir / sha[:2] / f"{sha}.webp"
+            try:
+                with open(legacy_path, "rb") as f:
+                    content_type = detect_content_type(f.read(12))
+                os.replace(legacy_path, self.blob_path(sha, content_type))
+            except OSError:
+                self._conn.execute("DELETE FROM blobs WHERE sha = ?", (sha,))
+                self._conn.execute("DELETE FROM image_keys WHERE sha = ?", (sha,))
+                continue
+            self._conn.execute("UPDATE blobs SET content_type = ? WHERE sha = ?", (content_type, sha))
+
+    def blob_path(self, sha: str, content_type: str) -> Path:
+        return self.blobs_dir / sha[:2] / f"{sha}{IMAGE_EXTENSIONS.get(content_type, '.bin')}"
+
+    def get(self, key: str) -> Optional[Tuple[str, str]]:
+        """(sha, content_type) изображения по ключу, если файл есть в кэше"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT b.sha, b.content_type FROM image_keys k JOIN blobs b USING (sha) WHERE k.key = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            sha, content_type = row
+            if not self.blob_path(sha, content_type).exists():
+                self._conn.execute("DELETE FROM image_keys WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._touched[sha] = time.time()
+            if time.monotonic() - self._touched_flushed >= self.touch_interval:
+                self._flush_touched()
+                self._conn.commit()
+            return sha, content_type
+
+    def put(self, key: str, data: bytes) -> Tuple[str, str]:
+        sha = hashlib.sha256(data).hexdigest()
+        content_type = detect_content_type(data)
+        path = self.blob_path(sha, content_type)
+        with self._lock:
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_suffix(".tmp")
+                tmp_path.write_bytes(data)
+                os.replace(tmp_path, path)
+            inserted = self._conn.execute(
+                "INSERT OR IGNORE INTO blobs (sha, size, last_access, content_type) VALUES (?, ?, ?, ?)",
+                (sha, len(data), time.time(), content_type)
+            ).rowcount
+            if inserted:
+                self._total_bytes += len(data)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO image_keys (key, sha) VALUES (?, ?)", (key, sha)
+            )
+            self._evict()
+        return sha, content_type
+
+    async def get_async(self, key: str) -> Optional[Tuple[str, str]]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def put_async(self, key: str, data: bytes) -> Tuple[str, str]:
+        return await asyncio.to_thread(self.put, key, data)
+
+    def flush(self):
+        """Записывает накопленные времена обращений (при остановке приложения)"""
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+
+    def _flush_touched(self):
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE blobs SET last_access = MAX(last_access, ?) WHERE sha = ?",
+                [(accessed, sha) for sha, accessed in self._touched.items()]
+            )
+            self._touched = {}
+        self._touched_flushed = time.monotonic()
+
+    def _evict(self):
+        """Удаляет давно не запрошенные файлы, пока объем не уложится в бюджет"""
+        if self._total_bytes > self.max_bytes:
+            # Порядок вытеснения должен учитывать недавние попадания
+            self._flush_touched()
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT sha, size, content_type FROM blobs ORDER BY last_access LIMIT 256"
+            ).fetchall()
+            if not rows:
+                break
+            for sha, size, content_type in rows:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                self.blob_path(sha, content_type).unlink(missing_ok=True)
+                self._conn.execute("DELETE FROM blobs WHERE sha = ?", (sha,))
+                self._conn.execute("DELETE FROM image_keys WHERE sha = ?", (sha,))
+                self._touched.pop(sha, None)
+                self._total_bytes -= size
+        self._conn.commit()
+
+
+def make_thumbnail(data: bytes, width: int) -> bytes:
+    """Уменьшает изображение до заданной ширины и кодирует в webp"""
+    if Image is None:
+        return data
+    with Image.open(io.BytesIO(data)) as image:
+        if image.width <= width:
+            return data
+        height = round(image.height * width / image.width)
+        thumbnail = image.convert("RGB").resize((width, height), Image.LANCZOS)
+        output = io.BytesIO()
+        thumbnail.save(output, format="WEBP", quality=80)
+        return output.getvalue()
+
+
+async def make_thumbnail_async(data: bytes, width: int) -> bytes:
+    return await asyncio.to_thread(make_thumbnail, data, width)
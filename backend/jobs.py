@@ -0,0 +1,245 @@
+import asyncio
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+EXPIRED = "expired"  # результат выполненной задачи удален по сроку хранения
+
+
+class JobQueue:
+    """Персистентная очередь фоновых задач (краулов) в SQLite.
+
+    Задачи выбираются по приоритету, одновременно выполняется не больше workers,
+    при ошибке повторяются с экспоненциальной задержкой. Задача с тем же
+    dedup_key, пока она в очереди или выполняется, не создается повторно.
+
+    Запросы к SQLite выполняются в потоках (asyncio.to_thread) на общем
+    соединении под блокировкой, цикл событий их не ждет. Задачи забирает один
+    диспетчер; он спит до enqueue, завершения задачи или срока ближайшего повтора.
+    """
+
+    def __init__(self, path, workers: int = 4,
+                 retry_base_delay: float = 5.0, retry_max_delay: float = 300.0):
+        self.path = Path(path)
+        self.workers = workers
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self._handlers: Dict[str, JobHandler] = {}
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, params TEXT NOT NULL, "
+            "dedup_key TEXT, priority INTEGER NOT NULL DEFAULT 0, status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL DEFAULT 3, "
+            "run_after REAL NOT NULL, result TEXT, error TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_jobs_pick ON jobs (status, priority DESC, run_after)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_jobs_dedup ON jobs (dedup_key, status)"
+        )
+        return conn
+
+    def register(self, kind: str, handler: JobHandler):
+        self._handlers[kind] = handler
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        # Задачи, прерванные остановкой процесса, возвращаем в очередь
+        await asyncio.to_thread(
+            self._execute, "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ?",
+            (QUEUED, time.time(), RUNNING)
+        )
+        self._dispatcher = asyncio.create_task(self._dispatch())
+        logger.info(f"Job queue started with {self.workers} workers")
+
+    async def stop(self):
+        tasks = [task for task in (self._dispatcher, *self._running) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._dispatcher = None
+        self._running.clear()
+
+    async def enqueue(self, kind: str, params: Dict[str, Any], priority: int = 0,
+                      dedup_key: Optional[str] = None, max_attempts: int = 3) -> Dict[str, Any]:
+        """Ставит задачу в очередь; при совпадении dedup_key возвращает существующую"""
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job = await asyncio.to_thread(self._insert, kind, params, priority, dedup_key, max_attempts)
+        self._wake()
+        return job
+
+    async def get(self, job_id: str, with_result: bool = False) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._get, job_id, with_result)
+
+    async def expire(self, kind: str, max_age: float) -> List[Dict[str, Any]]:
+        """Переводит выполненные задачи kind старше max_age секунд в expired; возвращает их с результатами"""
+        return await asyncio.to_thread(self._expire, kind, max_age)
+
+    def _insert(self, kind, params, priority, dedup_key, max_attempts) -> Dict[str, Any]:
+        with self._lock:
+            if dedup_key is not None:
+                existing = self._conn.execute(
+                    "SELECT * FROM jobs WHERE dedup_key = ? AND status IN (?, ?) LIMIT 1",
+                    (dedup_key, QUEUED, RUNNING)
+                ).fetchone()
+                if existing:
+                    return self._to_dict(existing)
+
+            now = time.time()
+            job_id = uuid.uuid4().hex
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, params, dedup_key, priority, status, max_attempts, "
+                "run_after, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(params, ensure_ascii=False), dedup_key, priority,
+                 QUEUED, max_attempts, now, now, now)
+            )
+        return self._get(job_id)
+
+    def _get(self, job_id: str, with_result: bool = False) -> Optional[Dict[str, Any]]:
+        row = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return self._to_dict(row, with_result) if row else None
+
+    def _expire(self, kind: str, max_age: float) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? "
+                "WHERE status = ? AND kind = ? AND updated_at < ? RETURNING *",
+                (EXPIRED, now, DONE, kind, now - max_age)
+            ).fetchall()
+        return [self._to_dict(row, with_result=True) for row in rows]
+
+    def _execute(self, sql: str, params: tuple = ()) -> Optional[sqlite3.Row]:
+        """Выполняет запрос под блокировкой и возвращает первую строку результата"""
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _dispatch(self):
+        while True:
+            # Сброс до выборки: enqueue во время запроса к базе не потеряется
+            self._wakeup.clear()
+            timeout = None
+            if len(self._running) < self.workers:
+                job = await asyncio.to_thread(self._claim)
+                if job is not None:
+                    task = asyncio.create_task(self._run(job))
+                    self._running.add(task)
+                    task.add_done_callback(self._job_done)
+                    continue
+                next_run = await asyncio.to_thread(self._next_run_after)
+                if next_run is not None:
+                    timeout = max(next_run - time.time(), 0)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _job_done(self, task: asyncio.Task):
+        self._running.discard(task)
+        self._wake()
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """Атомарно забирает самую приоритетную готовую к запуску задачу"""
+        now = time.time()
+        return self._execute(
+            "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ? "
+            "WHERE id = (SELECT id FROM jobs WHERE status = ? AND run_after <= ? "
+            "ORDER BY priority DESC, created_at LIMIT 1) RETURNING *",
+            (RUNNING, now, QUEUED, now)
+        )
+
+    def _next_run_after(self) -> Optional[float]:
+        """Срок ближайшей отложенной (повторной) задачи"""
+        return self._execute("SELECT MIN(run_after) FROM jobs WHERE status = ?", (QUEUED,))[0]
+
+    async def _run(self, job: sqlite3.Row):
+        handler = self._handlers.get(job["kind"])
+        try:
+            if handler is None:
+                raise ValueError(f"No handler for job kind {job['kind']}")
+            result = await handler(json.loads(job["params"]))
+        except asyncio.CancelledError:
+            await asyncio.to_thread(
+                self._execute,
+                "UPDATE jobs SET status = ?, attempts = attempts - 1, updated_at = ? WHERE id = ?",
+                (QUEUED, time.time(), job["id"])
+            )
+            raise
+        except Exception as e:
+            await asyncio.to_thread(self._fail, job, e)
+            return
+
+        await asyncio.to_thread(self._finish, job, result)
+
+    def _finish(self, job: sqlite3.Row, result: Any):
+        self._execute(
+            "UPDATE jobs SET status = ?, result = ?, error = NULL, updated_at = ? WHERE id = ?",
+            (DONE, json.dumps(result, ensure_ascii=False, default=str), time.time(), job["id"])
+        )
+
+    def _fail(self, job: sqlite3.Row, error: Exception):
+        now = time.time()
+        if job["attempts"] < job["max_attempts"]:
+            delay = min(self.retry_base_delay * 2 ** (job["attempts"] - 1), self.retry_max_delay)
+            delay *= random.uniform(0.8, 1.2)
+            logger.warning(f"Job {job['id']} ({job['kind']}) failed: {error}. Retry in {delay:.0f}s")
+            self._execute(
+                "UPDATE jobs SET status = ?, error = ?, run_after = ?, updated_at = ? WHERE id = ?",
+                (QUEUED, str(error), now + delay, now, job["id"])
+            )
+        else:
+            logger.error(f"Job {job['id']} ({job['kind']}) failed permanently: {error}")
+            self._execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                (FAILED, str(error), now, job["id"])
+            )
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row, with_result: bool = False) -> Dict[str, Any]:
+        job = {
+            "id": row["id"],
+            "kind": row["kind"],
+            "params": json.loads(row["params"]),
+            "priority": row["priority"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "max_attempts": row["max_attempts"],
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+        if with_result:
+            job["result"] = json.loads(row["result"]) if row["result"] else None
+        return job
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Лимиты обращений к LLM (можно переопределить через переменные окружения)
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "500000"))
+
+
+class LLMBudget:
+    """Общий для всего приложения бюджет обращений к LLM.
+
+    Одновременно выполняется не больше concurrency запросов, а за скользящее окно
+    window секунд - не больше requests запросов и tokens токенов. Токены запроса
+    резервируются по оценке и уточняются по usage из ответа через settle().
+    """
+
+    def __init__(self, concurrency: int = LLM_CONCURRENCY, requests: int = LLM_REQUESTS_PER_MINUTE,
+                 tokens: int = LLM_TOKENS_PER_MINUTE, window: float = 60.0):
+        self.concurrency = concurrency
+        self.requests = requests
+        self.tokens = tokens
+        self.window = window
+        self._semaphore = asyncio.BoundedSemaphore(concurrency)
+        self._lock = asyncio.Lock()
+        self._log: "deque[List[float]]" = deque()  # [время запроса, токены]
+        self._used_tokens = 0
+        self._waited = 0.0
+
+    @asynccontextmanager
+    async def reserve(self, tokens: int):
+        """Ждет свободного слота и бюджета; возвращает резерв для settle()"""
+        async with self._semaphore:
+            yield await self._take(tokens)
+
+    def settle(self, reservation: List[float], tokens: int):
+        """Заменяет оценку токенов запроса фактическим расходом"""
+        now = time.monotonic()
+        self._expire(now)
+        if now - reservation[0] < self.window:  # резерв еще в окне
+            self._used_tokens += tokens - reservation[1]
+        reservation[1] = tokens
+
+    async def _take(self, tokens: int) -> List[float]:
+        # Под блокировкой ждущие получают бюджет в порядке очереди
+        async with self._lock:
+            started = time.monotonic()
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                fits_tokens = self._used_tokens + tokens <= self.tokens or not self._log
+                if len(self._log) < self.requests and fits_tokens:
+                    reservation = [now, tokens]
+                    self._log.append(reservation)
+                    self._used_tokens += tokens
+                    self._waited += now - started
+                    return reservation
+                await asyncio.sleep(max(self._log[0][0] + self.window - now, 0.01))
+
+    def _expire(self, now: float):
+        while self._log and now - self._log[0][0] >= self.window:
+            self._used_tokens -= self._log.popleft()[1]
+
+    def stats(self) -> Dict[str, Any]:
+        self._expire(time.monotonic())
+        return {
+            "concurrency": self.concurrency,
+            "requests_in_window": len(self._log),
+            "requests_limit": self.requests,
+            "tokens_in_window": self._used_tokens,
+            "tokens_limit": self.tokens,
+            "waited_seconds": round(self._waited, 3),
+        }
+
+
+llm_budget = LLMBudget()
@@ -1,23 +1,68 @@
-import glob
-from datetime import datetime
+from datetime import datetime, timezone
 import os
 import time
 from pathlib import Path
-import subprocess
 import json
 import logging
-from urllib.parse import quote
+import asyncio
+import hashlib
+import random
+import uuid
+from urllib.parse import quote, urlencode
 
 import httpx
 from fastapi import FastAPI, Request, Form, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import JSONResponse, RedirectResponse
-from typing import Optional
-
-from database import save_search, get_history
-
-app = FastAPI()
+from fastapi.responses import FileResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
+from contextlib import asynccontextmanager, aclosing
+from typing import Optional, Tuple
+
+from database import (
+    engine, get_history, get_hourly_counts, get_top_queries, history_writer, init_db, save_search
+)
+from cache import ResponseCache, CachePolicy
+from jobs import JobQueue, DONE, EXPIRED, FAILED
+from images import ImageCache, THUMBNAIL_WIDTHS, make_thumbnail_async
+from singleflight import SingleFlight
+from crawler import crawl_engine, CrawlError
+from http_clients import http_clients
+from llm_budget import llm_budget
+from responses import FastJSONResponse
+from wildberries_parser.baskets import (
+    MAX_PHOTOS, fetch_from_basket, get_basket_index, photo_count_from_card, photo_items, photo_url
+)
+from wildberries_parser.storage import get_product_store
+from wildberries_parser.history import get_price_history
+from wildberries_parser.utils import parse_queries
+from wildberries_parser.serialization import dumps, dumps_str, loads
+from wildberries_parser.exporters import (
+    PARQUET_AVAILABLE, PRODUCT_SCHEMA, ZSTD_AVAILABLE, iter_ndjson, iter_parquet
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    _import_legacy_data()
+    await init_db()
+    history_writer.start()
+    crawl_engine.start()
+    await http_clients.start()
+    await job_queue.start()
+    batch_sweeper = asyncio.create_task(_expire_search_batches_periodically())
+    yield
+    batch_sweeper.cancel()
+    await asyncio.gather(batch_sweeper, return_exceptions=True)
+    await job_queue.stop()
+    await http_clients.close()
+    crawl_engine.stop()
+    await asyncio.to_thread(image_cache.flush)
+    await response_cache.flush()
+    await history_writer.stop()
+    await engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
@@ -32,6 +77,44 @@ PROJECT_ROOT = Path(__file__).parent.parent  # Поднимаемся на дв
 SCRAPY_DATA_DIR = PROJECT_ROOT / "scrapy_data"
 SCRAPY_DATA_DIR.mkdir(exist_ok=True)  # Создаем директорию, если ее нет
 
+product_store = get_product_store()
+price_history = get_price_history()
+
+# Кэш ответов: карточки, фото и страницы поиска
+response_cache = ResponseCache(
+    {
+        "card": CachePolicy(ttl=600, stale_ttl=3600, disk=True),
+        "photos": CachePolicy(ttl=3600, stale_ttl=86400, disk=True),
+        "search": CachePolicy(ttl=300, stale_ttl=600),
+        # Ключ - хэш промпта: при изменении полей товара промпт и ключ меняются
+        "analysis": CachePolicy(ttl=float(os.getenv("ANALYSIS_CACHE_TTL", 7 * 86400)), disk=True),
+    },
+    max_entries=10000,
+    max_memory_bytes=256 * 1024 ** 2,
+    disk_dir=SCRAPY_DATA_DIR / "cache",
+    max_disk_bytes=512 * 1024 ** 2
+)
+
+# Фоновые краулы: персистентная очередь с приоритетами и повторами
+job_queue = JobQueue(SCRAPY_DATA_DIR / "jobs.sqlite3", workers=4)
+
+# Локальный кэш изображений и миниатюр (до 2 ГБ)
+image_cache = ImageCache(SCRAPY_DATA_DIR / "images", max_bytes=2 * 1024 ** 3)
+image_flights = SingleFlight()
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def _import_legacy_data():
+    """Переносит старый scrapy_data/data.json в хранилище при первом запуске"""
+    legacy_file = SCRAPY_DATA_DIR / "data.json"
+    if legacy_file.exists() and product_store.count() == 0:
+        try:
+            imported = product_store.import_json_file(legacy_file)
+            logger.info(f"Imported {imported} products from {legacy_file}")
+        except Exception as e:
+            logger.error(f"Failed to import {legacy_file}: {str(e)}")
+
+
 def get_scrapy_data_path(filename: str) -> str:
     """Возвращает полный путь к файлу в директории scrapy_data"""
     return str(SCRAPY_DATA_DIR / filename)
@@ -44,11 +127,65 @@ def get_scrapy_full_path(filename: str, subdir: str = "") -> str:
         path.mkdir(exist_ok=True)  # Создаем поддиректорию, если ее нет
     return str(path / filename)
 
+# Сообщения для кодов ошибок, с которыми поиск возвращает на главную (/?error=...)
+SEARCH_ERRORS = {
+    "invalid_price": "Цена должна быть числом",
+    "min_price_negative": "Минимальная цена не может быть отрицательной",
+    "max_price_negative": "Максимальная цена не может быть отрицательной",
+    "invalid_price_range": "Минимальная цена больше максимальной",
+    "no_products": "По запросу ничего не найдено",
+    "timeout": "Поиск занял слишком много времени",
+    "scrapy_failed": "Не удалось получить товары с Wildberries",
+    "stream_failed": "Соединение с сервером прервано",
+    "unexpected": "Непредвиденная ошибка",
+}
+
+
 @app.get("/")
-async def home(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+async def home(request: Request, error: Optional[str] = None):
+    return templates.TemplateResponse("index.html", {
+        "request": request,
+        "error": SEARCH_ERRORS.get(error, SEARCH_ERRORS["unexpected"]) if error else None
+    })
+
+
+
+def _parse_price(value: Optional[str]) -> Optional[float]:
+    return float(value) if value and value.strip() else None
+
+
+def _price_range_error(min_price: Optional[float], max_price: Optional[float]) -> Optional[str]:
+    """Код ошибки для некорректного ценового диапазона"""
+    if min_price is not None and min_price < 0:
+        return "min_price_negative"
+    if max_price is not None and max_price < 0:
+        return "max_price_negative"
+    if min_price is not None and max_price is not None and min_price > max_price:
+        return "invalid_price_range"
+    return None
+
+
+def _spider_params(query: str, category: Optional[str], pages: int, limit: int,
+                   min_price: Optional[float], max_price: Optional[float]) -> dict:
+    """Параметры паука wildberries_v2 (только заданные)"""
+    params = {
+        "queries": query,
+        "pages": str(pages),
+        "limit": str(limit),
+    }
+
+    if category:
+        params["categories"] = category
+    if min_price is not None:
+        params["min_price"] = str(min_price)
+    if max_price is not None:
+        params["max_price"] = str(max_price)
+    return params
 
 
+def _search_key(params: dict) -> tuple:
+    return tuple(sorted(params.items()))
+
 
 @app.post("/search")
 async def search(
@@ -62,70 +199,28 @@ async def search(
 ):
     try:
         # Преобразование и валидация цен
-        min_price_float = float(min_price) if min_price and min_price.strip() else None
-        max_price_float = float(max_price) if max_price and max_price.strip() else None
+        min_price_float = _parse_price(min_price)
+        max_price_float = _parse_price(max_price)
 
-        if min_price_float is not None and min_price_float < 0:
-            return RedirectResponse(url="/?error=min_price_negative", status_code=303)
-        if max_price_float is not None and max_price_float < 0:
-            return RedirectResponse(url="/?error=max_price_negative", status_code=303)
-        if min_price_float is not None and max_price_float is not None and min_price_float > max_price_float:
-            return RedirectResponse(url="/?error=invalid_price_range", status_code=303)
+        if error := _price_range_error(min_price_float, max_price_float):
+            return RedirectResponse(url=f"/?error={error}", status_code=303)
 
         # Логирование параметров
         logger.info(
             f"Starting search with params: query={query}, category={category}, pages={pages}, limit={limit}, min_price={min_price_float}, max_price={max_price_float}")
 
-        # Формирование имени файла
-        safe_query = "".join(c if c.isalnum() else "_" for c in query)
-        output_file = str(SCRAPY_DATA_DIR / f"{safe_query}_{int(time.time())}.json")
-
-        # Формирование команды Scrapy
-        cmd = ["scrapy", "crawl", "wildberries_v2"]
-
-        # Добавляем параметры только если они не None
-        params = {
-            "queries": query,
-            "pages": str(pages),
-            "limit": str(limit),
-        }
-
-        if category:
-            params["categories"] = category
-        if min_price_float is not None:
-            params["min_price"] = str(min_price_float)
-        if max_price_float is not None:
-            params["max_price"] = str(max_price_float)
-
-        for key, value in params.items():
-            cmd.extend(["-a", f"{key}={value}"])
-
-        cmd.extend(["-o", output_file])
+        params = _spider_params(query, category, pages, limit, min_price_float, max_price_float)
+        logger.info(f"Running spider wildberries_v2 with {params}")
 
-        logger.info(f"Running command: {' '.join(cmd)}")
-
-        # Запуск Scrapy
-        process = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=300
+        # Запуск паука во встроенном движке, items возвращаются в память.
+        # Одинаковые запросы в пределах TTL отдаются из кэша
+        results = await response_cache.get_or_fetch(
+            "search", _search_key(params),
+            lambda: crawl_engine.crawl("wildberries_v2", timeout=300, **params)
         )
 
-        # Обработка результатов
-        if process.returncode != 0:
-            logger.error(f"Scrapy process failed: {process.stderr}")
-            return RedirectResponse(url="/?error=scrapy_failed", status_code=303)
-
-        if not os.path.exists(output_file):
-            logger.warning(f"Output file not found: {output_file}")
-            return RedirectResponse(url="/?error=no_results", status_code=303)
-
-        with open(output_file, "r", encoding="utf-8") as f:
-            results = json.load(f)
-
         if not results:
-            logger.warning(f"No results found in file: {output_file}")
+            logger.warning(f"No results found for query: {query}")
             return RedirectResponse(url="/?error=no_products", status_code=303)
 
         # Сохранение в историю
@@ -137,6 +232,7 @@ async def search(
             min_price=min_price_float,
             max_price=max_price_float
         )
+        await _schedule_analysis_precompute(results[:limit])
 
         return templates.TemplateResponse(
             "results.html",
@@ -150,26 +246,456 @@ async def search(
             }
         )
 
-    except subprocess.TimeoutExpired:
-        logger.error("Scrapy process timed out")
+    except asyncio.TimeoutError:
+        logger.error("Spider timed out")
         return RedirectResponse(url="/?error=timeout", status_code=303)
-    except json.JSONDecodeError:
-        logger.error("Failed to parse scrapy output")
-        return RedirectResponse(url="/?error=parse_error", status_code=303)
+    except CrawlError as e:
+        logger.error(f"Spider failed: {str(e)}")
+        return RedirectResponse(url="/?error=scrapy_failed", status_code=303)
     except Exception as e:
         logger.error(f"Search error: {str(e)}", exc_info=True)
         return RedirectResponse(url="/?error=unexpected", status_code=303)
 
 
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {dumps_str(data)}\n\n"
+
+
+@app.get("/api/search/stream")
+async def search_stream(
+    query: str,
+    category: Optional[str] = None,
+    pages: int = 1,
+    limit: int = 10,
+    min_price: Optional[str] = None,
+    max_price: Optional[str] = None
+):
+    """Поиск с отправкой товаров через Server-Sent Events по мере парсинга"""
+    try:
+        min_price_float = _parse_price(min_price)
+        max_price_float = _parse_price(max_price)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid_price")
+    if error := _price_range_error(min_price_float, max_price_float):
+        raise HTTPException(status_code=400, detail=error)
+
+    params = _spider_params(query, category, pages, limit, min_price_float, max_price_float)
+
+    async def events():
+        # Свежий результат такого же поиска отдаем из кэша сразу
+        cached = await response_cache.peek("search", _search_key(params))
+        if cached:
+            for product in cached[:limit]:
+                yield _sse("item", product)
+            yield _sse("done", {"count": min(len(cached), limit), "cached": True})
+            return
+
+        products = []
+        try:
+            async with aclosing(crawl_engine.stream("wildberries_v2", timeout=300, **params)) as stream:
+                async for product in stream:
+                    products.append(product)
+                    yield _sse("item", product)
+                    if len(products) >= limit:
+                        # Лимит набран - закрытие потока останавливает паука
+                        break
+        except asyncio.TimeoutError:
+            logger.error("Spider timed out")
+            yield _sse("error", {"error": "timeout"})
+            return
+        except CrawlError as e:
+            logger.error(f"Spider failed: {str(e)}")
+            yield _sse("error", {"error": "scrapy_failed"})
+            return
+
+        if products:
+            response_cache.set("search", _search_key(params), products)
+            await _schedule_analysis_precompute(products)
+            save_search(
+                query=query,
+                category=category,
+                pages=pages,
+                limit=limit,
+                min_price=min_price_float,
+                max_price=max_price_float
+            )
+        yield _sse("done", {"count": len(products), "cached": False})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/search/live")
+async def search_live(request: Request, query: str, category: Optional[str] = None,
+                      pages: int = 1, limit: int = 10,
+                      min_price: Optional[str] = None, max_price: Optional[str] = None):
+    """Страница результатов, которая наполняется по мере парсинга"""
+    # Проверяем цены до отрисовки: ошибку 400 от /api/search/stream EventSource не покажет
+    try:
+        if error := _price_range_error(_parse_price(min_price), _parse_price(max_price)):
+            return RedirectResponse(url=f"/?error={error}", status_code=303)
+    except ValueError:
+        return RedirectResponse(url="/?error=invalid_price", status_code=303)
+
+    stream_params = {k: v for k, v in {
+        "query": query, "category": category, "pages": pages, "limit": limit,
+        "min_price": min_price, "max_price": max_price,
+    }.items() if v not in (None, "")}
+
+    return templates.TemplateResponse(
+        "results.html",
+        {
+            "request": request,
+            "query": query,
+            "category": category or "Все категории",
+            "products": [],
+            "now": datetime.now,
+            "stream_url": f"/api/search/stream?{urlencode(stream_params)}"
+        }
+    )
+
+
+async def _run_search_job(params: dict):
+    """Задача поиска: краул, кэширование результата и запись в историю"""
+    spider_params = params["spider"]
+    results = await crawl_engine.crawl("wildberries_v2", timeout=300, **spider_params)
+    save_search(**params["history"])
+    if spider_params.get("delta"):
+        return _search_job_result(results)
+    if results:
+        response_cache.set("search", _search_key(spider_params), results)
+        await _schedule_analysis_precompute(results)
+    return _search_job_result(results[:int(spider_params["limit"])])
+
+
+def _search_job_result(items: list) -> dict:
+    """Результат задачи поиска для jobs.result: только id товаров (сами товары
+    записывает в ProductStore пайплайн) и tombstone-записи инкрементального краула"""
+    return {
+        "product_ids": [item["product_id"] for item in items if not item.get("deleted")],
+        "removed": [item for item in items if item.get("deleted")],
+    }
+
+
+async def _search_job_products(result) -> list:
+    """Товары задачи поиска из ProductStore в порядке выдачи"""
+    if isinstance(result, list):  # задачи, выполненные до перехода на id
+        return result
+    products = await asyncio.to_thread(product_store.get_many, result["product_ids"])
+    return products + result["removed"]
+
+
+async def _run_details_job(params: dict):
+    details = await _fetch_via_scrapy(params["product_id"])
+    if not details:
+        raise CrawlError(f"No details found for {params['product_id']}")
+    return details
+
+
+async def _run_photos_job(params: dict):
+    photos = await _get_product_photos(params["product_id"])
+    if not photos:
+        raise CrawlError(f"No photos found for {params['product_id']}")
+    return photos
+
+
+job_queue.register("search", _run_search_job)
+job_queue.register("product_details", _run_details_job)
+job_queue.register("photos", _run_photos_job)
+
+
+def _job_search_options(data) -> tuple:
+    """pages, limit, priority и ценовой диапазон из тела запроса на фоновый поиск"""
+    try:
+        pages = int(data.get('pages', 1))
+        limit = int(data.get('limit', 10))
+        priority = int(data.get('priority', 0))
+        min_price = _parse_price(str(data['min_price'])) if data.get('min_price') is not None else None
+        max_price = _parse_price(str(data['max_price'])) if data.get('max_price') is not None else None
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="invalid_params")
+    if error := _price_range_error(min_price, max_price):
+        raise HTTPException(status_code=400, detail=error)
+    return pages, limit, priority, min_price, max_price
+
+
+@app.post("/api/jobs/search", status_code=202)
+async def create_search_job(data: dict):
+    """Ставит поиск в очередь и сразу возвращает ID задачи"""
+    query = str(data.get('query', '')).strip()
+    if not query:
+        raise HTTPException(status_code=400, detail="query is required")
+
+    pages, limit, priority, min_price, max_price = _job_search_options(data)
+    category = data.get('category') or None
+    spider_params = _spider_params(query, category, pages, limit, min_price, max_price)
+    if data.get('delta'):
+        # Только новые/изменившиеся товары и tombstone-записи для пропавших
+        spider_params["delta"] = "1"
+    job = await job_queue.enqueue(
+        "search",
+        {
+            "spider": spider_params,
+            "history": {
+                "query": query, "category": category, "pages": pages, "limit": limit,
+                "min_price": min_price, "max_price": max_price,
+            },
+        },
+        priority=priority,
+        dedup_key="search:" + json.dumps(_search_key(spider_params), ensure_ascii=False)
+    )
+    return {"job_id": job["id"], "status": job["status"]}
+
+
+BATCH_MAX_QUERIES = 10000
+BATCH_TIMEOUT_PER_QUERY = 3
+BATCH_DIR = SCRAPY_DATA_DIR / "batches"
+# Сколько хранятся файлы результатов пакетного поиска и как часто удаляются старые
+BATCH_RETENTION_HOURS = float(os.getenv("BATCH_RETENTION_HOURS", "24"))
+BATCH_SWEEP_INTERVAL = 3600
+
+
+async def _run_search_batch_job(params: dict):
+    """Пакетный поиск одним краулом: каждый товар пишется в файл один раз,
+    в конце файла - индекс product_id по каждому запросу"""
+    spider_params = params["spider"]
+    queries = spider_params["queries"]
+    BATCH_DIR.mkdir(exist_ok=True)
+    path = BATCH_DIR / f"{params['batch_id']}.ndjson"
+    tmp_path = path.with_suffix(".tmp")
+
+    index = {query: [] for query in queries}
+    seen = set()
+    timeout = 300 + BATCH_TIMEOUT_PER_QUERY * len(queries)
+    with open(tmp_path, "wb") as f:
+        async with aclosing(crawl_engine.stream("wildberries_v2", timeout=timeout, **spider_params)) as items:
+            async for item in items:
+                product_id = item.get("product_id")
+                index.setdefault(item.pop("query", None), []).append(product_id)
+                if product_id in seen:
+                    continue
+                seen.add(product_id)
+                f.write(dumps({"type": "product", "data": item}) + b"\n")
+        for query, product_ids in index.items():
+            f.write(dumps({"type": "index", "query": query, "product_ids": product_ids}) + b"\n")
+    os.replace(tmp_path, path)
+
+    return {
+        "file": path.name,
+        "queries": len(queries),
+        "products": len(seen),
+        "empty_queries": sum(1 for product_ids in index.values() if not product_ids),
+    }
+
+
+job_queue.register("search_batch", _run_search_batch_job)
+
+
+async def _expire_search_batches() -> int:
+    """Удаляет файлы пакетных поисков старше BATCH_RETENTION_HOURS, их задачи получают статус expired"""
+    max_age = BATCH_RETENTION_HOURS * 3600
+    jobs = await job_queue.expire("search_batch", max_age)
+    await asyncio.to_thread(_remove_batch_files, [job["result"]["file"] for job in jobs if job["result"]],
+                            time.time() - max_age)
+    return len(jobs)
+
+
+def _remove_batch_files(names: list, cutoff: float):
+    for name in names:
+        (BATCH_DIR / name).unlink(missing_ok=True)
+    # Недописанные файлы прерванных краулов
+    for path in BATCH_DIR.glob("*.tmp"):
+        if path.stat().st_mtime < cutoff:
+            path.unlink(missing_ok=True)
+
+
+async def _expire_search_batches_periodically():
+    while True:
+        try:
+            if expired := await _expire_search_batches():
+                logger.info(f"Removed results of {expired} expired search batches")
+        except Exception as e:
+            logger.error(f"Failed to remove expired search batches: {str(e)}")
+        await asyncio.sleep(BATCH_SWEEP_INTERVAL)
+
+
+async def _read_batch_request(request: Request) -> tuple:
+    """Запросы и параметры из JSON или из загруженного файла (multipart, поле file)"""
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="file is required")
+        text = (await upload.read()).decode("utf-8-sig", errors="replace")
+        return parse_queries(text.splitlines()), dict(form)
+
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid_json")
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="invalid_json")
+    raw = data.get("queries") or []
+    if isinstance(raw, str):
+        raw = raw.splitlines()
+    if not isinstance(raw, list):
+        raise HTTPException(status_code=400, detail="queries must be a list or a newline-separated string")
+    return parse_queries(str(query) for query in raw), data
+
+
+@app.post("/api/search/batch", status_code=202)
+async def create_search_batch(request: Request):
+    """Ставит в очередь поиск по множеству запросов одним краулом"""
+    queries, data = await _read_batch_request(request)
+    if not queries:
+        raise HTTPException(status_code=400, detail="queries is empty")
+    if len(queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"Too many queries (max {BATCH_MAX_QUERIES})")
+
+    pages, limit, priority, min_price, max_price = _job_search_options(data)
+    spider_params = _spider_params(queries, data.get('category') or None, pages, limit, min_price, max_price)
+    job = await job_queue.enqueue(
+        "search_batch", {"batch_id": uuid.uuid4().hex, "spider": spider_params},
+        priority=priority, max_attempts=2
+    )
+    return {"job_id": job["id"], "status": job["status"], "queries": len(queries)}
+
+
+@app.get("/api/search/batch/{job_id}/results")
+async def get_search_batch_results(job_id: str):
+    """NDJSON-файл результатов пакетного поиска: товары, затем индекс по запросам"""
+    job = await job_queue.get(job_id, with_result=True)
+    if job is None or job["kind"] != "search_batch":
+        raise HTTPException(status_code=404, detail="Batch not found")
+    if job["status"] == FAILED:
+        return JSONResponse({"status": FAILED, "error": job["error"]}, status_code=500)
+    if job["status"] == EXPIRED:
+        raise HTTPException(status_code=410, detail="Batch results expired")
+    if job["status"] != DONE:
+        return JSONResponse({"status": job["status"]}, status_code=409)
+
+    path = BATCH_DIR / job["result"]["file"]
+    if not path.exists():
+        raise HTTPException(status_code=410, detail="Batch results expired")
+    return FileResponse(path, media_type="application/x-ndjson", filename=path.name)
+
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", ".ndjson", None),
+    "ndjson.gz": ("application/gzip", ".ndjson.gz", "gzip"),
+    "ndjson.zst": ("application/zstd", ".ndjson.zst", "zstd"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet", None),
+}
+
+
+def _iter_batch_products(path: Path):
+    with open(path, "rb") as f:
+        for line in f:
+            record = loads(line)
+            if record.get("type") == "product":
+                yield record["data"]
+
+
+@app.get("/api/search/{job_id}/export")
+async def export_search(job_id: str, format: str = "ndjson"):
+    """Потоковая выгрузка результатов поиска (задача search или search_batch)"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {sorted(EXPORT_FORMATS)}")
+    if format == "parquet" and not PARQUET_AVAILABLE:
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+    if format == "ndjson.zst" and not ZSTD_AVAILABLE:
+        raise HTTPException(status_code=501, detail="zstd export requires zstandard")
+
+    job = await job_queue.get(job_id, with_result=True)
+    if job is None or job["kind"] not in ("search", "search_batch"):
+        raise HTTPException(status_code=404, detail="Search not found")
+    if job["status"] == EXPIRED:
+        raise HTTPException(status_code=410, detail="Batch results expired")
+    if job["status"] != DONE:
+        return JSONResponse({"status": job["status"]}, status_code=409)
+
+    if job["kind"] == "search_batch":
+        path = BATCH_DIR / job["result"]["file"]
+        if not path.exists():
+            raise HTTPException(status_code=410, detail="Batch results expired")
+        products = _iter_batch_products(path)
+    else:
+        products = await _search_job_products(job["result"] or [])
+
+    media_type, suffix, compression = EXPORT_FORMATS[format]
+    if format == "parquet":
+        body = iter_parquet(products, PRODUCT_SCHEMA)
+    else:
+        body = iter_ndjson(products, PRODUCT_SCHEMA, compression)
+    return StreamingResponse(
+        body, media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="search_{job_id}{suffix}"'}
+    )
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = await job_queue.get(job_id, with_result=True)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == FAILED:
+        return JSONResponse({"status": FAILED, "error": job["error"]}, status_code=500)
+    if job["status"] != DONE:
+        return JSONResponse({"status": job["status"]}, status_code=409)
+    if job["kind"] == "search":
+        return {"status": DONE, "result": await _search_job_products(job["result"] or [])}
+    return {"status": DONE, "result": job["result"]}
+
+
+HISTORY_PAGE_SIZE = 100
+HISTORY_MAX_PAGE_SIZE = 500
+
+
+def _history_time(value: Optional[str]) -> Optional[datetime]:
+    """Граница периода истории: время поиска хранится в UTC без часового пояса"""
+    ts = _parse_time(value)
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None) if ts is not None else None
+
+
+async def _history_page(limit: int, cursor: Optional[str], query: Optional[str], prefix: Optional[str],
+                        category: Optional[str], start: Optional[str], end: Optional[str]) -> tuple:
+    try:
+        since, until = _history_time(start), _history_time(end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid_time")
+    try:
+        return await get_history(
+            limit=max(1, min(limit, HISTORY_MAX_PAGE_SIZE)), cursor=cursor,
+            query=(query or '').strip() or None, query_prefix=(prefix or '').strip() or None,
+            category=category or None,
+            since=since, until=until
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid_cursor")
+
+
 @app.get("/history")
-async def history(request: Request):
+async def history(request: Request, cursor: Optional[str] = None):
     try:
-        searches = get_history()
+        searches, next_cursor = await _history_page(HISTORY_PAGE_SIZE, cursor, None, None, None, None, None)
         return templates.TemplateResponse(
             "history.html",
             {
                 "request": request,
                 "searches": searches,
+                "next_cursor": next_cursor,
+                "top_queries": await get_top_queries(limit=10),
                 "format_price": lambda p: f"{p/100:.2f} руб" if p is not None else "Не указано",
                 "format_date": lambda d: d.strftime("%d.%m.%Y %H:%M") if d is not None else ""
             }
@@ -179,95 +705,107 @@ async def history(request: Request):
         return RedirectResponse(url="/?error=history_error", status_code=303)
 
 
+@app.get("/api/history")
+async def history_api(cursor: Optional[str] = None, query: Optional[str] = None, prefix: Optional[str] = None,
+                      category: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None,
+                      limit: int = HISTORY_PAGE_SIZE):
+    """История поиска постранично (новые сверху); next_cursor передается в cursor следующего запроса"""
+    items, next_cursor = await _history_page(limit, cursor, query, prefix, category, start, end)
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@app.get("/api/history/top")
+async def history_top(query: Optional[str] = None, limit: int = 20):
+    """Самые частые запросы (по префиксу query)"""
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    return {"items": await get_top_queries(limit=limit, query_prefix=(query or '').strip() or None)}
+
+
+@app.get("/api/history/hourly")
+async def history_hourly(start: Optional[str] = None, end: Optional[str] = None):
+    """Число поисков по часам (UTC) за период"""
+    try:
+        since, until = _history_time(start), _history_time(end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid_time")
+    return {"items": await get_hourly_counts(since, until)}
+
+
 from fastapi import BackgroundTasks
-import asyncio
 
 
 async def _fetch_product_photos(product_id: int):
-    """Запуск паука для получения фотографий товара"""
-    photos_dir = "photos"
-    output_file = get_scrapy_full_path(f"photos_{product_id}.json", photos_dir)
+    """Список фотографий товара: по card.json, иначе через паука во встроенном движке"""
+    # card.json обычно уже в кэше и содержит число фото - тогда запросов к CDN нет вовсе
+    card = await _fetch_direct_api(product_id)
+    basket_num = get_basket_index().get(product_id)
+    if card and basket_num:
+        count = photo_count_from_card(card)
+        if count is not None:
+            return photo_items(product_id, basket_num, count)
 
     try:
-        # Создаем директорию photos, если ее нет
-        (SCRAPY_DATA_DIR / photos_dir).mkdir(exist_ok=True)
-
-        # Удаляем старый файл, если он существует
-        if os.path.exists(output_file):
-            os.remove(output_file)
-
-        process = subprocess.run(
-            [
-                "scrapy", "crawl", "wb_product_photos",
-                "-a", f"product_id={product_id}",
-                "-O", output_file,  # Используем -O для перезаписи
-                "--loglevel", "ERROR"
-            ],
-            cwd=str(PROJECT_ROOT),
-            timeout=120,
-            capture_output=True,
-            text=True
-        )
-
-        if process.returncode == 0 and os.path.exists(output_file):
-            with open(output_file, "r", encoding="utf-8") as f:
-                content = f.read().strip()
-                # Очищаем JSON
-                last_valid_bracket = content.rfind(']')
-                if last_valid_bracket > 0:
-                    content = content[:last_valid_bracket + 1]
-
-                lines = [line for line in content.split('\n')
-                         if '"timestamp"' not in line and line.strip()]
-                cleaned_content = '\n'.join(lines)
-
-                try:
-                    data = json.loads(cleaned_content)
-                    if isinstance(data, list):
-                        # Удаляем дубликаты
-                        unique_photos = []
-                        seen_urls = set()
-                        for photo in data:
-                            if isinstance(photo, dict) and 'image_url' in photo:
-                                if photo['image_url'] not in seen_urls:
-                                    seen_urls.add(photo['image_url'])
-                                    unique_photos.append(photo)
-                        return unique_photos
-                except json.JSONDecodeError:
-                    logger.error("Failed to parse photos JSON")
+        photos = await crawl_engine.crawl("wb_product_photos", timeout=120, product_id=str(product_id))
+    except asyncio.TimeoutError:
+        logger.error(f"Photos spider timed out for {product_id}")
+        return []
     except Exception as e:
         logger.error(f"Photos spider failed: {str(e)}")
-    return []
+        return []
+
+    # Удаляем дубликаты
+    unique_photos = {}
+    for photo in photos:
+        if 'image_url' in photo:
+            unique_photos.setdefault(photo['image_url'], photo)
+    return sorted(unique_photos.values(), key=lambda p: p.get('image_num', 0))
+
+
+async def _get_product_photos(product_id: int):
+    """Фотографии товара из кэша с фоновым обновлением"""
+    return await response_cache.get_or_fetch(
+        "photos", product_id, lambda: _fetch_product_photos(product_id)
+    )
+
+
+async def _product_base_data(product_id: int) -> dict:
+    """Цена и рейтинг из хранилища, дополненные карточкой товара из API"""
+    base_data = find_product_in_data(product_id) or {}
+    base_data['product_id'] = product_id
+    base_data['url'] = f"https://www.wildberries.ru/catalog/{product_id}/detail.aspx"
+
+    api_data = await _fetch_direct_api(product_id)
+    if api_data:
+        base_data.update(api_data)
+    return base_data
 
 
 @app.get("/product/{product_id}")
 async def product_details(request: Request, product_id: int, background_tasks: BackgroundTasks):
     try:
-        # 1. Get base data
-        base_data = find_product_in_data(product_id) or {}
-        base_data['product_id'] = product_id
-        base_data['url'] = f"https://www.wildberries.ru/catalog/{product_id}/detail.aspx"
+        # 1-2. Базовые данные из хранилища и карточка из API
+        base_data = await _product_base_data(product_id)
 
-        # 2. Try to get details via direct API
-        api_data = await _fetch_direct_api(product_id)
-        if api_data:
-            base_data.update(api_data)
-
-        # 3. If no characteristics found, run Scrapy spider in background
+        # 3. Нет характеристик - ставим в очередь паука деталей
+        #    (одна задача на товар, даже если страницу открыли многие)
         if not base_data.get('options') and not base_data.get('grouped_options'):
-            background_tasks.add_task(_fetch_via_scrapy, product_id)
-
-        # 4. Start photos parsing in background
-        background_tasks.add_task(_fetch_product_photos, product_id)
+            await job_queue.enqueue(
+                "product_details", {"product_id": product_id},
+                priority=5, dedup_key=f"details:{product_id}", max_attempts=2
+            )
 
-        # 5. Check if there are already saved photos
-        photos_dir = "photos"
-        photos_file = get_scrapy_full_path(f"photos_{product_id}.json", photos_dir)
-        if os.path.exists(photos_file):
-            with open(photos_file, "r", encoding="utf-8") as f:
-                base_data['photos'] = json.load(f)
+        # 4. Фото из кэша (обновляются в фоне), иначе ставим в очередь паука фото
+        cached_photos = await response_cache.peek("photos", product_id)
+        if cached_photos:
+            base_data['photos'] = cached_photos
+            background_tasks.add_task(_get_product_photos, product_id)
+        else:
+            await job_queue.enqueue(
+                "photos", {"product_id": product_id},
+                priority=5, dedup_key=f"photos:{product_id}", max_attempts=2
+            )
 
-        # 6. Add cookie data if exists
+        # 5. Данные из cookie, если есть
         if cookie_data := request.cookies.get(f"product_{product_id}"):
             try:
                 base_data.update(json.loads(cookie_data))
@@ -314,230 +852,252 @@ def _render_product_response(request: Request, product_data: dict):
 
 
 async def _fetch_direct_api(product_id: int):
-    """Прямой запрос к API Wildberries с обработкой 404"""
+    """Карточка товара из кэша, при промахе - прямой запрос к API Wildberries"""
+    return await response_cache.get_or_fetch(
+        "card", product_id, lambda: _fetch_card(product_id)
+    )
+
+
+async def _fetch_card(product_id: int):
+    """Прямой запрос к API Wildberries с поиском корзины через индекс"""
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            for basket_num in range(1, 41):
-                url = f"https://basket-{basket_num:02d}.wbbasket.ru/vol{str(product_id)[:4]}/part{str(product_id)[:6]}/{product_id}/info/ru/card.json"
-                try:
-                    response = await client.get(url)
-                    if response.status_code == 200:
-                        data = response.json()
-                        data['product_id'] = product_id
-                        return data
-                except httpx.HTTPStatusError as e:
-                    if e.response.status_code != 404:
-                        logger.warning(f"API error for {product_id}: {str(e)}")
-                    continue
-                except Exception as e:
-                    logger.warning(f"Request failed for {product_id}: {str(e)}")
-                    continue
+        found = await fetch_from_basket(http_clients.wb, product_id)
+        if found:
+            basket_num, response = found
+            data = loads(response.content)
+            data['product_id'] = product_id
+            return data
     except Exception as e:
         logger.error(f"Direct API fetch error: {str(e)}")
     return None
 
 
 async def _fetch_via_scrapy(product_id: int):
-    """Запуск Scrapy паука с обработкой ошибок"""
-    output_file = get_scrapy_data_path(f"product_{product_id}_{int(time.time())}.json")
-
-    try:
-        process = subprocess.run(
-            [
-                "scrapy", "crawl", "wb_product_details",
-                "-a", f"product_ids={product_id}",
-                "-o", output_file,
-                "--loglevel", "ERROR"  # Уменьшаем объем логов
-            ],
-            cwd=str(PROJECT_ROOT),
-            timeout=120,
-            capture_output=True,
-            text=True
-        )
-
-        if process.returncode == 0 and os.path.exists(output_file):
-            with open(output_file, "r", encoding="utf-8") as f:
-                try:
-                    data = json.load(f)
-                    return data[0] if data else None
-                except json.JSONDecodeError:
-                    logger.error(f"Invalid JSON in {output_file}")
-                    return None
-    except subprocess.TimeoutExpired:
-        logger.error("Scrapy process timed out")
-    except Exception as e:
-        logger.error(f"Scrapy process failed: {str(e)}")
-
-    return None
+    """Запуск паука деталей товара во встроенном движке"""
+    items = await crawl_engine.crawl("wb_product_details", timeout=120, product_ids=str(product_id))
+    return items[0] if items else None
 
 
 def find_product_in_data(product_id: int):
-    """Ищем товар в data.json по ID"""
-    data_file = Path(__file__).parent.parent / "scrapy_data" / "data.json"
-
-    if not data_file.exists():
-        return None
-
+    """Ищем товар в индексированном хранилище по ID"""
     try:
-        with open(data_file, 'r', encoding='utf-8') as f:
-            products = json.load(f)
-            for product in products:
-                if product.get('product_id') == product_id:
-                    return {
-                        'price': product.get('price'),
-                        'rating': product.get('rating'),
-                        'reviews_count': product.get('reviews_count')
-                    }
+        product = product_store.get(product_id)
     except Exception as e:
-        logger.error(f"Error reading data.json: {str(e)}")
+        logger.error(f"Error reading product store: {str(e)}")
+        return None
 
-    return None
+    if product is None:
+        return None
+    return {
+        'price': product.get('price'),
+        'rating': product.get('rating'),
+        'reviews_count': product.get('reviews_count')
+    }
 
 
 @app.get("/api/product_photos/{product_id}")
-async def get_product_photos(product_id: int):
-    photos_file = get_scrapy_data_path(f"photos_{product_id}.json")
-
-    if not os.path.exists(photos_file):
+async def get_cached_product_photos(product_id: int):
+    """Уже загруженные фотографии товара без запуска паука"""
+    photos = await response_cache.peek("photos", product_id)
+    if not photos:
         return JSONResponse({"photos": []}, status_code=404)
-
-    try:
-        with open(photos_file, "r", encoding="utf-8") as f:
-            content = f.read().strip()
-
-            # Обрабатываем разные форматы JSON
-            if content.startswith('[') and content.endswith(']'):
-                # Это массив объектов
-                return {"photos": json.loads(content)}
-            elif content.startswith('{') and content.endswith('}'):
-                # Это один объект
-                data = json.loads(content)
-                return {"photos": [data] if isinstance(data, dict) else data}
-            else:
-                # Это несколько JSON объектов (по одному на строку)
-                photos = []
-                for line in content.split('\n'):
-                    if line.strip():
-                        photos.append(json.loads(line))
-                return {"photos": photos}
-
-    except json.JSONDecodeError as e:
-        logger.error(f"Failed to parse JSON file {photos_file}: {str(e)}")
-        return JSONResponse(
-            {"error": "Invalid photo data format", "details": str(e)},
-            status_code=500
-        )
-    except Exception as e:
-        logger.error(f"Error reading photo file: {str(e)}")
-        return JSONResponse(
-            {"error": "Failed to read photo data", "details": str(e)},
-            status_code=500
-        )
+    return {"photos": photos}
 
 
 @app.get("/product/{product_id}/photos")
 async def get_product_photos(product_id: int):
     """Получает фотографии товара, запуская паука при необходимости"""
-    photos_dir = "photos"
-    photos_file = f"photos_{product_id}.json"
-    photos_path = get_scrapy_full_path(photos_file, photos_dir)
-
-    # Если файл не существует или старше 5 минут - запускаем паука
-    if not os.path.exists(photos_path) or (time.time() - os.path.getmtime(photos_path)) > 300:
-        try:
-            # Создаем директорию photos, если ее нет
-            (SCRAPY_DATA_DIR / photos_dir).mkdir(exist_ok=True)
-
-            # Удаляем старый файл, если он существует
-            if os.path.exists(photos_path):
-                os.remove(photos_path)
-
-            process = subprocess.run(
-                [
-                    "scrapy", "crawl", "wb_product_photos",
-                    "-a", f"product_id={product_id}",
-                    "-O", photos_path,  # Используем -O вместо -o для перезаписи файла
-                    "--loglevel", "ERROR"
-                ],
-                cwd=str(PROJECT_ROOT),
-                timeout=120,
-                capture_output=True,
-                text=True
-            )
+    try:
+        photos = await _get_product_photos(product_id)
+    except Exception as e:
+        logger.error(f"Error fetching photos: {str(e)}")
+        return {"photos": [], "error": str(e)}
+
+    if not photos:
+        return {"photos": [], "status": "not_found"}
+    return {"photos": photos}
+
+
+async def _load_original_image(product_id: int, image_num: int) -> Optional[bytes]:
+    """Оригинал фото с CDN Wildberries"""
+    basket_num = get_basket_index().get(product_id)
+    if basket_num is None:
+        # Корзина определяется при загрузке card.json и попадает в индекс
+        await _fetch_direct_api(product_id)
+        basket_num = get_basket_index().get(product_id)
+    if basket_num is None:
+        return None
 
-            if process.returncode != 0:
-                logger.error(f"Scrapy failed: {process.stderr}")
-                return {"photos": [], "error": "Failed to fetch photos"}
-        except Exception as e:
-            logger.error(f"Error running spider: {str(e)}")
-            return {"photos": [], "error": str(e)}
+    response = await http_clients.wb.get(photo_url(product_id, basket_num, image_num))
+    if response.status_code != 200:
+        logger.warning(f"Image {product_id}/{image_num} returned {response.status_code}")
+        return None
+    return response.content
+
+
+async def _cached_image(product_id: int, image_num: int, width: Optional[int]) -> Optional[Tuple[str, str]]:
+    """(sha, content_type) изображения в кэше; при промахе загружает оригинал или строит миниатюру один раз"""
+    key = f"{product_id}/{image_num}/{width or 'orig'}"
+    cached = await image_cache.get_async(key)
+    if cached:
+        return cached
+
+    async def load():
+        if width:
+            original = await _cached_image(product_id, image_num, None)
+            if not original:
+                return None
+            data = await asyncio.to_thread(image_cache.blob_path(*original).read_bytes)
+            data = await make_thumbnail_async(data, width)
+        else:
+            data = await _load_original_image(product_id, image_num)
+            if not data:
+                return None
+        return await image_cache.put_async(key, data)
+
+    return await image_flights.do(key, load)
+
+
+@app.get("/img/{product_id}/{image_num}")
+async def get_image(request: Request, product_id: int, image_num: int, size: Optional[int] = None):
+    """Фото товара из локального кэша (size - ширина миниатюры)"""
+    if not 1 <= image_num <= MAX_PHOTOS:
+        raise HTTPException(status_code=404, detail="Image not found")
+    if size is not None and size not in THUMBNAIL_WIDTHS:
+        raise HTTPException(status_code=400, detail=f"size must be one of {THUMBNAIL_WIDTHS}")
 
-    # Читаем и валидируем JSON
-    if os.path.exists(photos_path):
-        try:
-            with open(photos_path, "r", encoding="utf-8") as f:
-                content = f.read().strip()
-
-                # Удаляем все после последнего корректного закрытия массива
-                last_valid_bracket = content.rfind(']')
-                if last_valid_bracket > 0:
-                    content = content[:last_valid_bracket + 1]
-
-                # Удаляем все строки с timestamp
-                lines = [line for line in content.split('\n')
-                         if '"timestamp"' not in line and line.strip()]
-                cleaned_content = '\n'.join(lines)
-
-                try:
-                    data = json.loads(cleaned_content)
-                    if isinstance(data, list):
-                        # Удаляем дубликаты по image_url
-                        unique_photos = []
-                        seen_urls = set()
-                        for photo in data:
-                            if isinstance(photo, dict) and 'image_url' in photo:
-                                if photo['image_url'] not in seen_urls:
-                                    seen_urls.add(photo['image_url'])
-                                    unique_photos.append(photo)
-                        return {"photos": unique_photos}
-                    return {"photos": []}
-                except json.JSONDecodeError as e:
-                    logger.error(f"Invalid JSON in photo file: {str(e)}")
-                    return {"photos": [], "error": "Invalid photo data format"}
-        except Exception as e:
-            logger.error(f"Error reading photos file: {str(e)}")
-            return {"photos": [], "error": str(e)}
+    try:
+        cached = await _cached_image(product_id, image_num, size)
+    except httpx.HTTPError as e:
+        logger.error(f"Image fetch failed for {product_id}/{image_num}: {str(e)}")
+        raise HTTPException(status_code=502, detail="Image fetch failed")
+    if cached is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    sha, content_type = cached
 
-    return {"photos": [], "status": "not_found"}
+    etag = f'"{sha}"'
+    headers = {"ETag": etag, "Cache-Control": IMAGE_CACHE_CONTROL}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(image_cache.blob_path(sha, content_type), media_type=content_type, headers=headers)
 
 
 @app.get("/api/product/{product_id}")
 async def get_product_data(product_id: int):
     """Check for product data including characteristics"""
-    # 1. Check direct API first
+    # 1. Сначала прямой запрос к API
     api_data = await _fetch_direct_api(product_id)
     if api_data:
         return api_data
 
-    # 2. Check if there's a recently saved file
-    product_file = get_scrapy_data_path(f"product_{product_id}_*.json")
-    recent_files = sorted(glob.glob(product_file), key=os.path.getmtime, reverse=True)
-
-    if recent_files:
-        try:
-            with open(recent_files[0], "r", encoding="utf-8") as f:
-                data = json.load(f)
-                return data[0] if isinstance(data, list) else data
-        except Exception as e:
-            logger.error(f"Error reading product file: {str(e)}")
+    # 2. Характеристики, сохраненные последним краулом деталей
+    try:
+        details = product_store.get_details(product_id)
+    except Exception as e:
+        logger.error(f"Error reading product store: {str(e)}")
+        details = None
+    if details:
+        return details
 
     return {"status": "not_found"}
 
 
-@app.post("/analyze-product")
-async def analyze_product(data: dict):
+HISTORY_MAX_POINTS = 10000
+
+
+def _parse_time(value: Optional[str]) -> Optional[float]:
+    """Unix-время в секундах или дата ISO 8601"""
+    if value is None or not value.strip():
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+@app.get("/api/product/{product_id}/history")
+async def get_product_history(product_id: int, start: Optional[str] = None, end: Optional[str] = None,
+                              limit: int = 1000):
+    """История цены и наличия товара за период"""
     try:
-        PROMPT_TEMPLATE = """
+        start_ts, end_ts = _parse_time(start), _parse_time(end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid_time")
+    if start_ts is not None and end_ts is not None and start_ts > end_ts:
+        raise HTTPException(status_code=400, detail="start_after_end")
+    limit = max(1, min(limit, HISTORY_MAX_POINTS))
+
+    points = await asyncio.to_thread(price_history.get_range, product_id, start_ts, end_ts, limit)
+    return {"product_id": product_id, "count": len(points), "points": points}
+
+
+BULK_MAX_IDS = 5000
+BULK_CONCURRENCY = 32
+
+
+def _parse_product_ids(raw) -> list:
+    """Список ID из массива или строки через запятую, без дубликатов"""
+    if isinstance(raw, str):
+        raw = raw.split(',')
+    if not isinstance(raw, list):
+        raise ValueError("product_ids must be a list or a comma-separated string")
+    ids = [int(str(pid).strip()) for pid in raw if str(pid).strip()]
+    return list(dict.fromkeys(ids))
+
+
+async def _stream_products(product_ids: list, concurrency: int):
+    """Загружает card.json параллельно и отдает NDJSON по мере готовности"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch_one(product_id):
+        async with semaphore:
+            return product_id, await _fetch_direct_api(product_id)
+
+    tasks = [asyncio.create_task(fetch_one(pid)) for pid in product_ids]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            product_id, data = await next_done
+            if not data:
+                data = {"product_id": product_id, "status": "not_found"}
+            yield dumps(data) + b"\n"
+    finally:
+        # Клиент отключился - не продолжаем загрузку
+        for task in tasks:
+            task.cancel()
+
+
+@app.post("/api/products")
+async def get_products_bulk(data: dict):
+    """Пакетная загрузка карточек товаров, ответ в формате NDJSON"""
+    try:
+        product_ids = _parse_product_ids(data.get('product_ids', []))
+        concurrency = int(data.get('concurrency', BULK_CONCURRENCY))
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not product_ids:
+        raise HTTPException(status_code=400, detail="product_ids is empty")
+    if len(product_ids) > BULK_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"Too many product_ids (max {BULK_MAX_IDS})")
+
+    concurrency = max(1, min(concurrency, BULK_CONCURRENCY))
+    return StreamingResponse(
+        _stream_products(product_ids, concurrency),
+        media_type="application/x-ndjson"
+    )
+
+
+ANALYSIS_MODEL = "mistral-tiny"
+ANALYSIS_MAX_TOKENS = 1000
+ANALYSIS_MAX_RETRIES = 4
+ANALYSIS_RETRY_BASE_DELAY = 1.0
+ANALYSIS_RETRY_MAX_DELAY = 30.0
+ANALYZE_BATCH_MAX = 500
+# Сколько первых товаров каждого поиска анализировать заранее (0 - выключено)
+ANALYSIS_PRECOMPUTE_TOP = int(os.getenv("ANALYSIS_PRECOMPUTE_TOP", "0"))
+
+ANALYSIS_PROMPT_TEMPLATE = """
         Проанализируй товар для интернет-магазина Wildberries. 
         Ты - опытный продавец-консультант, который помогает покупателям сделать выбор.
         Ответ должен быть менее 300 символов! Нельзя называть артикул товара (Товар #367782204 - ТАК НЕЛЬЗЯ)
@@ -563,78 +1123,323 @@ async def analyze_product(data: dict):
         Используй маркированные списки для удобства чтения.
         Ответ должен быть менее 300 символов! Нельзя называть артикул товара (Товар #367782204 - ТАК НЕЛЬЗЯ)
         """
-        # 1. Безопасное формирование спецификаций
-        specs = []
-        for opt in data.get('options', []):
-            try:
-                group = str(opt.get('group', '')).strip()
-                name = str(opt.get('name', '')).strip()
-                value = str(opt.get('value', '')).strip()
-                if name and value:
-                    specs.append(f"- {group} {name}: {value}")
-            except Exception as e:
-                logger.warning(f"Ошибка обработки характеристики: {opt} - {str(e)}")
 
-        specs_str = "\n".join(specs) if specs else "Нет характеристик"
 
-        # 2. Безопасное форматирование цены
+def _prompt_value(value) -> str:
+    # 5.0 и 5 (так число приходит из JSON браузера) дают одинаковый промпт
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def _analysis_input(product: dict) -> dict:
+    """Данные для анализа в том виде, в каком их отправляет страница товара
+    (prepareProductData в product_details.html), чтобы совпадал ключ кэша"""
+    product_id = product.get('product_id')
+    data = {field: product.get(field, '') for field in (
+        'product_id', 'description', 'price', 'rating', 'reviews_count', 'vendor_code'
+    )}
+    # В card.json название - imt_name, бренд - selling.brand_name
+    data['name'] = product.get('imt_name') or product.get('name', f"Товар #{product_id}")
+    data['brand'] = product.get('brand') or (product.get('selling') or {}).get('brand_name') or ''
+    options = list(product.get('options') or [])
+    for group in product.get('grouped_options') or []:
+        for option in group.get('options', []):
+            options.append({'group': group.get('group_name'), 'name': option.get('name'),
+                            'value': option.get('value')})
+    data['options'] = options
+    return data
+
+
+def _analysis_prompt(data: dict) -> str:
+    # 1. Безопасное формирование спецификаций
+    specs = []
+    for opt in data.get('options', []):
         try:
-            price = int(float(data.get('price', 0)))
-            price_str = f"{price} ₽"
-        except:
-            price_str = "Нет данных"
-
-        # 3. Формирование промпта с защитой от ошибок
-        prompt = PROMPT_TEMPLATE.format(
-            name=str(data.get('name', 'Не указано')).replace('\n', ' ').strip(),
-            brand=str(data.get('brand', 'Не указан')).replace('\n', ' ').strip(),
-            description=str(data.get('description', 'Нет описания')).replace('\n', ' ').strip(),
-            price=price_str,
-            rating=str(data.get('rating', 'Нет рейтинга')),
-            reviews_count=str(data.get('reviews_count', '0')),
-            vendor_code=str(data.get('vendor_code', 'Нет артикула')),
-            specs=specs_str
-        )
+            group = str(opt.get('group', '')).strip()
+            name = str(opt.get('name', '')).strip()
+            value = str(opt.get('value', '')).strip()
+            if name and value:
+                specs.append(f"- {group} {name}: {value}")
+        except Exception as e:
+            logger.warning(f"Ошибка обработки характеристики: {opt} - {str(e)}")
+
+    # Повторяющиеся характеристики (options и grouped_options одновременно) - один раз
+    specs_str = "\n".join(dict.fromkeys(specs)) if specs else "Нет характеристик"
+
+    # 2. Безопасное форматирование цены
+    try:
+        price = int(float(data.get('price', 0)))
+        price_str = f"{price} ₽"
+    except:
+        price_str = "Нет данных"
+
+    # 3. Формирование промпта с защитой от ошибок
+    return ANALYSIS_PROMPT_TEMPLATE.format(
+        name=str(data.get('name', 'Не указано')).replace('\n', ' ').strip(),
+        brand=str(data.get('brand', 'Не указан')).replace('\n', ' ').strip(),
+        description=str(data.get('description', 'Нет описания')).replace('\n', ' ').strip(),
+        price=price_str,
+        rating=_prompt_value(data.get('rating', 'Нет рейтинга')),
+        reviews_count=_prompt_value(data.get('reviews_count', '0')),
+        vendor_code=str(data.get('vendor_code', 'Нет артикула')),
+        specs=specs_str
+    )
+
+
+def _analysis_key(prompt: str) -> str:
+    return hashlib.sha256(f"{ANALYSIS_MODEL}\n{prompt}".encode("utf-8")).hexdigest()
+
 
-        # 2. Запрос к Mistral с таймаутом
-        async with httpx.AsyncClient() as client:
-            logger.info("3/4: Отправка запроса к Mistral API...")
-            response = await client.post(
-                "https://api.mistral.ai/v1/chat/completions",
+def _estimate_tokens(prompt: str) -> int:
+    """Грубая оценка токенов запроса для бюджета: промпт (кириллица ~3 символа на токен) и ответ"""
+    return len(prompt) // 3 + ANALYSIS_MAX_TOKENS
+
+
+def _retry_delay(response: httpx.Response, attempt: int) -> float:
+    """Пауза перед повтором после 429: Retry-After или экспоненциальная задержка"""
+    try:
+        return min(float(response.headers["Retry-After"]), ANALYSIS_RETRY_MAX_DELAY)
+    except (KeyError, ValueError):
+        delay = min(ANALYSIS_RETRY_BASE_DELAY * 2 ** attempt, ANALYSIS_RETRY_MAX_DELAY)
+        return delay * random.uniform(0.8, 1.2)
+
+
+@asynccontextmanager
+async def _mistral_completion(prompt: str, stream: bool = False):
+    """Ответ Mistral со статусом 200 и резерв в llm_budget на время его чтения.
+
+    Запрос идет через общий пул соединений (таймаут задан в пуле), ответ 429
+    повторяется с паузой, прочие ошибки - HTTPException 502.
+    """
+    for attempt in range(ANALYSIS_MAX_RETRIES + 1):
+        async with llm_budget.reserve(_estimate_tokens(prompt)) as reservation:
+            logger.info("Отправка запроса к Mistral API...")
+            async with http_clients.mistral.stream(
+                "POST",
+                "/v1/chat/completions",
                 headers={
                     "Authorization": f"Bearer {'KhI0YjFOxFbXlPKeoVCxCqu1yhYYBxRz'}",
                     "Content-Type": "application/json"
                 },
                 json={
-                    "model": "mistral-tiny",
+                    "model": ANALYSIS_MODEL,
                     "messages": [{"role": "user", "content": prompt}],
                     "temperature": 0.7,
-                    "max_tokens": 1000
+                    "max_tokens": ANALYSIS_MAX_TOKENS,
+                    "stream": stream
                 },
-                timeout=30.0  # Увеличенный таймаут
-            )
+            ) as response:
+                logger.info(f"Получен ответ {response.status_code}")
+                if response.status_code == 200:
+                    yield response, reservation
+                    return
+
+                await response.aread()
+                if response.status_code != 429:
+                    error_msg = f"Mistral API error: {response.text}"
+                    logger.error(error_msg)
+                    raise HTTPException(status_code=502, detail=error_msg)
+                llm_budget.settle(reservation, 0)
+
+        if attempt < ANALYSIS_MAX_RETRIES:
+            delay = _retry_delay(response, attempt)
+            logger.warning(f"Mistral API rate limit, retry in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    raise HTTPException(status_code=503, detail="llm_rate_limited")
+
+
+async def _request_analysis(prompt: str) -> str:
+    """Полный ответ Mistral одним куском"""
+    async with _mistral_completion(prompt) as (response, reservation):
+        result = loads(await response.aread())
+        if usage := result.get('usage'):
+            llm_budget.settle(reservation, int(usage.get('total_tokens', reservation[1])))
+
+    if not result.get('choices'):
+        logger.error(f"Неожиданный формат ответа: {result}")
+        raise HTTPException(status_code=502, detail="Неверный формат ответа от Mistral")
+
+    content = result['choices'][0]['message']['content'].strip()
+    if not content:
+        raise HTTPException(status_code=502, detail="Пустой ответ от Mistral")
+    return content
+
+
+async def _stream_analysis(prompt: str):
+    """Фрагменты ответа Mistral по мере генерации (stream=true, события SSE)"""
+    async with _mistral_completion(prompt, stream=True) as (response, reservation):
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            payload = line[5:].strip()
+            if payload == "[DONE]":
+                break
+            chunk = loads(payload)
+            if usage := chunk.get('usage'):
+                llm_budget.settle(reservation, int(usage.get('total_tokens', reservation[1])))
+            for choice in chunk.get('choices') or []:
+                if text := (choice.get('delta') or {}).get('content'):
+                    yield text
+
+
+async def _analyze(data: dict) -> str:
+    """Анализ товара; повторный запрос с тем же промптом отдается из кэша без обращения к ИИ"""
+    prompt = _analysis_prompt(data)
+    return await response_cache.get_or_fetch(
+        "analysis", _analysis_key(prompt), lambda: _request_analysis(prompt)
+    )
+
+
+async def _analysis_events(data: dict):
+    """SSE: token - очередной фрагмент анализа, done - весь анализ, error - ошибка"""
+    prompt = _analysis_prompt(data)
+    key = _analysis_key(prompt)
+    cached = await response_cache.lookup("analysis", key)
+    if cached:
+        yield _sse("token", {"text": cached})
+        yield _sse("done", {"analysis": cached, "cached": True})
+        return
 
-            logger.info(f"4/4: Получен ответ {response.status_code}")
+    parts = []
+    try:
+        async with aclosing(_stream_analysis(prompt)) as tokens:
+            async for text in tokens:
+                parts.append(text)
+                yield _sse("token", {"text": text})
+    except HTTPException as e:
+        yield _sse("error", {"error": e.detail})
+        return
+    except httpx.TimeoutException:
+        logger.error("Таймаут при запросе к Mistral API")
+        yield _sse("error", {"error": "Таймаут запроса к ИИ"})
+        return
+    except Exception as e:
+        logger.error(f"Неожиданная ошибка: {str(e)}")
+        yield _sse("error", {"error": str(e)})
+        return
 
-            if response.status_code != 200:
-                error_msg = f"Mistral API error: {response.text}"
-                logger.error(error_msg)
-                raise HTTPException(status_code=502, detail=error_msg)
+    analysis = "".join(parts).strip()
+    if not analysis:
+        yield _sse("error", {"error": "Пустой ответ от Mistral"})
+        return
+    response_cache.set("analysis", key, analysis)
+    yield _sse("done", {"analysis": analysis, "cached": False})
 
-            result = response.json()
-            if not result.get('choices'):
-                logger.error(f"Неожиданный формат ответа: {result}")
-                raise HTTPException(status_code=502, detail="Неверный формат ответа от Mistral")
 
-            content = result['choices'][0]['message']['content'].strip()
-            if not content:
-                raise HTTPException(status_code=502, detail="Пустой ответ от Mistral")
+@app.post("/analyze-product")
+async def analyze_product(request: Request, data: dict, stream: bool = False):
+    """AI-анализ товара: JSON целиком или, при ?stream=true / Accept: text/event-stream,
+    фрагменты ответа через Server-Sent Events по мере генерации"""
+    if stream or "text/event-stream" in request.headers.get("accept", ""):
+        return StreamingResponse(
+            _analysis_events(data),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
 
-            return {"analysis": content}
+    try:
+        return {"analysis": await _analyze(data)}
 
+    except HTTPException:
+        raise
     except httpx.TimeoutException:
         logger.error("Таймаут при запросе к Mistral API")
         raise HTTPException(status_code=504, detail="Таймаут запроса к ИИ")
     except Exception as e:
         logger.error(f"Неожиданная ошибка: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _analyze_product_id(product_id: int) -> str:
+    product = await _product_base_data(product_id)
+    if not (product.get('imt_id') or product.get('imt_name')):
+        # Карточки нет - анализировать нечего
+        raise HTTPException(status_code=404, detail="not_found")
+    return await _analyze(_analysis_input(product))
+
+
+def _analysis_error(e: Exception) -> str:
+    if isinstance(e, HTTPException):
+        return str(e.detail)
+    if isinstance(e, httpx.TimeoutException):
+        return "timeout"
+    return str(e)
+
+
+async def _stream_analyses(jobs: list):
+    """Анализирует товары параллельно (в пределах llm_budget) и отдает NDJSON по мере готовности"""
+
+    async def analyze_one(product_id, run):
+        try:
+            return {"product_id": product_id, "analysis": await run()}
+        except Exception as e:
+            logger.warning(f"Batch analysis of {product_id} failed: {e}")
+            return {"product_id": product_id, "status": "error", "error": _analysis_error(e)}
+
+    tasks = [asyncio.create_task(analyze_one(product_id, run)) for product_id, run in jobs]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield dumps(await next_done) + b"\n"
+    finally:
+        # Клиент отключился - не продолжаем анализ
+        for task in tasks:
+            task.cancel()
+
+
+@app.post("/api/analyze/batch")
+async def analyze_batch(data: dict):
+    """Пакетный AI-анализ: товары (как для /analyze-product) и/или product_ids, ответ в NDJSON"""
+    products = data.get('products') or []
+    try:
+        if not isinstance(products, list) or not all(isinstance(p, dict) for p in products):
+            raise ValueError("products must be a list of objects")
+        product_ids = _parse_product_ids(data.get('product_ids', []))
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not products and not product_ids:
+        raise HTTPException(status_code=400, detail="products is empty")
+    if len(products) + len(product_ids) > ANALYZE_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"Too many products (max {ANALYZE_BATCH_MAX})")
+
+    jobs = [(p.get('product_id', n), lambda p=p: _analyze(p)) for n, p in enumerate(products)]
+    jobs += [(pid, lambda pid=pid: _analyze_product_id(pid)) for pid in product_ids]
+    return StreamingResponse(_stream_analyses(jobs), media_type="application/x-ndjson")
+
+
+async def _run_analysis_precompute_job(params: dict):
+    """Заранее заполняет кэш анализов для товаров из результатов краула"""
+    results = await asyncio.gather(
+        *(_analyze_product_id(pid) for pid in params["product_ids"]), return_exceptions=True
+    )
+    failed = [str(r) for r in results if isinstance(r, BaseException)]
+    if failed and len(failed) == len(results):
+        raise CrawlError(f"Analysis precompute failed: {failed[0]}")
+    return {"analyzed": len(results) - len(failed), "failed": len(failed)}
+
+
+job_queue.register("analysis_precompute", _run_analysis_precompute_job)
+
+
+async def _schedule_analysis_precompute(products: list):
+    """Ставит в очередь анализ первых ANALYSIS_PRECOMPUTE_TOP товаров поиска"""
+    if ANALYSIS_PRECOMPUTE_TOP <= 0:
+        return
+    product_ids = [p["product_id"] for p in products if p.get("product_id") is not None]
+    product_ids = list(dict.fromkeys(product_ids))[:ANALYSIS_PRECOMPUTE_TOP]
+    if not product_ids:
+        return
+    await job_queue.enqueue(
+        "analysis_precompute", {"product_ids": product_ids},
+        priority=-10, max_attempts=2,
+        dedup_key="analysis:" + ",".join(map(str, product_ids))
+    )
+
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Попадания и промахи кэша по типам ресурсов (в т.ч. analysis - анализы ИИ)
+    и расход бюджета запросов к ИИ"""
+    return {**response_cache.stats(), "llm_budget": llm_budget.stats()}
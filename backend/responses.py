@@ -0,0 +1,12 @@
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+from wildberries_parser.serialization import dumps
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse через быстрый сериализатор (orjson/msgspec, если установлены)"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,31 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """Объединяет одновременные загрузки одного ресурса в одну.
+
+    Пока загрузка по ключу выполняется, остальные вызовы с тем же ключом
+    ждут ее результат вместо того, чтобы запускать свою.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fetcher: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is not None:
+            # shield: отмена одного ожидающего не отменяет общую загрузку
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(fetcher())
+        self._inflight[key] = future
+        future.add_done_callback(lambda f: self._forget(key, f))
+        return await asyncio.shield(future)
+
+    def _forget(self, key, future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._inflight
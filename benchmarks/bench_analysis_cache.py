@@ -0,0 +1,77 @@
+"""Бенчмарк: AI-анализ товара без кэша и из кэша по хэшу промпта.
+
+Mistral заменяется локальным сервером с искусственной задержкой, поэтому
+ключ API и сеть не нужны. Кэш пишется во временный каталог.
+
+Запуск из корня проекта:
+    python benchmarks/bench_analysis_cache.py --products 20 --latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.mistral_stub import MistralHandler, start_server  # noqa: E402
+
+BACKEND_DIR = Path(__file__).parent.parent / "backend"
+
+
+def product(i, price=1000):
+    return {"name": f"Товар {i}", "brand": "Бренд", "description": "Описание", "price": price,
+            "rating": 4.8, "reviews_count": 10, "vendor_code": str(i),
+            "options": [{"group": "", "name": "Цвет", "value": "черный"}]}
+
+
+async def timed(client, data):
+    started = time.perf_counter()
+    response = await client.post("/analyze-product", json=data)
+    response.raise_for_status()
+    return (time.perf_counter() - started) * 1000
+
+
+async def run(main, products):
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            miss = [await timed(client, product(i)) for i in range(products)]
+            hit = [await timed(client, product(i)) for i in range(products)]
+            # Изменение полей товара меняет промпт, а значит и ключ кэша
+            changed = [await timed(client, product(i, price=999)) for i in range(products)]
+            stats = (await client.get("/api/cache/stats")).json()["analysis"]
+    return miss, hit, changed, stats
+
+
+def main(products, latency):
+    MistralHandler.latency = latency
+    server = start_server()
+    os.environ["MISTRAL_API_URL"] = f"http://127.0.0.1:{server.server_port}"
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.chdir(BACKEND_DIR)
+
+    import main as backend  # noqa: E402
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend.response_cache.disk_dir = Path(tmp)
+        miss, hit, changed, stats = asyncio.run(run(backend, products))
+
+    for name, latencies in (("miss", miss), ("hit", hit), ("changed product", changed)):
+        print(f"{name:<16} median {statistics.median(latencies):8.2f} ms  max {max(latencies):8.2f} ms")
+    print(f"calls to Mistral stand-in: {MistralHandler.calls} (expected {2 * products})")
+    print(f"cache stats: {stats}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.5, help="задержка ответа Mistral, с")
+    args = parser.parse_args()
+    main(args.products, args.latency)
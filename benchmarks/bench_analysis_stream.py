@@ -0,0 +1,98 @@
+"""Бенчмарк: время до первого фрагмента AI-анализа в режиме SSE против
+ожидания полного JSON-ответа /analyze-product.
+
+Mistral заменяется локальным сервером (benchmarks/mistral_stub.py), который
+генерирует --tokens фрагментов с паузой --token-delay после --latency.
+
+Запуск из корня проекта:
+    python benchmarks/bench_analysis_stream.py --products 5 --latency 0.3 --tokens 60 --token-delay 0.03
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.mistral_stub import MistralHandler, start_server  # noqa: E402
+from benchmarks.bench_analysis_cache import product  # noqa: E402
+from benchmarks.bench_analyze_batch import serve  # noqa: E402
+
+BACKEND_DIR = Path(__file__).parent.parent / "backend"
+
+
+async def json_mode(client, data):
+    started = time.perf_counter()
+    response = await client.post("/analyze-product", json=data)
+    response.raise_for_status()
+    elapsed = time.perf_counter() - started
+    return elapsed, elapsed, response.json()["analysis"]
+
+
+async def sse_mode(client, data):
+    started = time.perf_counter()
+    first = None
+    parts = []
+    event = None
+    async with client.stream("POST", "/analyze-product", json=data,
+                             headers={"Accept": "text/event-stream"}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:") and event == "token":
+                first = first or time.perf_counter() - started
+                parts.append(httpx.Response(200, content=line[5:]).json()["text"])
+            elif line.startswith("data:") and event == "error":
+                raise RuntimeError(line[5:])
+    return first, time.perf_counter() - started, "".join(parts)
+
+
+async def run(main, products):
+    async with serve(main.app) as client:
+        results = {}
+        for name, mode, price in (("json", json_mode, 1000), ("sse", sse_mode, 999)):
+            results[name] = [await mode(client, product(i, price=price)) for i in range(products)]
+        # Повтор - из кэша анализов, одним событием token
+        results["sse cached"] = [await sse_mode(client, product(i, price=999)) for i in range(products)]
+    return results
+
+
+def main(products, latency, tokens, token_delay):
+    MistralHandler.latency = latency
+    MistralHandler.token_delay = token_delay
+    MistralHandler.tokens = [f" слово{n}" for n in range(tokens)]
+    server = start_server()
+    os.environ["MISTRAL_API_URL"] = f"http://127.0.0.1:{server.server_port}"
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.chdir(BACKEND_DIR)
+
+    import main as backend  # noqa: E402
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend.response_cache.disk_dir = Path(tmp)
+        results = asyncio.run(run(backend, products))
+
+    expected = "".join(MistralHandler.tokens).strip()
+    for name, rows in results.items():
+        first = statistics.median(r[0] for r in rows) * 1000
+        total = statistics.median(r[1] for r in rows) * 1000
+        complete = all(r[2].strip() == expected for r in rows)
+        print(f"{name:<11} first fragment {first:8.1f} ms  full answer {total:8.1f} ms  complete={complete}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.3, help="время до первого токена, с")
+    parser.add_argument("--tokens", type=int, default=60)
+    parser.add_argument("--token-delay", type=float, default=0.03, help="пауза между токенами, с")
+    args = parser.parse_args()
+    main(args.products, args.latency, args.tokens, args.token_delay)
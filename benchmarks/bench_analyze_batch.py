@@ -0,0 +1,115 @@
+"""Бенчмарк: AI-анализ страницы результатов по одному запросу на товар
+против POST /api/analyze/batch с общим бюджетом и повтором 429.
+
+Mistral заменяется локальным сервером (benchmarks/mistral_stub.py), который
+отвечает 429, если одновременных запросов больше --provider-limit.
+
+Запуск из корня проекта:
+    python benchmarks/bench_analyze_batch.py --products 40 --latency 0.3 --concurrency 4 --provider-limit 3
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import httpx
+import uvicorn
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.mistral_stub import MistralHandler, start_server  # noqa: E402
+from benchmarks.bench_analysis_cache import product  # noqa: E402
+
+BACKEND_DIR = Path(__file__).parent.parent / "backend"
+
+
+async def sequential(client, products):
+    for data in products:
+        response = await client.post("/analyze-product", json=data)
+        response.raise_for_status()
+
+
+async def batch(client, products):
+    first = None
+    lines = []
+    started = time.perf_counter()
+    async with client.stream("POST", "/api/analyze/batch", json={"products": products}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line:
+                first = first or time.perf_counter() - started
+                lines.append(line)
+    errors = sum('"error"' in line for line in lines)
+    return first, len(lines), errors
+
+
+@asynccontextmanager
+async def serve(app):
+    """Клиент к приложению, запущенному настоящим сервером uvicorn: ASGITransport
+    буферизует ответ целиком, и потоковую выдачу через него не измерить"""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning"))
+    serving = asyncio.create_task(server.serve(sockets=[sock]))
+    while not server.started:
+        await asyncio.sleep(0.05)
+    try:
+        base_url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+        async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+            yield client
+    finally:
+        server.should_exit = True
+        await serving
+
+
+async def run(main, products):
+    async with serve(main.app) as client:
+        started = time.perf_counter()
+        await sequential(client, [product(i) for i in range(products)])
+        seq = time.perf_counter() - started
+
+        started = time.perf_counter()
+        first, count, errors = await batch(client, [product(i, price=999) for i in range(products)])
+        total = time.perf_counter() - started
+        stats = (await client.get("/api/cache/stats")).json()["llm_budget"]
+    return seq, total, first, count, errors, stats
+
+
+def main(products, latency, concurrency, provider_limit):
+    MistralHandler.latency = latency
+    MistralHandler.max_concurrent = provider_limit
+    server = start_server()
+    os.environ["MISTRAL_API_URL"] = f"http://127.0.0.1:{server.server_port}"
+    os.environ["LLM_CONCURRENCY"] = str(concurrency)
+    os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "10000")
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.chdir(BACKEND_DIR)
+
+    import main as backend  # noqa: E402
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend.response_cache.disk_dir = Path(tmp)
+        seq, total, first, count, errors, stats = asyncio.run(run(backend, products))
+
+    print(f"sequential /analyze-product: {seq:7.2f} s for {products} products")
+    print(f"/api/analyze/batch:          {total:7.2f} s, first result after {first * 1000:.0f} ms, "
+          f"{count} lines, {errors} errors  x{seq / total:.1f}")
+    print(f"provider calls: {MistralHandler.calls}, rejected with 429: {MistralHandler.rejected}")
+    print(f"llm budget: {stats}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.3, help="задержка ответа Mistral, с")
+    parser.add_argument("--concurrency", type=int, default=4, help="LLM_CONCURRENCY")
+    parser.add_argument("--provider-limit", type=int, default=3,
+                        help="одновременных запросов до 429 у заглушки (0 - без ограничения)")
+    args = parser.parse_args()
+    main(args.products, args.latency, args.concurrency, args.provider_limit)
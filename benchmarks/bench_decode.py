@@ -0,0 +1,81 @@
+"""Бенчмарк: разбор страницы search.wb.ru в товары.
+
+Сравнивается прежний обход словарей (json.loads + .get() по вложенным полям,
+цены делением на 100) с типизированным декодированием search_api.
+
+Запуск из корня проекта:
+    python benchmarks/bench_decode.py --products 100 --rounds 500 [--payload recorded_search.json]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.payloads import load_payload  # noqa: E402
+from wildberries_parser import search_api  # noqa: E402
+from wildberries_parser.serialization import BACKEND, loads  # noqa: E402
+
+
+def dict_walk(body, json_loads=json.loads):
+    """Разбор как в прежнем extract_product_data"""
+    data = json_loads(body)
+    rows = []
+    for product_data in data.get('data', {}).get('products', []):
+        size_data = product_data.get('sizes', [{}])[0]
+        price_data = size_data.get('price', {})
+        rows.append((
+            product_data.get('id'),
+            product_data.get('name'),
+            product_data.get('brand'),
+            float(price_data.get('product', 0)) / 100,
+            float(price_data.get('basic', 0)) / 100,
+            product_data.get('reviewRating', 0),
+            product_data.get('feedbacks', 0),
+            product_data.get('entity'),
+            product_data.get('supplierId'),
+            product_data.get('totalQuantity', 0) > 0,
+        ))
+    return rows
+
+
+def typed(body):
+    return [
+        (p.id, p.name, p.brand, p.price, p.sale_price, p.review_rating, p.feedbacks,
+         p.entity, p.supplier_id, (p.total_quantity or 0) > 0)
+        for p in search_api.decode_search_products(body)
+    ]
+
+
+def measure(func, body, rounds):
+    func(body)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        func(body)
+    return (time.perf_counter() - started) / rounds
+
+
+def main(products, rounds, payload_path):
+    body = load_payload(payload_path, products)
+    print(f"payload: {len(body) / 1024:.0f} KiB, {rounds} rounds, typed decoder: "
+          f"{'msgspec' if search_api.msgspec else 'dict fallback'}")
+
+    base = measure(dict_walk, body, rounds)
+    cases = [
+        ("dict walk (json)", base),
+        (f"dict walk ({BACKEND})", measure(lambda b: dict_walk(b, loads), body, rounds)),
+        ("typed decode", measure(typed, body, rounds)),
+    ]
+    for name, seconds in cases:
+        print(f"{name:<22} {seconds * 1000:7.3f} ms/page  x{base / seconds:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=500)
+    parser.add_argument("--payload", help="записанный ответ search.wb.ru")
+    args = parser.parse_args()
+    main(args.products, args.rounds, args.payload)
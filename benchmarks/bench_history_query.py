@@ -0,0 +1,120 @@
+"""Бенчмарк: страницы истории поиска и популярные запросы на большой таблице.
+
+Сравниваются OFFSET-пагинация с keyset-пагинацией get_history и подсчет
+популярных запросов GROUP BY по всей истории с агрегатом search_query_stats.
+Таблица заполняется --rows синтетическими строками во временном каталоге.
+
+Запуск из корня проекта:
+    python benchmarks/bench_history_query.py --rows 2000000 --page 100
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import text
+
+BACKEND_DIR = Path(__file__).parent.parent / "backend"
+
+
+def fill(path, rows):
+    """История за год: строки пишутся напрямую, агрегаты строит init_db"""
+    rng = random.Random(1)
+    queries = [f"запрос {n}" for n in range(20000)]
+    started = datetime(2025, 10, 1)
+    step = timedelta(days=365) / rows
+    conn = sqlite3.connect(str(path))
+    conn.execute(
+        "CREATE TABLE search_history (id INTEGER PRIMARY KEY, query VARCHAR(255) NOT NULL, "
+        "category VARCHAR(100), pages INTEGER NOT NULL, items_count INTEGER NOT NULL, "
+        "min_price INTEGER, max_price INTEGER, search_date DATETIME)"
+    )
+    conn.executemany(
+        "INSERT INTO search_history (query, category, pages, items_count, search_date) VALUES (?, ?, 1, 10, ?)",
+        ((queries[min(int(rng.paretovariate(1.2)) - 1, len(queries) - 1)], None,
+          (started + step * n).strftime("%Y-%m-%d %H:%M:%S.%f")) for n in range(rows))
+    )
+    conn.commit()
+    conn.close()
+
+
+async def timed(coro):
+    started = time.perf_counter()
+    result = await coro
+    return (time.perf_counter() - started) * 1000, result
+
+
+async def offset_page(database, offset, page):
+    async with database.engine.connect() as conn:
+        result = await conn.execute(text(
+            "SELECT * FROM search_history ORDER BY search_date DESC, id DESC LIMIT :page OFFSET :offset"
+        ), {"page": page, "offset": offset})
+        return result.fetchall()
+
+
+async def keyset_page(database, offset, page):
+    """Та же страница по курсору: курсор берется из последней строки предыдущей страницы"""
+    cursor = None
+    if offset:
+        last = (await offset_page(database, offset - 1, 1))[0]
+        cursor = database.encode_cursor({"search_date": datetime.fromisoformat(last.search_date), "id": last.id})
+    elapsed, _ = await timed(database.get_history(limit=page, cursor=cursor))
+    return elapsed
+
+
+async def group_by_top(database):
+    async with database.engine.connect() as conn:
+        result = await conn.execute(text(
+            "SELECT query, COUNT(*) AS n FROM search_history GROUP BY query ORDER BY n DESC LIMIT 10"
+        ))
+        return result.fetchall()
+
+
+async def run(rows, page):
+    import database
+
+    started = time.perf_counter()
+    await database.init_db()
+    print(f"init_db (indexes and rollups for {rows} rows): {time.perf_counter() - started:.1f} s")
+
+    # Прогрев: первая компиляция запросов SQLAlchemy не относится к базе
+    await keyset_page(database, 0, page)
+    await keyset_page(database, page, page)
+    for pages in (1, 1000, rows // page):
+        offset_ms, _ = await timed(offset_page(database, (pages - 1) * page, page))
+        keyset_ms = await keyset_page(database, (pages - 1) * page, page)
+        print(f"page {pages:>5}: OFFSET {offset_ms:8.2f} ms   keyset {keyset_ms:6.2f} ms")
+
+    group_ms, group = await timed(group_by_top(database))
+    rollup_ms, top = await timed(database.get_top_queries(limit=10))
+    same = [r[0] for r in group] == [r["query"] for r in top]
+    print(f"top queries: GROUP BY {group_ms:8.2f} ms   rollup {rollup_ms:6.2f} ms   same={same}")
+
+    hourly_ms, hourly = await timed(database.get_hourly_counts(since=datetime(2026, 9, 1)))
+    print(f"hourly counts for a month: {hourly_ms:.2f} ms ({len(hourly)} hours)")
+    await database.engine.dispose()
+
+
+def main(rows, page):
+    sys.path.insert(0, str(BACKEND_DIR))
+    with tempfile.TemporaryDirectory() as tmp:
+        # database.py открывает searches.db в текущем каталоге
+        os.chdir(tmp)
+        started = time.perf_counter()
+        fill(Path(tmp) / "searches.db", rows)
+        print(f"filled {rows} rows in {time.perf_counter() - started:.1f} s")
+        asyncio.run(run(rows, page))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000000)
+    parser.add_argument("--page", type=int, default=100)
+    args = parser.parse_args()
+    main(args.rows, args.page)
@@ -0,0 +1,104 @@
+"""Бенчмарк: запись истории поиска коммитом на строку (прежний синхронный
+save_search) против очереди с групповым коммитом.
+
+Для каждого варианта --searches запросов приходят с темпом --rate в секунду;
+измеряется, на сколько запись истории задерживает обработчик, и сколько строк
+оказалось в базе. Базы создаются во временном каталоге.
+
+Запуск из корня проекта:
+    python benchmarks/bench_history_writes.py --searches 2000 --rate 500
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import sessionmaker
+
+BACKEND_DIR = Path(__file__).parent.parent / "backend"
+
+
+def search_args(n):
+    return {"query": f"запрос {n % 300}", "category": None, "pages": 1, "limit": 10,
+            "min_price": None, "max_price": None}
+
+
+async def simulate(save, searches, rate):
+    """Обработчики /search, приходящие с темпом rate; латентность вызова save"""
+    latencies = []
+    interval = 1 / rate
+    started = time.perf_counter()
+    for n in range(searches):
+        delay = started + n * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        t = time.perf_counter()
+        save(**search_args(n))
+        latencies.append((time.perf_counter() - t) * 1000)
+    return latencies
+
+
+def per_row_commit(database, path):
+    engine = create_engine(f"sqlite:///{path}")
+    database.Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+
+    def save(query, category, pages, limit, min_price, max_price):
+        with session_factory() as session:
+            session.execute(insert(database.SearchHistory), [{
+                "query": query, "category": category, "pages": pages, "items_count": limit,
+                "min_price": min_price, "max_price": max_price, "search_date": datetime.utcnow(),
+            }])
+            session.commit()
+
+    def count():
+        with session_factory() as session:
+            return session.scalar(select(func.count()).select_from(database.SearchHistory))
+
+    return save, count
+
+
+async def run(searches, rate):
+    import database
+
+    save, count = per_row_commit(database, Path(os.getcwd()) / "per_row.db")
+    old = await simulate(save, searches, rate)
+    old_rows = count()
+
+    await database.init_db()
+    database.history_writer.start()
+    started = time.perf_counter()
+    new = await simulate(database.save_search, searches, rate)
+    await database.history_writer.stop()
+    drained = time.perf_counter() - started
+    new_rows = len(await database.get_history(limit=searches + 1))
+    await database.engine.dispose()
+
+    for name, latencies, rows in (("commit per row", old, old_rows), ("group commit", new, new_rows)):
+        print(f"{name:<15} save median {statistics.median(latencies):7.3f} ms  "
+              f"p99 {sorted(latencies)[int(len(latencies) * 0.99)]:7.3f} ms  "
+              f"max {max(latencies):7.3f} ms  rows {rows}")
+    print(f"group commit: all rows stored {drained:.2f} s after the first search "
+          f"(ideal {searches / rate:.2f} s)")
+
+
+def main(searches, rate):
+    sys.path.insert(0, str(BACKEND_DIR))
+    with tempfile.TemporaryDirectory() as tmp:
+        # database.py открывает searches.db в текущем каталоге
+        os.chdir(tmp)
+        asyncio.run(run(searches, rate))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--searches", type=int, default=2000)
+    parser.add_argument("--rate", type=int, default=500, help="поисков в секунду")
+    args = parser.parse_args()
+    main(args.searches, args.rate)
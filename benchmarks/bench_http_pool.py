@@ -0,0 +1,93 @@
+"""Бенчмарк: новый httpx.AsyncClient на каждый запрос против общего пула.
+
+Запуск из корня проекта:
+    python benchmarks/bench_http_pool.py --requests 500 --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from http_clients import HttpClients  # noqa: E402
+
+CARD = json.dumps({"imt_id": 1, "nm_id": 251049101, "imt_name": "Товар", "options": []}).encode()
+
+
+class CardHandler(BaseHTTPRequestHandler):
+    """Локальная замена basket-серверов: отдает card.json с keep-alive"""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(CARD)))
+        self.end_headers()
+        self.wfile.write(CARD)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CardHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run(fetch, url, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            response = await fetch(url)
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*(one() for _ in range(total)))
+    return latencies
+
+
+def report(name, latencies):
+    latencies.sort()
+    p50 = statistics.median(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:<22} p50={p50:7.2f} ms  p99={p99:7.2f} ms  n={len(latencies)}")
+
+
+async def main(total, concurrency):
+    server = start_server()
+    url = f"http://127.0.0.1:{server.server_port}/vol2510/part251049/251049101/info/ru/card.json"
+
+    async def fresh_client(url):
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            return await client.get(url)
+
+    report("client per request", await run(fresh_client, url, total, concurrency))
+
+    clients = HttpClients()
+    await clients.start()
+    try:
+        report("shared pool", await run(clients.wb.get, url, total, concurrency))
+    finally:
+        await clients.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
@@ -0,0 +1,49 @@
+"""Бенчмарк: разбор и кодирование ответа search.wb.ru разными JSON-реализациями.
+
+Запуск из корня проекта:
+    python benchmarks/bench_json.py --rounds 200 [--payload recorded_search.json]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.payloads import load_payload  # noqa: E402
+from wildberries_parser.serialization import BACKENDS, get_backend  # noqa: E402
+
+
+def measure(func, arg, rounds):
+    func(arg)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        func(arg)
+    return (time.perf_counter() - started) / rounds
+
+
+def main(rounds, payload_path):
+    payload = load_payload(payload_path)
+    megabytes = len(payload) / 1024 ** 2
+    print(f"payload: {len(payload) / 1024:.0f} KiB, {rounds} rounds")
+
+    results = {}
+    for name, (available, _) in BACKENDS.items():
+        if not available():
+            print(f"{name:<8} not installed")
+            continue
+        _, loads, dumps = get_backend(name)
+        data = loads(payload)
+        results[name] = (measure(loads, payload, rounds), measure(dumps, data, rounds))
+
+    base_parse, base_encode = results["json"]
+    for name, (parse, encode) in results.items():
+        print(f"{name:<8} parse {megabytes / parse:7.1f} MB/s ({parse * 1000:6.2f} ms, x{base_parse / parse:.1f})  "
+              f"encode {megabytes / encode:7.1f} MB/s ({encode * 1000:6.2f} ms, x{base_encode / encode:.1f})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--payload", help="записанный ответ search.wb.ru")
+    args = parser.parse_args()
+    main(args.rounds, args.payload)
@@ -0,0 +1,89 @@
+"""Локальная замена Mistral /v1/chat/completions для бенчмарков.
+
+Первый токен готов через latency, каждый следующий - через token_delay; без
+stream ответ отдается целиком после генерации всех токенов, со stream=true -
+событиями SSE по мере генерации. При max_concurrent > 0 запросы сверх этого
+числа одновременных получают 429 с Retry-After, как при превышении лимита.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MistralHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.5
+    token_delay = 0.0
+    tokens = ["- Хороший", " товар"]
+    max_concurrent = 0
+    retry_after = 0.1
+    calls = 0
+    rejected = 0
+    _active = 0
+    _lock = threading.Lock()
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        cls = type(self)
+        with cls._lock:
+            cls.calls += 1
+            if cls.max_concurrent and cls._active >= cls.max_concurrent:
+                cls.rejected += 1
+                self._reply(429, {"message": "Requests rate limit exceeded"},
+                            {"Retry-After": str(cls.retry_after)})
+                return
+            cls._active += 1
+        try:
+            time.sleep(cls.latency)
+            if request.get("stream"):
+                self._stream()
+                return
+            time.sleep(cls.token_delay * (len(cls.tokens) - 1))
+            self._reply(200, {
+                "choices": [{"message": {"content": "".join(cls.tokens)}}],
+                "usage": {"total_tokens": 400},
+            })
+        finally:
+            with cls._lock:
+                cls._active -= 1
+
+    def _stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        cls = type(self)
+        for n, token in enumerate(cls.tokens):
+            if n:
+                time.sleep(cls.token_delay)
+            chunk = {"choices": [{"index": 0, "delta": {"content": token}}]}
+            if n == len(cls.tokens) - 1:
+                chunk["usage"] = {"total_tokens": 400}
+            self._chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+        self._chunk(b"data: [DONE]\n\n")
+        self._chunk(b"")
+
+    def _chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _reply(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MistralHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
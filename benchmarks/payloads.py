@@ -0,0 +1,84 @@
+"""Ответы search.wb.ru для бенчмарков.
+
+Записанный ответ можно передать через --payload (сохраненное тело ответа API).
+Без него генерируется страница той же структуры, что и v13/search.
+"""
+import json
+import random
+from pathlib import Path
+
+
+def _product(rng, product_id):
+    price = rng.randint(300, 150000) * 100
+    return {
+        "__sort": rng.randint(0, 100000),
+        "ksort": rng.randint(0, 5000),
+        "time1": 2,
+        "time2": rng.randint(20, 90),
+        "wh": rng.randint(100000, 200000),
+        "dtype": 4,
+        "dist": rng.randint(10, 500),
+        "id": product_id,
+        "root": product_id - rng.randint(0, 1000),
+        "kindId": 0,
+        "brand": rng.choice(["ASUS", "Lenovo", "HUAWEI", "Apple", "Xiaomi", "HONOR"]),
+        "brandId": rng.randint(1, 900000),
+        "siteBrandId": 0,
+        "colors": [{"name": "черный", "id": 0}],
+        "subjectId": 2290,
+        "subjectParentId": 1,
+        "name": f"Ноутбук {rng.randint(13, 17)}.6\" {rng.choice(['IPS', 'OLED'])} {rng.randint(8, 64)} ГБ",
+        "entity": "ноутбуки",
+        "matchId": rng.randint(1, 10 ** 8),
+        "supplier": "ООО Поставщик",
+        "supplierId": rng.randint(1, 4000000),
+        "supplierRating": round(rng.uniform(3.5, 5.0), 1),
+        "supplierFlags": 0,
+        "pics": rng.randint(1, 20),
+        "rating": rng.randint(0, 5),
+        "reviewRating": round(rng.uniform(3.5, 5.0), 1),
+        "nmReviewRating": round(rng.uniform(3.5, 5.0), 1),
+        "feedbacks": rng.randint(0, 20000),
+        "nmFeedbacks": rng.randint(0, 20000),
+        "panelPromoId": 0,
+        "volume": 60,
+        "viewFlags": 1310720,
+        "sizes": [{
+            "name": "",
+            "origName": "0",
+            "rank": 0,
+            "optionId": rng.randint(1, 10 ** 9),
+            "stocks": [{"wh": rng.randint(1, 300000), "dtype": 4, "dist": 100, "qty": rng.randint(0, 50),
+                        "priority": 1, "time1": 2, "time2": 40} for _ in range(rng.randint(1, 4))],
+            "time1": 2,
+            "time2": 40,
+            "wh": 507,
+            "dtype": 4,
+            "dist": 100,
+            "price": {"basic": price, "product": int(price * rng.uniform(0.5, 1.0)),
+                      "total": int(price * 0.9), "logistics": 0, "return": 0},
+            "saleConditions": 0,
+            "payload": "x" * 40,
+        }],
+        "totalQuantity": rng.randint(0, 300),
+        "logs": "y" * 60,
+        "meta": {"tokens": [], "presetId": 0},
+    }
+
+
+def search_page(products=100, seed=1):
+    rng = random.Random(seed)
+    return {
+        "metadata": {"name": "ноутбук", "catalog_type": "preset", "catalog_value": "preset=1"},
+        "state": 0,
+        "version": 2,
+        "payloadVersion": 2,
+        "data": {"products": [_product(rng, 100000000 + i * 997) for i in range(products)], "total": 10000},
+    }
+
+
+def load_payload(path=None, products=100) -> bytes:
+    """Тело ответа: записанный файл или сгенерированная страница"""
+    if path:
+        return Path(path).read_bytes()
+    return json.dumps(search_page(products), ensure_ascii=False).encode("utf-8")
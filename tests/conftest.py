@@ -0,0 +1,67 @@
+"""Общие фикстуры: приложение backend с заменой Mistral на локальный сервер.
+
+main.py импортируется из каталога backend (шаблоны и static ищутся по
+относительным путям), MISTRAL_API_URL задается до импорта.
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+ROOT = Path(__file__).parent.parent
+BACKEND_DIR = ROOT / "backend"
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.mistral_stub import MistralHandler, start_server  # noqa: E402
+
+_stub = start_server()
+os.environ["MISTRAL_API_URL"] = f"http://127.0.0.1:{_stub.server_port}"
+sys.path.insert(0, str(BACKEND_DIR))
+os.chdir(BACKEND_DIR)
+
+import database  # noqa: E402
+import main as backend_main  # noqa: E402
+from llm_budget import LLMBudget  # noqa: E402
+
+
+@pytest.fixture
+def mistral(monkeypatch):
+    """Заглушка Mistral с быстрыми ответами и обнуленными счетчиками"""
+    for name, value in (("latency", 0.01), ("token_delay", 0.0), ("tokens", ["- Хороший", " товар"]),
+                        ("max_concurrent", 0), ("calls", 0), ("rejected", 0)):
+        monkeypatch.setattr(MistralHandler, name, value)
+    return MistralHandler
+
+
+@pytest.fixture
+def app(mistral, tmp_path, monkeypatch):
+    """Модуль main с чистым кэшем ответов и без запуска краулера"""
+    main = backend_main
+    cache = main.response_cache
+    monkeypatch.setattr(cache, "disk_dir", tmp_path / "cache")
+    cache.clear()
+    for counters in cache._stats.values():
+        counters.update(hits=0, stale_hits=0, misses=0)
+    # asyncio-примитивы синглтонов привязываются к циклу событий, а каждый тест - свой asyncio.run
+    monkeypatch.setattr(main, "llm_budget", LLMBudget())
+    writer = database.HistoryWriter()
+    monkeypatch.setattr(database, "history_writer", writer)
+    monkeypatch.setattr(main, "history_writer", writer)
+    monkeypatch.setattr(main.crawl_engine, "start", lambda: None)
+    monkeypatch.setattr(main.crawl_engine, "stop", lambda: None)
+    return main
+
+
+def run_app(main, scenario):
+    """Выполняет scenario(client) внутри lifespan приложения"""
+
+    async def runner():
+        async with main.lifespan(main.app):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await scenario(client)
+
+    return asyncio.run(runner())
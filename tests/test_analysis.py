@@ -0,0 +1,146 @@
+from tests.conftest import run_app
+
+CARD = {
+    "imt_id": 101, "imt_name": "Куртка зимняя", "description": "Теплая",
+    "selling": {"brand_name": "Бренд"},
+    "options": [{"name": "Цвет", "value": "черный"}],
+    "grouped_options": [{"group_name": "Основное", "options": [{"name": "Цвет", "value": "черный"}]}],
+}
+
+
+def _fake_cards(main, monkeypatch, cards):
+    async def fetch_card(product_id):
+        card = cards.get(product_id)
+        return dict(card, product_id=product_id) if card else None
+
+    monkeypatch.setattr(main, "_fetch_card", fetch_card)
+    monkeypatch.setattr(main, "find_product_in_data",
+                        lambda product_id: {"price": 4990.0, "rating": 5.0, "reviews_count": 12})
+
+
+def test_batch_by_product_ids_analyzes_cards(app, mistral, monkeypatch):
+    _fake_cards(app, monkeypatch, {1: CARD, 2: dict(CARD, imt_name="Шапка")})
+
+    async def scenario(client):
+        response = await client.post("/api/analyze/batch", json={"product_ids": [1, 2, 3]})
+        return response.status_code, [app.loads(line) for line in response.text.splitlines()]
+
+    status, lines = run_app(app, scenario)
+    assert status == 200
+    by_id = {line["product_id"]: line for line in lines}
+    assert by_id[1]["analysis"] == "- Хороший товар"
+    assert by_id[2]["analysis"] == "- Хороший товар"
+    assert by_id[3] == {"product_id": 3, "status": "error", "error": "not_found"}
+    assert mistral.calls == 2
+
+
+def test_precompute_fills_cache_for_product_page(app, mistral, monkeypatch):
+    _fake_cards(app, monkeypatch, {1: CARD})
+
+    # Тело запроса, которое отправляет страница товара (prepareProductData)
+    page_payload = {
+        "product_id": 1, "name": "Куртка зимняя", "brand": "Бренд", "description": "Теплая",
+        "price": 4990, "rating": 5, "reviews_count": 12, "vendor_code": "",
+        "options": [{"name": "Цвет", "value": "черный"},
+                    {"group": "Основное", "name": "Цвет", "value": "черный"}],
+    }
+
+    async def scenario(client):
+        result = await app._run_analysis_precompute_job({"product_ids": [1]})
+        calls = mistral.calls
+        response = await client.post("/analyze-product", json=page_payload)
+        return result, calls, response.json()
+
+    result, calls, body = run_app(app, scenario)
+    assert result == {"analyzed": 1, "failed": 0}
+    assert calls == 1
+    assert body == {"analysis": "- Хороший товар"}
+    assert mistral.calls == 1
+
+
+PRODUCT = {"product_id": 7, "name": "Товар", "brand": "Бренд", "description": "Описание", "price": 1000,
+           "rating": 4.8, "reviews_count": 10, "vendor_code": "7",
+           "options": [{"group": "", "name": "Цвет", "value": "черный"}]}
+
+
+def test_repeat_analysis_is_served_from_cache(app, mistral):
+    async def scenario(client):
+        first = await client.post("/analyze-product", json=PRODUCT)
+        second = await client.post("/analyze-product", json=PRODUCT)
+        stats = (await client.get("/api/cache/stats")).json()["analysis"]
+        return first.json(), second.json(), stats
+
+    first, second, stats = run_app(app, scenario)
+    assert first == second == {"analysis": "- Хороший товар"}
+    assert mistral.calls == 1
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_changed_product_fields_change_cache_key(app, mistral):
+    prompt = app._analysis_prompt(PRODUCT)
+    assert app._analysis_key(prompt) == app._analysis_key(app._analysis_prompt(dict(PRODUCT)))
+    assert app._analysis_key(prompt) != app._analysis_key(app._analysis_prompt(dict(PRODUCT, price=999)))
+
+    async def scenario(client):
+        await client.post("/analyze-product", json=PRODUCT)
+        await client.post("/analyze-product", json=dict(PRODUCT, price=999))
+        return (await client.get("/api/cache/stats")).json()["analysis"]
+
+    stats = run_app(app, scenario)
+    assert mistral.calls == 2
+    assert (stats["hits"], stats["misses"]) == (0, 2)
+
+
+def test_cached_analysis_survives_restart_via_disk(app, mistral):
+    async def scenario(client):
+        return (await client.post("/analyze-product", json=PRODUCT)).json()
+
+    run_app(app, scenario)
+    app.response_cache.clear()
+    assert run_app(app, scenario) == {"analysis": "- Хороший товар"}
+    assert mistral.calls == 1
+
+
+def _sse_events(body: str):
+    """[(event, data), ...] из тела text/event-stream"""
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], fields["data"]))
+    return events
+
+
+def test_analysis_stream_sends_tokens_then_done(app, mistral):
+    async def scenario(client):
+        first = await client.post("/analyze-product?stream=true", json=PRODUCT)
+        second = await client.post("/analyze-product", json=PRODUCT,
+                                   headers={"Accept": "text/event-stream"})
+        return first, second
+
+    first, second = run_app(app, scenario)
+    assert first.headers["content-type"].startswith("text/event-stream")
+    events = [(event, app.loads(data)) for event, data in _sse_events(first.text)]
+    assert events == [
+        ("token", {"text": "- Хороший"}),
+        ("token", {"text": " товар"}),
+        ("done", {"analysis": "- Хороший товар", "cached": False}),
+    ]
+    # Повтор отдается из кэша одним фрагментом, без обращения к Mistral
+    cached = [(event, app.loads(data)) for event, data in _sse_events(second.text)]
+    assert cached == [
+        ("token", {"text": "- Хороший товар"}),
+        ("done", {"analysis": "- Хороший товар", "cached": True}),
+    ]
+    assert mistral.calls == 1
+
+
+def test_analysis_stream_reports_empty_answer(app, mistral, monkeypatch):
+    monkeypatch.setattr(mistral, "tokens", [" "])
+
+    async def scenario(client):
+        response = await client.post("/analyze-product?stream=true", json=PRODUCT)
+        return _sse_events(response.text)
+
+    events = run_app(app, scenario)
+    assert events[-1][0] == "error"
+    assert not [key for key in app.response_cache._entries if key[0] == "analysis"]
@@ -0,0 +1,66 @@
+import asyncio
+import os
+import time
+
+from cache import CachePolicy, ResponseCache
+
+
+def _cache(tmp_path, **kwargs):
+    return ResponseCache({"card": CachePolicy(ttl=60, stale_ttl=60, disk=True)}, disk_dir=tmp_path, **kwargs)
+
+
+def _files(tmp_path):
+    return sorted(path.name for path in tmp_path.glob("card/*/*.json"))
+
+
+def test_disk_entries_are_read_back_after_restart(tmp_path):
+    async def write():
+        cache = _cache(tmp_path)
+        cache.set("card", 1, {"imt_name": "Куртка"})
+        await cache.flush()
+
+    asyncio.run(write())
+    assert asyncio.run(_cache(tmp_path).peek("card", 1)) == {"imt_name": "Куртка"}
+
+
+def test_sweep_removes_expired_and_oldest_files(tmp_path):
+    cache = _cache(tmp_path, max_disk_bytes=10 ** 6)
+    for key in (1, 2, 3):
+        cache.set("card", key, {"data": "x" * 100})
+    paths = {key: cache._disk_path(("card", key)) for key in (1, 2, 3)}
+    now = time.time()
+    os.utime(paths[1], (now - 500, now - 500))  # старше ttl + stale_ttl
+    os.utime(paths[2], (now - 30, now - 30))
+
+    assert cache._sweep_disk() == 1
+    assert _files(tmp_path) == sorted(paths[key].name for key in (2, 3))
+
+    cache.max_disk_bytes = paths[3].stat().st_size
+    assert cache._sweep_disk() == 1
+    assert _files(tmp_path) == [paths[3].name]
+
+
+def test_memory_tier_is_bounded_by_bytes(tmp_path):
+    cache = ResponseCache({"card": CachePolicy(ttl=60)}, max_memory_bytes=250)
+    for key in (1, 2, 3):
+        cache.set("card", key, {"data": "x" * 100})
+    assert list(cache._entries) == [("card", 2), ("card", 3)]
+    assert cache._memory_bytes <= 250
+
+    cache.set("card", 4, {"data": "x" * 1000})  # больше всего бюджета
+    assert ("card", 4) not in cache._entries
+    assert cache._memory_bytes == sum(entry[2] for entry in cache._entries.values())
+
+
+def test_expired_disk_entry_is_not_remembered(tmp_path):
+    async def scenario():
+        cache = _cache(tmp_path)
+        cache.set("card", 1, {"imt_name": "Куртка"})
+        await cache.flush()
+        cache._write_disk(("card", 1), {"imt_name": "Куртка"}, time.time() - 500)
+
+        restarted = _cache(tmp_path)
+        assert await restarted.peek("card", 1) is None
+        assert not restarted._entries
+
+    asyncio.run(scenario())
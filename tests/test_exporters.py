@@ -0,0 +1,57 @@
+import gzip
+import io
+import json
+
+import pytest
+
+from wildberries_parser.exporters import (
+    PARQUET_AVAILABLE, PRODUCT_SCHEMA, iter_ndjson, iter_parquet, typed_row
+)
+
+PRODUCTS = [
+    {"product_id": "1", "name": "Куртка", "price": "1500.5", "price_kopecks": 150050,
+     "in_stock": "False", "extra": "отбрасывается"},
+    {"product_id": 2, "name": "Шапка", "price": 300, "in_stock": "1", "rating": ""},
+    {"product_id": 3, "in_stock": 0, "reviews_count": "много"},
+    {"product_id": 4, "in_stock": "no"},
+    {"product_id": 5, "in_stock": True},
+]
+EXPECTED = [(1, 1500.5, 150050, False), (2, 300.0, None, True), (3, None, None, False),
+            (4, None, None, False), (5, None, None, True)]
+
+
+def test_string_booleans_are_parsed():
+    for value, expected in (("False", False), ("false", False), ("0", False), ("no", False),
+                            ("True", True), (" yes ", True), ("1", True), (0, False), (1, True),
+                            ("", None), ("maybe", None)):
+        assert typed_row({"in_stock": value}, PRODUCT_SCHEMA)["in_stock"] is expected, value
+
+
+def _expected_view(rows):
+    return [(r["product_id"], r["price"], r["price_kopecks"], r["in_stock"]) for r in rows]
+
+
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_ndjson_reads_back_typed_rows(compression):
+    data = b"".join(iter_ndjson(PRODUCTS, PRODUCT_SCHEMA, compression=compression, chunk_size=64))
+    if compression:
+        data = gzip.decompress(data)
+    rows = [json.loads(line) for line in data.splitlines()]
+
+    assert _expected_view(rows) == EXPECTED
+    assert set(rows[0]) == {name for name, _ in PRODUCT_SCHEMA}
+    assert rows[2]["reviews_count"] is None
+
+
+@pytest.mark.skipif(not PARQUET_AVAILABLE, reason="pyarrow is not installed")
+def test_parquet_reads_back_typed_rows():
+    import pyarrow.parquet as pq
+
+    data = b"".join(iter_parquet(PRODUCTS, PRODUCT_SCHEMA, row_group_size=2))
+    parquet = pq.ParquetFile(io.BytesIO(data))
+    assert parquet.num_row_groups == 3
+    table = parquet.read()
+
+    assert str(table.schema.field("in_stock").type) == "bool"
+    assert _expected_view(table.to_pylist()) == EXPECTED
+    assert table.column("name").to_pylist() == ["Куртка", "Шапка", None, None, None]
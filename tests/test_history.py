@@ -0,0 +1,68 @@
+from wildberries_parser.history import (
+    CHUNK_POINTS, MIN_INTERVAL, PriceHistory, decode_deltas, encode_deltas, pack_bits, unpack_bits
+)
+
+
+def _product(price, in_stock=True, rating=4.5):
+    return {"product_id": 1, "price_kopecks": price, "sale_price_kopecks": price // 2,
+            "rating": rating, "in_stock": in_stock}
+
+
+def test_deltas_and_bits_round_trip():
+    values = [0, 150000, 149999, 149999, -5, 10 ** 12, 3]
+    data = encode_deltas(values)
+    assert decode_deltas(data) == values
+    # Неизменное значение - один байт
+    assert len(encode_deltas([149999, 149999])) == len(encode_deltas([149999])) + 1
+
+    flags = [True, False, False, True, True, False, True, False, True, True]
+    assert unpack_bits(pack_bits(flags), len(flags)) == flags
+
+
+def test_points_round_trip_across_chunks(tmp_path):
+    history = PriceHistory(tmp_path / "history.sqlite3")
+    ts0 = 1_700_000_000
+    total = CHUNK_POINTS + 10
+    # Цены то растут, то падают (отрицательные разности), товара нет в каждой третьей точке
+    prices = [100000 + (i % 7 - 3) * 1234 for i in range(total)]
+    for i, price in enumerate(prices):
+        assert history.append_many([_product(price, in_stock=i % 3 != 0)], ts=ts0 + i * MIN_INTERVAL) == 1
+
+    rows = history._connect().execute(
+        "SELECT start_ts, points FROM price_history WHERE product_id = 1 ORDER BY start_ts"
+    ).fetchall()
+    assert [row["points"] for row in rows] == [CHUNK_POINTS, 10]
+    assert rows[1]["start_ts"] == ts0 + CHUNK_POINTS * MIN_INTERVAL
+
+    points = history.get_range(1)
+    assert [p["ts"] for p in points] == [ts0 + i * MIN_INTERVAL for i in range(total)]
+    assert [p["price"] for p in points] == [price / 100 for price in prices]
+    assert [p["sale_price"] for p in points] == [price // 2 / 100 for price in prices]
+    assert [p["in_stock"] for p in points] == [i % 3 != 0 for i in range(total)]
+    assert {p["rating"] for p in points} == {4.5}
+
+    # Диапазон на стыке блоков
+    middle = history.get_range(1, start=ts0 + (CHUNK_POINTS - 2) * MIN_INTERVAL,
+                               end=ts0 + (CHUNK_POINTS + 1) * MIN_INTERVAL)
+    assert [p["price"] for p in middle] == [price / 100 for price in prices[CHUNK_POINTS - 2:CHUNK_POINTS + 2]]
+
+    newest = history.get_range(1, limit=3)
+    assert [p["ts"] for p in newest] == [ts0 + i * MIN_INTERVAL for i in range(total - 3, total)]
+    history.close()
+
+
+def test_min_interval_skips_only_unchanged_points(tmp_path):
+    history = PriceHistory(tmp_path / "history.sqlite3")
+    ts0 = 1_700_000_000
+    assert history.append_many([_product(100000)], ts=ts0) == 1
+    assert history.append_many([_product(100000)], ts=ts0) == 0  # не новее последней точки
+    assert history.append_many([_product(100000)], ts=ts0 + MIN_INTERVAL - 1) == 0
+    assert history.append_many([_product(99000)], ts=ts0 + 1) == 1  # цена изменилась
+    assert history.append_many([_product(99000, in_stock=False)], ts=ts0 + 2) == 1
+    assert history.append_many([_product(99000, in_stock=False)], ts=ts0 + 2 + MIN_INTERVAL) == 1
+
+    assert [(p["ts"], p["price"], p["in_stock"]) for p in history.get_range(1)] == [
+        (ts0, 1000.0, True), (ts0 + 1, 990.0, True), (ts0 + 2, 990.0, False),
+        (ts0 + 2 + MIN_INTERVAL, 990.0, False),
+    ]
+    history.close()
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+import database
+from tests.conftest import run_app
+
+
+def _pages(client, **params):
+    """Все страницы /api/history, пройденные по next_cursor"""
+    async def collect():
+        ids, cursor, pages = [], None, 0
+        while True:
+            response = await client.get("/api/history", params={**params, **({"cursor": cursor} if cursor else {})})
+            assert response.status_code == 200
+            body = response.json()
+            ids += [item["id"] for item in body["items"]]
+            pages += 1
+            cursor = body["next_cursor"]
+            if not cursor:
+                return ids, pages
+    return collect()
+
+
+def test_history_cursor_pages_are_continuous(app):
+    start = datetime(2026, 1, 1)
+    # По две записи на одно время: порядок внутри секунды задает id
+    rows = [
+        {"query": query, "category": None, "pages": 1, "items_count": 10, "min_price": None, "max_price": None,
+         "search_date": start + timedelta(seconds=i // 2)}
+        for i, query in enumerate(["куртка", "куртка зимняя", "шапка", "куртка"] * 5)
+    ]
+
+    async def scenario(client):
+        async with database.engine.begin() as conn:
+            await conn.execute(database.SearchHistory.__table__.delete())
+            await conn.execute(database.SearchQueryStats.__table__.delete())
+        await database.history_writer._write(rows)
+        async with database.SessionLocal() as session:
+            history = (await session.execute(
+                select(database.SearchHistory)
+                .order_by(database.SearchHistory.search_date.desc(), database.SearchHistory.id.desc())
+            )).scalars().all()
+
+        def expected(match):
+            return [s.id for s in history if match(s.query)]
+
+        assert await _pages(client, limit=3) == (expected(lambda q: True), 7)
+        assert await _pages(client, query="куртка", limit=3) == (expected(lambda q: q == "куртка"), 4)
+        assert await _pages(client, prefix="куртка", limit=4) == (expected(lambda q: q.startswith("куртка")), 4)
+        assert await _pages(client, prefix="ш", limit=5) == (expected(lambda q: q == "шапка"), 1)
+
+        # Точный запрос читается по индексу уже в нужном порядке, без сортировки
+        async with database.engine.connect() as conn:
+            plan = " ".join(row[-1] for row in await conn.exec_driver_sql(
+                "EXPLAIN QUERY PLAN SELECT id FROM search_history WHERE query = ? "
+                "AND (search_date, id) < (?, ?) ORDER BY search_date DESC, id DESC LIMIT 4",
+                ("куртка", "2026-01-02 00:00:00", 1)
+            ))
+        assert "ix_search_history_query" in plan and "TEMP B-TREE" not in plan
+
+        response = await client.get("/api/history", params={"cursor": "испорчен"})
+        assert response.status_code == 400
+
+    run_app(app, scenario)
@@ -0,0 +1,60 @@
+import time
+
+from images import ImageCache, detect_content_type
+from tests.conftest import run_app
+
+WEBP = b"RIFF\x24\x00\x00\x00WEBPVP8 " + b"\x00" * 24
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 32
+
+
+def test_detect_content_type():
+    assert detect_content_type(WEBP) == "image/webp"
+    assert detect_content_type(JPEG) == "image/jpeg"
+    assert detect_content_type(b"<html>") == "application/octet-stream"
+
+
+def test_put_stores_real_content_type(tmp_path):
+    cache = ImageCache(tmp_path)
+    sha, content_type = cache.put("1/1/orig", JPEG)
+    assert content_type == "image/jpeg"
+    assert cache.blob_path(sha, content_type).suffix == ".jpg"
+    assert cache.get("1/1/orig") == (sha, "image/jpeg")
+
+
+def test_hits_update_last_access_in_batches(tmp_path):
+    cache = ImageCache(tmp_path, touch_interval=3600)
+    sha, _ = cache.put("1/1/orig", WEBP)
+    stored = cache._conn.execute("SELECT last_access FROM blobs").fetchone()[0]
+    time.sleep(0.01)
+    cache.get("1/1/orig")
+    assert cache._conn.execute("SELECT last_access FROM blobs").fetchone()[0] == stored
+    cache.flush()
+    assert cache._conn.execute("SELECT last_access FROM blobs").fetchone()[0] > stored
+
+
+def test_legacy_blobs_are_renamed_by_content(tmp_path):
+    cache = ImageCache(tmp_path)
+    sha, _ = cache.put("1/1/orig", JPEG)
+    # Кэш прошлой версии: без колонки content_type, файл назван .webp
+    cache.blob_path(sha, "image/jpeg").rename(tmp_path / "blobs" / sha[:2] / f"{sha}.webp")
+    cache._conn.execute("UPDATE blobs SET content_type = NULL")
+    cache._conn.commit()
+
+    assert ImageCache(tmp_path).get("1/1/orig") == (sha, "image/jpeg")
+
+
+def test_jpeg_original_is_served_as_jpeg(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "image_cache", ImageCache(tmp_path / "images"))
+
+    async def load_original(product_id, image_num):
+        return JPEG
+
+    monkeypatch.setattr(app, "_load_original_image", load_original)
+
+    async def scenario(client):
+        return await client.get("/img/1/1")
+
+    response = run_app(app, scenario)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpeg"
+    assert response.content == JPEG
@@ -0,0 +1,164 @@
+import asyncio
+import threading
+import time
+
+from jobs import DONE, JobQueue
+from tests.conftest import run_app
+from wildberries_parser.storage import ProductStore
+
+
+async def _echo(params):
+    return params
+
+
+async def _wait_done(queue, job_id):
+    while (await queue.get(job_id))["status"] != DONE:
+        await asyncio.sleep(0.01)
+
+
+def test_queue_is_usable_from_other_threads(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.sqlite3", workers=1)
+    queue.register("echo", _echo)
+    results, errors = [], []
+
+    def handler_thread():
+        # Свой поток и свой цикл событий, как у TestClient
+        async def enqueue_twice():
+            first = await queue.enqueue("echo", {"n": 1}, dedup_key="echo")
+            return first["id"], (await queue.enqueue("echo", {"n": 1}, dedup_key="echo"))["id"]
+
+        try:
+            results.append(asyncio.run(enqueue_twice()))
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=handler_thread)
+    thread.start()
+    thread.join()
+    assert not errors
+    job_id, duplicate_id = results[0]
+    assert duplicate_id == job_id
+
+    async def run():
+        await queue.start()
+        await _wait_done(queue, job_id)
+        await queue.stop()
+        return await queue.get(job_id, with_result=True)
+
+    assert asyncio.run(asyncio.wait_for(run(), 5))["result"] == {"n": 1}
+
+
+def test_busy_database_does_not_block_event_loop(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.sqlite3")
+    queue.register("echo", _echo)
+
+    async def run():
+        job = await queue.enqueue("echo", {})
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticking = asyncio.create_task(ticker())
+        # Блокировка занята, как во время записи другого потока
+        with queue._lock:
+            reading = asyncio.create_task(queue.get(job["id"]))
+            await asyncio.sleep(0.2)
+            assert not reading.done()
+        assert (await reading)["id"] == job["id"]
+        ticking.cancel()
+        return ticks
+
+    assert asyncio.run(run()) >= 10
+
+
+def test_failed_job_is_retried_without_polling(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.sqlite3", retry_base_delay=0.1)
+    attempts = []
+
+    async def flaky(params):
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise RuntimeError("temporary")
+        return "ok"
+
+    queue.register("flaky", flaky)
+    claims = 0
+    claim = queue._claim
+
+    def counting_claim():
+        nonlocal claims
+        claims += 1
+        return claim()
+
+    queue._claim = counting_claim
+
+    async def run():
+        await queue.start()
+        job = await queue.enqueue("flaky", {})
+        await _wait_done(queue, job["id"])
+        await asyncio.sleep(0.05)
+        idle_claims = claims
+        await asyncio.sleep(0.5)  # простой: диспетчер спит, а не опрашивает базу
+        await queue.stop()
+        return claims - idle_claims
+
+    assert asyncio.run(asyncio.wait_for(run(), 5)) == 0
+    assert len(attempts) == 2
+    assert attempts[1] - attempts[0] >= 0.08
+
+
+def test_search_job_keeps_product_ids(app, tmp_path, monkeypatch):
+    store = ProductStore(tmp_path / "products.sqlite3")
+    monkeypatch.setattr(app, "product_store", store)
+    queue = JobQueue(tmp_path / "jobs.sqlite3")
+    queue.register("search", app._run_search_job)
+    monkeypatch.setattr(app, "job_queue", queue)
+    products = [{"product_id": n, "name": f"Товар {n}", "price": 100.0 * n, "query": "куртка"} for n in (3, 1, 2)]
+
+    async def crawl(spider, timeout, **params):
+        store.upsert_many(products)  # так товары записывает ProductStorePipeline
+        return products
+
+    monkeypatch.setattr(app.crawl_engine, "crawl", crawl)
+
+    async def scenario(client):
+        created = await client.post("/api/jobs/search", json={"query": "куртка", "limit": 2})
+        job_id = created.json()["job_id"]
+        await _wait_done(queue, job_id)
+        stored = (await queue.get(job_id, with_result=True))["result"]
+        return stored, (await client.get(f"/jobs/{job_id}/result")).json()
+
+    stored, response = run_app(app, scenario)
+    assert stored == {"product_ids": [3, 1], "removed": []}
+    assert response == {"status": DONE, "result": products[:2]}
+
+
+def test_old_batch_results_expire(app, tmp_path, monkeypatch):
+    queue = JobQueue(tmp_path / "jobs.sqlite3")
+    queue.register("search_batch", _echo)
+    monkeypatch.setattr(app, "job_queue", queue)
+    monkeypatch.setattr(app, "BATCH_DIR", tmp_path / "batches")
+    app.BATCH_DIR.mkdir()
+
+    async def prepare():
+        jobs = [await queue.enqueue("search_batch", {}) for _ in range(2)]
+        for job, name, age in zip(jobs, ("old.ndjson", "fresh.ndjson"), (48 * 3600, 0)):
+            (app.BATCH_DIR / name).write_text("{}\n")
+            queue._execute("UPDATE jobs SET status = ?, result = ?, updated_at = updated_at - ? WHERE id = ?",
+                           (DONE, f'{{"file": "{name}"}}', age, job["id"]))
+        return jobs, await app._expire_search_batches()
+
+    (old, fresh), expired = asyncio.run(prepare())
+    assert expired == 1
+    assert sorted(path.name for path in app.BATCH_DIR.iterdir()) == ["fresh.ndjson"]
+
+    async def scenario(client):
+        statuses = [(await client.get(f"/api/search/batch/{job['id']}/results")).status_code
+                    for job in (old, fresh)]
+        return statuses, (await queue.get(old["id"]))["status"]
+
+    assert run_app(app, scenario) == ([410, 200], "expired")
@@ -0,0 +1,78 @@
+import json
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tests.conftest import ROOT
+
+RETRY_AFTER = 1.0
+
+# Паук в отдельном процессе: reactor Twisted нельзя перезапустить внутри pytest
+CRAWL_SCRIPT = """
+import sys
+import scrapy
+from scrapy.crawler import CrawlerProcess
+
+class PingSpider(scrapy.Spider):
+    name = "ping"
+
+    def start_requests(self):
+        for n in range(6):
+            yield scrapy.Request(f"{sys.argv[1]}/{n}", dont_filter=True)
+
+    def parse(self, response):
+        pass
+
+process = CrawlerProcess({
+    "DOWNLOAD_DELAY": 0.05,
+    "RANDOMIZE_DOWNLOAD_DELAY": True,
+    "CONCURRENT_REQUESTS_PER_DOMAIN": 1,
+    "RETRY_TIMES": 2,
+    "DOWNLOADER_MIDDLEWARES": {
+        "scrapy.downloadermiddlewares.retry.RetryMiddleware": None,
+        "wildberries_parser.middlewares.CustomRetryMiddleware": 550,
+    },
+    "TELNETCONSOLE_ENABLED": False,
+    "LOG_LEVEL": "ERROR",
+})
+process.crawl(PingSpider)
+process.start()
+"""
+
+
+class _RateLimitedHandler(BaseHTTPRequestHandler):
+    hits = []
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            self.hits.append(time.time())
+            first = len(self.hits) == 1
+        body = json.dumps({"ok": not first}).encode()
+        self.send_response(429 if first else 200)
+        if first:
+            self.send_header("Retry-After", str(RETRY_AFTER))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_rate_limited_host_is_not_hit_before_retry_after():
+    _RateLimitedHandler.hits = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _RateLimitedHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        subprocess.run([sys.executable, "-c", CRAWL_SCRIPT, f"http://127.0.0.1:{server.server_port}"],
+                       cwd=ROOT, check=True, timeout=60)
+    finally:
+        server.shutdown()
+
+    first, *rest = _RateLimitedHandler.hits
+    assert len(rest) == 6  # пять запросов и повтор получившего 429
+    # RANDOMIZE_DOWNLOAD_DELAY не должен сокращать паузу Retry-After
+    assert min(rest) - first >= RETRY_AFTER
@@ -0,0 +1,29 @@
+import pytest
+
+from tests.conftest import run_app
+
+
+@pytest.mark.parametrize("params, error", [
+    ({"min_price": "abc"}, "invalid_price"),
+    ({"min_price": "-1"}, "min_price_negative"),
+    ({"min_price": "500", "max_price": "100"}, "invalid_price_range"),
+])
+def test_live_search_redirects_on_invalid_price(app, params, error):
+    async def scenario(client):
+        response = await client.get("/search/live", params={"query": "куртка", **params})
+        home = await client.get(response.headers["location"])
+        return response, home
+
+    response, home = run_app(app, scenario)
+    assert response.status_code == 303
+    assert response.headers["location"] == f"/?error={error}"
+    assert app.SEARCH_ERRORS[error] in home.text
+
+
+def test_live_search_page_streams_valid_query(app):
+    async def scenario(client):
+        return await client.get("/search/live", params={"query": "куртка", "min_price": "100"})
+
+    response = run_app(app, scenario)
+    assert response.status_code == 200
+    assert "/api/search/stream?query=" in response.text
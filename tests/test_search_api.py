@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from wildberries_parser import search_api
+from wildberries_parser.search_api import decode_search_products
+
+FIELDS = ('id', 'name', 'brand', 'entity', 'review_rating', 'feedbacks', 'supplier_id', 'total_quantity',
+          'price', 'sale_price')
+
+PRODUCTS = [
+    {"id": 1, "name": "Куртка", "brand": "Бренд", "entity": "куртки", "reviewRating": 4.8, "feedbacks": 12,
+     "supplierId": 77, "totalQuantity": 3, "colors": [{"id": 0}],
+     "sizes": [{"price": {"basic": 1234599, "product": 999901}}, {"price": {"basic": 1, "product": 1}}]},
+    {"id": 2, "name": "Без размеров"},
+    {"id": 3, "sizes": []},
+    {"id": 4, "sizes": [{}], "reviewRating": None, "feedbacks": None},
+    {"id": 5, "sizes": [{"price": {"basic": 50000}}], "totalQuantity": 0},
+]
+
+
+def _view(products):
+    return [tuple(getattr(p, field) for field in FIELDS) for p in products]
+
+
+def _body(products):
+    return json.dumps({"data": {"products": products}}).encode()
+
+
+@pytest.mark.skipif(search_api.msgspec is None, reason="msgspec is not installed")
+def test_msgspec_and_dict_decoding_match(monkeypatch):
+    typed = decode_search_products(_body(PRODUCTS))
+    monkeypatch.setattr(search_api, "_decoder", None)
+    fallback = decode_search_products(_body(PRODUCTS))
+
+    assert _view(typed) == _view(fallback)
+    assert [(p.price, p.sale_price) for p in typed] == [(999901, 1234599), (0, 0), (0, 0), (0, 0), (0, 50000)]
+    # Копейки остаются целыми в обоих вариантах
+    assert all(type(p.price) is int and type(p.sale_price) is int for p in typed + fallback)
+
+
+def test_schema_mismatch_falls_back_to_dicts():
+    # Дробные копейки и товар без id не проходят схему msgspec
+    products = decode_search_products(_body([
+        {"id": 1, "sizes": [{"price": {"basic": 100000.0, "product": 90000.0}}]},
+        {"name": "без id"},
+    ]))
+    assert _view(products) == [(1, None, None, None, 0, 0, None, 0, 90000, 100000)]
+    assert type(products[0].price) is int
+    assert decode_search_products(b'{"data": null}') == []
@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+
+from wildberries_parser.items import WildberriesProductItem
+from wildberries_parser.pipelines import ProductStorePipeline
+from wildberries_parser.storage import ProductStore
+
+
+def _run_pipeline(store, spider, products):
+    pipeline = ProductStorePipeline()
+    pipeline.store = store
+    for product in products:
+        pipeline.process_item(WildberriesProductItem(**product), spider)
+    pipeline.close_spider(spider)
+
+
+def _search_results(store):
+    return store._connect().execute(
+        "SELECT query, category, product_id, position FROM search_results ORDER BY query, product_id"
+    ).fetchall()
+
+
+def test_search_results_use_requested_category(tmp_path):
+    store = ProductStore(tmp_path / "products.sqlite3")
+    # Без категорий в аргументах паука category товара заполняется его entity
+    _run_pipeline(store, SimpleNamespace(categories=[]), [
+        {"product_id": 1, "query": "куртка", "category": "Куртки"},
+        {"product_id": 2, "query": "куртка", "category": "Пуховики"},
+    ])
+    _run_pipeline(store, SimpleNamespace(categories=["odezhda"]), [
+        {"product_id": 3, "query": "шапка", "category": "odezhda"},
+    ])
+
+    assert [tuple(row) for row in _search_results(store)] == [
+        ("куртка", "", 1, 1), ("куртка", "", 2, 2), ("шапка", "odezhda", 3, 1),
+    ]
+
+
+def test_compact_uses_fingerprint_index(tmp_path):
+    store = ProductStore(tmp_path / "products.sqlite3")
+    plan = store._connect().execute(
+        "EXPLAIN QUERY PLAN DELETE FROM crawl_fingerprints WHERE seen_at < ?", (0,)
+    ).fetchall()
+    assert any("ix_crawl_fingerprints_seen" in row[-1] for row in plan)
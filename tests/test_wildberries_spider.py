@@ -0,0 +1,92 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from scrapy.exceptions import DontCloseSpider
+from scrapy.http import TextResponse
+
+from wildberries_parser.items import WildberriesProductTombstoneItem
+from wildberries_parser.pipelines import ProductStorePipeline
+from wildberries_parser.spiders import wildberries_spider
+from wildberries_parser.spiders.wildberries_spider import WildberriesSpider
+from wildberries_parser.storage import ProductStore
+
+
+def search_page(*product_ids, price=100000):
+    """Тело ответа search.wb.ru с заданными товарами"""
+    return json.dumps({"data": {"products": [
+        {"id": product_id, "name": f"Товар {product_id}", "brand": "Бренд", "entity": "куртки",
+         "reviewRating": 4.5, "feedbacks": 3, "totalQuantity": 1,
+         "sizes": [{"price": {"basic": price, "product": price // 2}}]}
+        for product_id in product_ids
+    ]}}).encode()
+
+
+def respond(request, body):
+    return TextResponse(url=request.url, body=body, encoding="utf-8", request=request)
+
+
+def test_limit_is_shared_by_all_categories_of_a_query():
+    spider = WildberriesSpider(queries="куртка,шапка", categories="men,women", limit=3)
+    items = []
+    for query, category, ids in (("куртка", "men", (1, 2)), ("куртка", "women", (2, 3, 4, 5)),
+                                 ("шапка", "men", (6,))):
+        request = spider.make_wb_request(query, category)
+        items += [item for item in spider.parse_api_response(respond(request, search_page(*ids)))]
+
+    by_query = {}
+    for item in items:
+        by_query.setdefault(item["query"], []).append(item["product_id"])
+    assert by_query == {"куртка": [1, 2, 3], "шапка": [6]}
+
+
+def _delta_crawl(store, *product_ids, price=100000):
+    """Инкрементальный краул запроса "куртка": поиск отдает product_ids, items идут в ProductStorePipeline"""
+    spider = WildberriesSpider(queries="куртка", delta="1")
+    scheduled = []
+    spider.crawler = SimpleNamespace(engine=SimpleNamespace(crawl=scheduled.append))
+    pipeline = ProductStorePipeline()
+    pipeline.store = store
+
+    items = []
+    for request in spider.start_requests():
+        items += spider.parse_api_response(respond(request, search_page(*product_ids, price=price)))
+    # Выдача собрана - движок простаивает, паук ставит запрос на tombstone-записи
+    with pytest.raises(DontCloseSpider):
+        spider.spider_idle(spider)
+    spider.spider_idle(spider)
+    (request,) = scheduled
+    items += spider.emit_tombstones(respond(request, b""))
+
+    for item in items:
+        pipeline.process_item(item, spider)
+    pipeline.close_spider(spider)
+    spider.spider_closed(spider, "finished")
+    return items
+
+
+def test_delta_crawl_yields_changes_and_tombstones(tmp_path, monkeypatch):
+    store = ProductStore(tmp_path / "products.sqlite3")
+    monkeypatch.setattr(wildberries_spider, "get_product_store", lambda: store)
+    scope = WildberriesSpider(queries="куртка", delta="1").delta_scope("куртка")
+
+    def search_results():
+        return sorted(row[0] for row in store._connect().execute(
+            "SELECT product_id FROM search_results WHERE query = ?", ("куртка",)))
+
+    assert [item["product_id"] for item in _delta_crawl(store, 1, 2, 3)] == [1, 2, 3]
+    assert sorted(store.get_fingerprints(scope)) == [1, 2, 3]
+    assert search_results() == [1, 2, 3]
+
+    # Та же выдача - ничего нового
+    assert _delta_crawl(store, 1, 2, 3) == []
+
+    # Товар 3 пропал, у остальных изменилась цена
+    items = _delta_crawl(store, 1, 2, price=90000)
+    tombstones = [item for item in items if isinstance(item, WildberriesProductTombstoneItem)]
+    assert [item["product_id"] for item in items if item not in tombstones] == [1, 2]
+    assert [(item["product_id"], item["query"], item["deleted"]) for item in tombstones] == [(3, "куртка", True)]
+    assert sorted(store.get_fingerprints(scope)) == [1, 2]
+    assert search_results() == [1, 2]
+
+    assert _delta_crawl(store, 1, 2, price=90000) == []
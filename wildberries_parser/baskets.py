@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).parent.parent
+BASKET_INDEX_PATH = PROJECT_ROOT / 'scrapy_data' / 'basket_index.sqlite3'
+
+MAX_BASKET = 40
+PROBE_BATCH_SIZE = 8
+MAX_PHOTOS = 30
+PHOTO_SIZE = 'c516x688'
+
+# Верхняя граница vol (product_id // 100000) для каждой корзины, как в фронтенде WB.
+# Для vol за пределами таблицы корзина определяется перебором и запоминается в индексе.
+VOL_BASKET_RANGES = [
+    (143, 1), (287, 2), (431, 3), (719, 4), (1007, 5), (1061, 6), (1115, 7),
+    (1169, 8), (1313, 9), (1601, 10), (1655, 11), (1919, 12), (2045, 13),
+    (2189, 14), (2405, 15), (2621, 16), (2837, 17), (3053, 18), (3269, 19),
+    (3485, 20), (3701, 21), (3917, 22), (4133, 23), (4349, 24), (4565, 25),
+]
+
+
+def vol_of(product_id) -> int:
+    return int(product_id) // 100000
+
+
+def part_of(product_id) -> int:
+    return int(product_id) // 1000
+
+
+def guess_basket(product_id) -> Optional[int]:
+    """Корзина по диапазону vol, если он известен"""
+    vol = vol_of(product_id)
+    for upper, basket_num in VOL_BASKET_RANGES:
+        if vol <= upper:
+            return basket_num
+    return None
+
+
+def product_base_url(product_id, basket_num: int) -> str:
+    product_id = int(product_id)
+    return (f"https://basket-{basket_num:02d}.wbbasket.ru"
+            f"/vol{vol_of(product_id)}/part{part_of(product_id)}/{product_id}")
+
+
+def card_url(product_id, basket_num: int) -> str:
+    return f"{product_base_url(product_id, basket_num)}/info/ru/card.json"
+
+
+def photo_url(product_id, basket_num: int, image_num: int, size: str = PHOTO_SIZE) -> str:
+    return f"{product_base_url(product_id, basket_num)}/images/{size}/{image_num}.webp"
+
+
+def photo_count_from_card(card: dict) -> Optional[int]:
+    """Число фото из card.json (поле media.photo_count), если оно есть"""
+    count = (card.get('media') or {}).get('photo_count')
+    if count is None:
+        return None
+    try:
+        return max(0, min(int(count), MAX_PHOTOS))
+    except (TypeError, ValueError):
+        return None
+
+
+def photo_items(product_id, basket_num: int, count: int, size: str = PHOTO_SIZE) -> List[dict]:
+    return [
+        {
+            'product_id': str(product_id),
+            'image_url': photo_url(product_id, basket_num, num, size),
+            'image_num': num,
+            'basket_num': basket_num,
+        }
+        for num in range(1, count + 1)
+    ]
+
+
+class BasketIndex:
+    """Персистентный индекс vol -> basket в SQLite.
+
+    Все товары одного vol лежат в одной корзине, поэтому ключом служит vol:
+    одна найденная корзина сразу ускоряет соседние товары.
+    """
+
+    def __init__(self, path=BASKET_INDEX_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=10)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS basket_index ("
+            "vol INTEGER PRIMARY KEY, basket INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+        self._cache: Dict[int, int] = dict(self._conn.execute("SELECT vol, basket FROM basket_index"))
+
+    def get(self, product_id) -> Optional[int]:
+        vol = vol_of(product_id)
+        basket_num = self._cache.get(vol)
+        if basket_num is None:
+            # Индекс мог пополниться другим процессом (паук в подпроцессе)
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT basket FROM basket_index WHERE vol = ?", (vol,)
+                ).fetchone()
+            if row:
+                basket_num = self._cache[vol] = row[0]
+        return basket_num
+
+    def remember(self, product_id, basket_num: int):
+        vol = vol_of(product_id)
+        if self._cache.get(vol) == basket_num:
+            return
+        self._cache[vol] = basket_num
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO basket_index (vol, basket) VALUES (?, ?)",
+                    (vol, basket_num)
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to persist basket for vol {vol}: {e}")
+
+
+_index: Optional[BasketIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_basket_index() -> BasketIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = BasketIndex()
+    return _index
+
+
+def candidate_baskets(product_id, index: Optional[BasketIndex] = None) -> List[int]:
+    """Порядок перебора: индекс, затем диапазон vol, затем ближайшие к нему корзины"""
+    index = index or get_basket_index()
+    first = [b for b in (index.get(product_id), guess_basket(product_id)) if b]
+    pivot = first[0] if first else MAX_BASKET
+    rest = sorted(
+        (b for b in range(1, MAX_BASKET + 1) if b not in first),
+        key=lambda b: (abs(b - pivot), -b)
+    )
+    return list(dict.fromkeys(first)) + rest
+
+
+class BasketProbe:
+    """Состояние перебора корзин одного товара для пауков.
+
+    Сначала запрашивается одна наиболее вероятная корзина, при неудаче -
+    пачки по batch_size параллельных запросов, пока корзина не найдена.
+    """
+
+    def __init__(self, product_id, index: Optional[BasketIndex] = None, batch_size: int = PROBE_BATCH_SIZE):
+        self.product_id = int(product_id)
+        self.index = index or get_basket_index()
+        self.batch_size = batch_size
+        self.candidates = deque(candidate_baskets(self.product_id, self.index))
+        self.pending = 0
+        self.basket_num: Optional[int] = None
+        self._started = False
+
+    def next_batch(self) -> List[int]:
+        size = self.batch_size if self._started else 1
+        self._started = True
+        batch = [self.candidates.popleft() for _ in range(min(size, len(self.candidates)))]
+        self.pending += len(batch)
+        return batch
+
+    def failed(self) -> List[int]:
+        """Отмечает неудачный запрос; возвращает следующую пачку, если текущая исчерпана"""
+        self.pending -= 1
+        if self.basket_num is None and self.pending <= 0:
+            return self.next_batch()
+        return []
+
+    def found(self, basket_num: int) -> bool:
+        """Отмечает найденную корзину; False, если она уже была найдена ранее"""
+        self.pending -= 1
+        if self.basket_num is not None:
+            return False
+        self.basket_num = basket_num
+        self.index.remember(self.product_id, basket_num)
+        return True
+
+    @property
+    def exhausted(self) -> bool:
+        return self.basket_num is None and self.pending <= 0 and not self.candidates
+
+
+async def fetch_from_basket(client, product_id, path: str = "/info/ru/card.json",
+                            batch_size: int = PROBE_BATCH_SIZE) -> Optional[Tuple[int, object]]:
+    """Находит корзину товара через httpx-клиент и возвращает (basket_num, response)"""
+    probe = BasketProbe(product_id, batch_size=batch_size)
+
+    async def _get(basket_num):
+        try:
+            response = await client.get(product_base_url(product_id, basket_num) + path)
+            return basket_num, response
+        except Exception as e:
+            logger.debug(f"basket-{basket_num:02d} request failed for {product_id}: {e}")
+            return basket_num, None
+
+    batch = probe.next_batch()
+    while batch:
+        tasks = [asyncio.ensure_future(_get(b)) for b in batch]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                basket_num, response = await next_done
+                if response is not None and response.status_code == 200:
+                    probe.found(basket_num)
+                    return basket_num, response
+                if response is not None and response.status_code != 404:
+                    logger.warning(f"basket-{basket_num:02d} returned {response.status_code} for {product_id}")
+        finally:
+            for task in tasks:
+                task.cancel()
+        probe.pending = 0
+        batch = probe.next_batch()
+
+    return None
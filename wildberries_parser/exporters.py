@@ -0,0 +1,224 @@
+import io
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from scrapy.exporters import BaseItemExporter
+from itemadapter import ItemAdapter
+
+from wildberries_parser.items import WildberriesProductItem, WildberriesProductDetailsItem
+from wildberries_parser.serialization import dumps, dumps_str
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # без pyarrow экспорт в Parquet недоступен
+    pa = pq = None
+
+try:
+    import zstandard
+except ImportError:  # без zstandard доступно только сжатие gzip
+    zstandard = None
+
+PARQUET_AVAILABLE = pa is not None
+ZSTD_AVAILABLE = zstandard is not None
+
+ROW_GROUP_SIZE = 50000
+TRUE_STRINGS = ('1', 'true', 'yes', 'on')
+FALSE_STRINGS = ('0', 'false', 'no', 'off')
+
+Schema = List[Tuple[str, str]]
+
+
+def item_schema(item_cls) -> Schema:
+    """Типизированная схема из полей item: type в scrapy.Field, по умолчанию string"""
+    return [(name, field.get('type', 'string')) for name, field in item_cls.fields.items()]
+
+
+PRODUCT_SCHEMA = item_schema(WildberriesProductItem)
+DETAILS_SCHEMA = item_schema(WildberriesProductDetailsItem)
+
+
+def _coerce(value, kind: str):
+    if value is None or value == '':
+        return None
+    if kind == 'int':
+        return int(value)
+    if kind == 'float':
+        return float(value)
+    if kind == 'bool':
+        # bool("False") == True, поэтому строки разбираются явно
+        if isinstance(value, str):
+            text = value.strip().lower()
+            if text in TRUE_STRINGS:
+                return True
+            if text in FALSE_STRINGS:
+                return False
+            raise ValueError(f"Not a boolean: {value!r}")
+        return bool(value)
+    if kind == 'json':
+        return value if isinstance(value, str) else dumps_str(value)
+    return str(value)
+
+
+def typed_row(item, schema: Schema) -> Dict[str, Any]:
+    """Значения полей, приведенные к типам схемы; лишние поля отбрасываются"""
+    data = ItemAdapter(item).asdict() if not isinstance(item, dict) else item
+    row = {}
+    for name, kind in schema:
+        try:
+            row[name] = _coerce(data.get(name), kind)
+        except (TypeError, ValueError):
+            row[name] = None
+    return row
+
+
+def _arrow_schema(schema: Schema):
+    types = {'int': pa.int64(), 'float': pa.float64(), 'bool': pa.bool_(),
+             'string': pa.string(), 'json': pa.string()}
+    return pa.schema([(name, types[kind]) for name, kind in schema])
+
+
+class _Compressor:
+    """Потоковое сжатие: none, gzip или zstd"""
+
+    def __init__(self, compression: Optional[str] = None, level: Optional[int] = None):
+        if compression == 'gzip':
+            self._obj = zlib.compressobj(level if level is not None else 6, zlib.DEFLATED, 31)
+        elif compression == 'zstd':
+            if zstandard is None:
+                raise RuntimeError("zstandard is not installed")
+            self._obj = zstandard.ZstdCompressor(level=level if level is not None else 3).compressobj()
+        elif compression is None:
+            self._obj = None
+        else:
+            raise ValueError(f"Unknown compression: {compression}")
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data) if self._obj else data
+
+    def flush(self) -> bytes:
+        return self._obj.flush() if self._obj else b''
+
+
+def iter_ndjson(items: Iterable, schema: Schema, compression: Optional[str] = None,
+                chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Товары построчно в NDJSON (с типами из схемы), порциями по chunk_size байт"""
+    compressor = _Compressor(compression)
+    buffer = bytearray()
+    for item in items:
+        buffer += dumps(typed_row(item, schema)) + b'\n'
+        if len(buffer) >= chunk_size:
+            if chunk := compressor.compress(bytes(buffer)):
+                yield chunk
+            buffer.clear()
+    tail = compressor.compress(bytes(buffer)) + compressor.flush()
+    if tail:
+        yield tail
+
+
+class _ChunkSink(io.RawIOBase):
+    """Файл для ParquetWriter, из которого записанные байты забираются порциями"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def take(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_parquet(items: Iterable, schema: Schema, row_group_size: int = ROW_GROUP_SIZE) -> Iterator[bytes]:
+    """Parquet по row group: в памяти держится не больше row_group_size строк"""
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed")
+    arrow_schema = _arrow_schema(schema)
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, arrow_schema, compression='zstd') as writer:
+        rows = []
+        for item in items:
+            rows.append(typed_row(item, schema))
+            if len(rows) >= row_group_size:
+                writer.write_table(pa.Table.from_pylist(rows, schema=arrow_schema))
+                rows = []
+                yield sink.take()
+        if rows:
+            writer.write_table(pa.Table.from_pylist(rows, schema=arrow_schema))
+    yield sink.take()
+
+
+class TypedJsonLinesItemExporter(BaseItemExporter):
+    """NDJSON-экспорт для FEEDS с приведением типов по схеме item"""
+
+    def __init__(self, file, **kwargs):
+        super().__init__(dont_fail=True, **kwargs)
+        self.file = file
+
+    def export_item(self, item):
+        row = typed_row(item, item_schema(type(item)) if not isinstance(item, dict) else PRODUCT_SCHEMA)
+        self.file.write(dumps(row) + b'\n')
+
+
+class ParquetItemExporter(BaseItemExporter):
+    """Parquet-экспорт для FEEDS: строки пишутся row group'ами по мере накопления.
+
+    Схема берется из класса первого item, поэтому в одну ленту пишется один тип items.
+    """
+
+    def __init__(self, file, **kwargs):
+        super().__init__(dont_fail=True, **kwargs)
+        if pa is None:
+            raise RuntimeError("pyarrow is not installed")
+        self.file = file
+        self.row_group_size = ROW_GROUP_SIZE
+        self.schema: Optional[Schema] = None
+        self.writer = None
+        self.rows = []
+
+    def export_item(self, item):
+        if self.schema is None:
+            self.schema = item_schema(type(item)) if not isinstance(item, dict) else PRODUCT_SCHEMA
+            self.writer = pq.ParquetWriter(self.file, _arrow_schema(self.schema), compression='zstd')
+        self.rows.append(typed_row(item, self.schema))
+        if len(self.rows) >= self.row_group_size:
+            self._write_rows()
+
+    def finish_exporting(self):
+        if self.writer is None:
+            return
+        self._write_rows()
+        self.writer.close()
+
+    def _write_rows(self):
+        if self.rows:
+            self.writer.write_table(pa.Table.from_pylist(self.rows, schema=self.writer.schema))
+            self.rows = []
+
+
+class ZstdPlugin:
+    """Постобработка FEEDS: сжатие zstd (параметр zstd_level)"""
+
+    def __init__(self, file, feed_options: Dict[str, Any]):
+        if zstandard is None:
+            raise RuntimeError("zstandard is not installed")
+        self.file = file
+        level = feed_options.get('zstd_level', 3)
+        self.writer = zstandard.ZstdCompressor(level=level).stream_writer(file, closefd=False)
+
+    def write(self, data: bytes) -> int:
+        return self.writer.write(data)
+
+    def close(self):
+        self.writer.close()
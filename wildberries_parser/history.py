@@ -0,0 +1,238 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+PROJECT_ROOT = Path(__file__).parent.parent
+PRICE_HISTORY_PATH = PROJECT_ROOT / 'scrapy_data' / 'price_history.sqlite3'
+
+CHUNK_POINTS = 512
+MIN_INTERVAL = 60  # повторная точка с теми же значениями раньше этого срока не пишется
+
+
+def _zigzag(n: int) -> int:
+    return (n << 1) ^ (n >> 63)
+
+
+def _unzigzag(n: int) -> int:
+    return (n >> 1) ^ -(n & 1)
+
+
+def encode_deltas(values: Iterable[int]) -> bytes:
+    """Разности соседних значений в zigzag-varint: неизменная цена занимает 1 байт"""
+    out = bytearray()
+    prev = 0
+    for value in values:
+        n = _zigzag(value - prev)
+        prev = value
+        while n >= 0x80:
+            out.append((n & 0x7F) | 0x80)
+            n >>= 7
+        out.append(n)
+    return bytes(out)
+
+
+def decode_deltas(data: bytes) -> List[int]:
+    values = []
+    prev = n = shift = 0
+    for byte in data:
+        n |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        prev += _unzigzag(n)
+        values.append(prev)
+        n = shift = 0
+    return values
+
+
+def pack_bits(flags: Iterable[bool]) -> bytes:
+    out = bytearray()
+    for i, flag in enumerate(flags):
+        if i % 8 == 0:
+            out.append(0)
+        if flag:
+            out[-1] |= 1 << (i % 8)
+    return bytes(out)
+
+
+def unpack_bits(data: bytes, count: int) -> List[bool]:
+    return [bool(data[i >> 3] >> (i & 7) & 1) for i in range(count)]
+
+
+def to_kopecks(value) -> int:
+    return int(round(float(value or 0) * 100))
+
+
+def _kopecks(product: Dict[str, Any], field: str) -> int:
+    """Точная цена в копейках из item, а для старых записей - из рублей"""
+    exact = product.get(f'{field}_kopecks')
+    return int(exact) if exact is not None else to_kopecks(product.get(field))
+
+
+class PriceHistory:
+    """Append-only история цен и наличия товаров в SQLite.
+
+    Точки одного товара хранятся блоками до CHUNK_POINTS штук: время, цены в копейках
+    и рейтинг (x100) - разностями в varint, наличие - битовой маской. Ключ блока
+    (product_id, start_ts), поэтому запрос по диапазону читает только нужные блоки.
+    """
+
+    FIELDS = ('ts', 'price', 'sale_price', 'rating')
+
+    def __init__(self, path=PRICE_HISTORY_PATH, chunk_points: int = CHUNK_POINTS,
+                 min_interval: float = MIN_INTERVAL):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.chunk_points = chunk_points
+        self.min_interval = min_interval
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        # last_* - последние значения блока, чтобы дописывать разность без декодирования
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS price_history ("
+            "product_id INTEGER NOT NULL, start_ts INTEGER NOT NULL, end_ts INTEGER NOT NULL, "
+            "points INTEGER NOT NULL, ts BLOB NOT NULL, price BLOB NOT NULL, "
+            "sale_price BLOB NOT NULL, rating BLOB NOT NULL, in_stock BLOB NOT NULL, "
+            "last_price INTEGER NOT NULL, last_sale_price INTEGER NOT NULL, "
+            "last_rating INTEGER NOT NULL, last_in_stock INTEGER NOT NULL, "
+            "PRIMARY KEY (product_id, start_ts)) WITHOUT ROWID"
+        )
+        conn.commit()
+
+    def append_many(self, products: Iterable[Dict[str, Any]], ts: Optional[float] = None) -> int:
+        """Добавляет по точке на товар одной транзакцией (цены из *_kopecks или из рублей)"""
+        ts = int(ts if ts is not None else time.time())
+        points = {}
+        for p in products:
+            if p.get('product_id') is None:
+                continue
+            points[int(p['product_id'])] = {
+                'ts': ts,
+                'price': _kopecks(p, 'price'),
+                'sale_price': _kopecks(p, 'sale_price'),
+                'rating': to_kopecks(p.get('rating')),
+                'in_stock': bool(p.get('in_stock')),
+            }
+        if not points:
+            return 0
+
+        appended = 0
+        conn = self._connect()
+        with self._write_lock, conn:
+            for product_id, point in points.items():
+                appended += self._append(conn, product_id, point)
+        return appended
+
+    def _append(self, conn: sqlite3.Connection, product_id: int, point: Dict[str, Any]) -> int:
+        row = conn.execute(
+            "SELECT * FROM price_history WHERE product_id = ? ORDER BY start_ts DESC LIMIT 1",
+            (product_id,)
+        ).fetchone()
+        values = (point['price'], point['sale_price'], point['rating'], int(point['in_stock']))
+
+        if row is not None:
+            if point['ts'] <= row['end_ts']:
+                return 0
+            last = (row['last_price'], row['last_sale_price'], row['last_rating'], row['last_in_stock'])
+            if values == last and point['ts'] - row['end_ts'] < self.min_interval:
+                return 0
+
+        if row is None or row['points'] >= self.chunk_points:
+            conn.execute(
+                "INSERT INTO price_history (product_id, start_ts, end_ts, points, ts, price, sale_price, "
+                "rating, in_stock, last_price, last_sale_price, last_rating, last_in_stock) "
+                "VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (product_id, point['ts'], point['ts'],
+                 *(encode_deltas([point[f]]) for f in self.FIELDS), pack_bits([point['in_stock']]), *values)
+            )
+            return 1
+
+        # Новая точка - это разность с последним значением блока, дописываем ее в конец
+        n = row['points']
+        deltas = (point['ts'] - row['end_ts'], point['price'] - row['last_price'],
+                  point['sale_price'] - row['last_sale_price'], point['rating'] - row['last_rating'])
+        in_stock = bytearray(row['in_stock'])
+        if n % 8 == 0:
+            in_stock.append(0)
+        if point['in_stock']:
+            in_stock[-1] |= 1 << (n % 8)
+        conn.execute(
+            "UPDATE price_history SET end_ts = ?, points = ?, ts = ?, price = ?, "
+            "sale_price = ?, rating = ?, in_stock = ?, last_price = ?, "
+            "last_sale_price = ?, last_rating = ?, last_in_stock = ? "
+            "WHERE product_id = ? AND start_ts = ?",
+            (point['ts'], n + 1, *(row[f] + encode_deltas([d]) for f, d in zip(self.FIELDS, deltas)),
+             bytes(in_stock), *values, product_id, row['start_ts'])
+        )
+        return 1
+
+    def _decode(self, row: sqlite3.Row) -> Dict[str, list]:
+        chunk = {f: decode_deltas(row[f]) for f in self.FIELDS}
+        chunk['in_stock'] = unpack_bits(row['in_stock'], row['points'])
+        return chunk
+
+    def get_range(self, product_id, start: Optional[float] = None, end: Optional[float] = None,
+                  limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Точки товара за [start, end] по возрастанию времени, цены в рублях"""
+        sql = "SELECT * FROM price_history WHERE product_id = ?"
+        params: list = [int(product_id)]
+        if start is not None:
+            sql += " AND end_ts >= ?"
+            params.append(int(start))
+        if end is not None:
+            sql += " AND start_ts <= ?"
+            params.append(int(end))
+        sql += " ORDER BY start_ts"
+
+        points = []
+        for row in self._connect().execute(sql, params):
+            chunk = self._decode(row)
+            for i, ts in enumerate(chunk['ts']):
+                if (start is not None and ts < start) or (end is not None and ts > end):
+                    continue
+                points.append({
+                    'ts': ts,
+                    'price': chunk['price'][i] / 100,
+                    'sale_price': chunk['sale_price'][i] / 100,
+                    'rating': chunk['rating'][i] / 100,
+                    'in_stock': chunk['in_stock'][i],
+                })
+        # При ограничении отдаем самые свежие точки
+        if limit is not None and len(points) > limit:
+            points = points[-limit:]
+        return points
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+_history: Optional[PriceHistory] = None
+_history_lock = threading.Lock()
+
+
+def get_price_history(path=None) -> PriceHistory:
+    global _history
+    if _history is None:
+        with _history_lock:
+            if _history is None:
+                _history = PriceHistory(path or PRICE_HISTORY_PATH)
+    return _history
@@ -1,37 +1,48 @@
 import scrapy
 
+# type у полей - тип колонки при типизированном экспорте (exporters.py), по умолчанию string
+
 class WildberriesProductItem(scrapy.Item):
-    product_id = scrapy.Field()
+    product_id = scrapy.Field(type='int')
     name = scrapy.Field()
     brand = scrapy.Field()
-    price = scrapy.Field()
-    sale_price = scrapy.Field()
-    rating = scrapy.Field()
-    reviews_count = scrapy.Field()
+    price = scrapy.Field(type='float')
+    sale_price = scrapy.Field(type='float')
+    price_kopecks = scrapy.Field(type='int')
+    sale_price_kopecks = scrapy.Field(type='int')
+    rating = scrapy.Field(type='float')
+    reviews_count = scrapy.Field(type='int')
     query = scrapy.Field()
     category = scrapy.Field()
     timestamp = scrapy.Field()
-    seller_id = scrapy.Field()
+    seller_id = scrapy.Field(type='int')
     seller_name = scrapy.Field()
-    in_stock = scrapy.Field()
+    in_stock = scrapy.Field(type='bool')
     url = scrapy.Field()
 
+class WildberriesProductTombstoneItem(scrapy.Item):
+    """Товар пропал из выдачи запроса (инкрементальный режим wildberries_v2)"""
+    product_id = scrapy.Field(type='int')
+    query = scrapy.Field()
+    category = scrapy.Field()
+    deleted = scrapy.Field(type='bool')
+
 class WildberriesProductDetailsItem(scrapy.Item):
-    product_id = scrapy.Field()
-    imt_id = scrapy.Field()
-    nm_id = scrapy.Field()
+    product_id = scrapy.Field(type='int')
+    imt_id = scrapy.Field(type='int')
+    nm_id = scrapy.Field(type='int')
     imt_name = scrapy.Field()
     slug = scrapy.Field()
     subj_name = scrapy.Field()
     subj_root_name = scrapy.Field()
     vendor_code = scrapy.Field()
     description = scrapy.Field()
-    options = scrapy.Field()
-    nm_colors_names = scrapy.Field()
-    colors = scrapy.Field()
-    contents = scrapy.Field()
-    full_colors = scrapy.Field()
-    selling = scrapy.Field()
+    options = scrapy.Field(type='json')
+    nm_colors_names = scrapy.Field(type='json')
+    colors = scrapy.Field(type='json')
+    contents = scrapy.Field(type='json')
+    full_colors = scrapy.Field(type='json')
+    selling = scrapy.Field(type='json')
 
 
 
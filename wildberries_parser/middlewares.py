@@ -1,18 +1,120 @@
+from email.utils import parsedate_to_datetime
 from scrapy import signals
 from scrapy.downloadermiddlewares.retry import RetryMiddleware
 from scrapy.utils.response import response_status_message
 import time
 import random
 
+
+PENALTY_MIN_DELAY = 0.001
+
+
+class HostThrottleState:
+    """Состояние ограничения скорости для одного download slot (хоста)"""
+
+    def __init__(self, base_delay, max_concurrency):
+        self.base_delay = base_delay
+        self.max_concurrency = max_concurrency
+        self.penalty_until = 0.0
+        self.successes = 0
+
+
 class CustomRetryMiddleware(RetryMiddleware):
+    """Retry с адаптивным ограничением скорости по хостам.
+
+    На 429/403 паузу получает только download slot этого хоста (без блокировки
+    reactor), а его concurrency уменьшается вдвое. Успешные ответы постепенно
+    возвращают concurrency к исходной (AIMD).
+    """
+
+    def __init__(self, settings, crawler=None):
+        super().__init__(settings)
+        self.crawler = crawler
+        self.fallback_delay = (
+            settings.getfloat('THROTTLE_FALLBACK_DELAY_MIN', 5),
+            settings.getfloat('THROTTLE_FALLBACK_DELAY_MAX', 15),
+        )
+        self.max_retry_after = settings.getfloat('THROTTLE_MAX_RETRY_AFTER', 120)
+        self.increase_every = settings.getint('THROTTLE_INCREASE_EVERY', 10)
+        self.hosts = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings, crawler)
+
     def process_response(self, request, response, spider):
         if response.status in [429, 403]:
-            retry_after = random.randint(5, 15)
-            spider.logger.warning(f"Rate limited or forbidden. Waiting {retry_after} seconds.")
-            time.sleep(retry_after)
+            retry_after = self._retry_after(response)
+            self._throttle(request, retry_after, spider)
             return self._retry(request, response.status, spider) or response
+
+        if response.status < 400:
+            self._recover(request)
         return super().process_response(request, response, spider)
 
+    def _retry_after(self, response):
+        """Задержка из заголовка Retry-After (секунды или HTTP-дата)"""
+        value = response.headers.get('Retry-After')
+        if value:
+            value = value.decode('latin-1').strip()
+            try:
+                return min(float(value), self.max_retry_after)
+            except ValueError:
+                pass
+            try:
+                return min(max(parsedate_to_datetime(value).timestamp() - time.time(), 0), self.max_retry_after)
+            except (TypeError, ValueError):
+                pass
+        return random.uniform(*self.fallback_delay)
+
+    def _slot(self, request):
+        if self.crawler is None or self.crawler.engine is None:
+            return None, None
+        downloader = self.crawler.engine.downloader
+        key = downloader.get_slot_key(request)
+        return key, downloader.slots.get(key)
+
+    def _state(self, key, slot):
+        state = self.hosts.get(key)
+        if state is None:
+            state = self.hosts[key] = HostThrottleState(slot.delay, slot.concurrency)
+        return state
+
+    def _throttle(self, request, retry_after, spider):
+        key, slot = self._slot(request)
+        if slot is None:
+            return
+        state = self._state(key, slot)
+        now = time.time()
+        state.penalty_until = max(state.penalty_until, now + retry_after)
+        state.successes = 0
+
+        # Загрузчик отправляет следующий запрос слота через delay после lastseen.
+        # lastseen = penalty_until держит слот до срока, а RANDOMIZE_DOWNLOAD_DELAY
+        # меняет только обычную задержку поверх него, а не саму паузу
+        slot.lastseen = state.penalty_until
+        if not slot.delay:
+            # При нулевой задержке загрузчик lastseen не проверяет
+            slot.delay = PENALTY_MIN_DELAY
+        slot.concurrency = max(1, slot.concurrency // 2)
+        spider.logger.warning(
+            f"Rate limited or forbidden on {key}. Pausing it for {retry_after:.1f} seconds, "
+            f"concurrency reduced to {slot.concurrency}."
+        )
+
+    def _recover(self, request):
+        key, slot = self._slot(request)
+        if slot is None or key not in self.hosts:
+            return
+        state = self.hosts[key]
+        if time.time() >= state.penalty_until and slot.delay != state.base_delay:
+            slot.delay = state.base_delay
+
+        state.successes += 1
+        if state.successes >= self.increase_every and slot.concurrency < state.max_concurrency:
+            slot.concurrency += 1
+            state.successes = 0
+
 class WildberriesParserDownloaderMiddleware:
     @classmethod
     def from_crawler(cls, crawler):
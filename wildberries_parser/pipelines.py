@@ -4,6 +4,11 @@ from pathlib import Path
 from scrapy.pipelines.images import ImagesPipeline
 from scrapy import Request
 from itemadapter import ItemAdapter
+from wildberries_parser.items import (
+    WildberriesProductItem, WildberriesProductDetailsItem, WildberriesProductTombstoneItem
+)
+from wildberries_parser.storage import get_product_store
+from wildberries_parser.history import get_price_history
 
 class WildberriesPipeline:
     def __init__(self):
@@ -13,6 +18,124 @@ class WildberriesPipeline:
     #     item['timestamp'] = datetime.utcnow().isoformat()
     #     return item
 
+class ProductStorePipeline:
+    """Сохраняет товары, их позиции в выдаче и характеристики в хранилище пачками.
+
+    При закрытии паука удаляет записи старше PRODUCT_STORE_RETENTION_DAYS.
+    """
+
+    def __init__(self, store_path=None, batch_size=100, retention_days=None):
+        self.logger = logging.getLogger(__name__)
+        self.store_path = store_path
+        self.batch_size = batch_size
+        self.retention_days = retention_days
+        self.buffer = []
+        self.search_buffer = []
+        self.details_buffer = []
+        self.removed_buffer = []
+        self.positions = {}
+        self.store = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            store_path=crawler.settings.get('PRODUCT_STORE_PATH'),
+            batch_size=crawler.settings.getint('PRODUCT_STORE_BATCH_SIZE', 100),
+            retention_days=crawler.settings.getfloat('PRODUCT_STORE_RETENTION_DAYS', 0) or None
+        )
+
+    def open_spider(self, spider):
+        self.store = get_product_store(self.store_path)
+
+    def process_item(self, item, spider):
+        if isinstance(item, WildberriesProductItem):
+            product = ItemAdapter(item).asdict()
+            # Позиция в выдаче - порядковый номер товара по своему запросу за этот запуск.
+            # Без категорий в аргументах паука category товара - его entity, а не часть запроса
+            category = product.get('category') if getattr(spider, 'categories', None) else ''
+            key = (product.get('query'), category)
+            self.positions[key] = self.positions.get(key, 0) + 1
+            self.buffer.append(product)
+            self.search_buffer.append({
+                'query': key[0], 'category': key[1],
+                'product_id': product.get('product_id'), 'position': self.positions[key],
+            })
+        elif isinstance(item, WildberriesProductDetailsItem):
+            self.details_buffer.append(ItemAdapter(item).asdict())
+        elif isinstance(item, WildberriesProductTombstoneItem):
+            self.removed_buffer.append(ItemAdapter(item).asdict())
+        if len(self.buffer) + len(self.details_buffer) + len(self.removed_buffer) >= self.batch_size:
+            self._flush()
+        return item
+
+    def close_spider(self, spider):
+        self._flush()
+        if self.retention_days:
+            try:
+                deleted = self.store.compact(self.retention_days)
+                if any(deleted.values()):
+                    self.logger.info(f"Removed expired crawl results: {deleted}")
+            except Exception as e:
+                self.logger.error(f"Failed to compact product store: {e}")
+
+    def _flush(self):
+        try:
+            if self.buffer:
+                self.store.upsert_many(self.buffer)
+                self.store.record_search_results(self.search_buffer)
+            if self.details_buffer:
+                self.store.upsert_details(self.details_buffer)
+            if self.removed_buffer:
+                self.store.remove_search_results(self.removed_buffer)
+        except Exception as e:
+            count = len(self.buffer) + len(self.details_buffer) + len(self.removed_buffer)
+            self.logger.error(f"Failed to store {count} items: {e}")
+        self.buffer = []
+        self.search_buffer = []
+        self.details_buffer = []
+        self.removed_buffer = []
+
+
+class PriceHistoryPipeline:
+    """Дописывает цены и наличие товаров из поиска в историю цен"""
+
+    def __init__(self, history_path=None, batch_size=100):
+        self.logger = logging.getLogger(__name__)
+        self.history_path = history_path
+        self.batch_size = batch_size
+        self.buffer = []
+        self.history = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            history_path=crawler.settings.get('PRICE_HISTORY_PATH'),
+            batch_size=crawler.settings.getint('PRODUCT_STORE_BATCH_SIZE', 100)
+        )
+
+    def open_spider(self, spider):
+        self.history = get_price_history(self.history_path)
+
+    def process_item(self, item, spider):
+        if isinstance(item, WildberriesProductItem):
+            self.buffer.append(ItemAdapter(item).asdict())
+            if len(self.buffer) >= self.batch_size:
+                self._flush()
+        return item
+
+    def close_spider(self, spider):
+        self._flush()
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        try:
+            self.history.append_many(self.buffer)
+        except Exception as e:
+            self.logger.error(f"Failed to append price history for {len(self.buffer)} products: {e}")
+        self.buffer = []
+
+
 class WildberriesPhotosPipeline(ImagesPipeline):
     def get_media_requests(self, item, info):
         if 'image_url' in item:
@@ -0,0 +1,107 @@
+"""Типизированный разбор ответа search.wb.ru.
+
+Декодируются только используемые поля товара, цены остаются целыми копейками.
+С msgspec ответ разбирается сразу в Struct-ы со схемой; без него (или если ответ
+не прошел проверку схемы) - обходом словарей в такие же объекты.
+"""
+import logging
+from dataclasses import dataclass
+from typing import List, Optional
+
+from wildberries_parser.serialization import loads
+
+try:
+    import msgspec
+except ImportError:  # без msgspec используется обход словарей
+    msgspec = None
+
+logger = logging.getLogger(__name__)
+
+
+if msgspec is not None:
+    class _Price(msgspec.Struct):
+        basic: int = 0
+        product: int = 0
+
+    class _Size(msgspec.Struct):
+        price: Optional[_Price] = None
+
+    class SearchProduct(msgspec.Struct):
+        id: int
+        name: Optional[str] = None
+        brand: Optional[str] = None
+        entity: Optional[str] = None
+        review_rating: Optional[float] = msgspec.field(default=0.0, name='reviewRating')
+        feedbacks: Optional[int] = 0
+        supplier_id: Optional[int] = msgspec.field(default=None, name='supplierId')
+        total_quantity: Optional[int] = msgspec.field(default=0, name='totalQuantity')
+        sizes: List[_Size] = []
+
+        @property
+        def price(self) -> int:
+            """Цена со скидкой в копейках"""
+            size_price = self.sizes[0].price if self.sizes else None
+            return size_price.product if size_price else 0
+
+        @property
+        def sale_price(self) -> int:
+            """Базовая цена в копейках"""
+            size_price = self.sizes[0].price if self.sizes else None
+            return size_price.basic if size_price else 0
+
+    class _Data(msgspec.Struct):
+        products: List[SearchProduct] = []
+
+    class _SearchResponse(msgspec.Struct):
+        data: Optional[_Data] = None
+
+    _decoder = msgspec.json.Decoder(_SearchResponse)
+
+else:
+    @dataclass(slots=True)
+    class SearchProduct:
+        id: int
+        name: Optional[str] = None
+        brand: Optional[str] = None
+        entity: Optional[str] = None
+        review_rating: Optional[float] = 0.0
+        feedbacks: Optional[int] = 0
+        supplier_id: Optional[int] = None
+        total_quantity: Optional[int] = 0
+        price: int = 0
+        sale_price: int = 0
+
+    _decoder = None
+
+
+def _from_dict(product: dict) -> SearchProduct:
+    size_price = ((product.get('sizes') or [{}])[0] or {}).get('price') or {}
+    values = dict(
+        id=int(product['id']),
+        name=product.get('name'),
+        brand=product.get('brand'),
+        entity=product.get('entity'),
+        review_rating=product.get('reviewRating', 0),
+        feedbacks=product.get('feedbacks', 0),
+        supplier_id=product.get('supplierId'),
+        total_quantity=product.get('totalQuantity', 0),
+    )
+    if msgspec is not None:
+        price = _Price(basic=int(size_price.get('basic', 0)), product=int(size_price.get('product', 0)))
+        return SearchProduct(sizes=[_Size(price=price)], **values)
+    return SearchProduct(price=int(size_price.get('product', 0)), sale_price=int(size_price.get('basic', 0)),
+                         **values)
+
+
+def decode_search_products(body: bytes) -> List[SearchProduct]:
+    """Товары страницы поиска; ValueError, если тело не JSON"""
+    if _decoder is not None:
+        try:
+            response = _decoder.decode(body)
+            return response.data.products if response.data else []
+        except msgspec.ValidationError as e:
+            logger.warning(f"Search response does not match schema ({e}), falling back to dict decoding")
+
+    data = loads(body)
+    products = (data.get('data') or {}).get('products') or []
+    return [_from_dict(product) for product in products if product.get('id') is not None]
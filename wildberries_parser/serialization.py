@@ -0,0 +1,75 @@
+"""Быстрая сериализация JSON с выбором реализации.
+
+Используется orjson, если он установлен, затем msgspec, иначе stdlib json.
+Реализацию можно задать явно переменной окружения WB_JSON_BACKEND (orjson, msgspec, json).
+"""
+import json
+import os
+from typing import Any, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def _default(value):
+    return str(value)
+
+
+def _stdlib_backend():
+    def loads(data: Union[bytes, str]) -> Any:
+        return json.loads(data)
+
+    def dumps(value: Any) -> bytes:
+        return json.dumps(value, ensure_ascii=False, default=_default).encode('utf-8')
+
+    return loads, dumps
+
+
+def _orjson_backend():
+    options = orjson.OPT_NON_STR_KEYS
+
+    def dumps(value: Any) -> bytes:
+        return orjson.dumps(value, default=_default, option=options)
+
+    return orjson.loads, dumps
+
+
+def _msgspec_backend():
+    encoder = msgspec.json.Encoder(enc_hook=_default)
+    decoder = msgspec.json.Decoder()
+
+    def loads(data: Union[bytes, str]) -> Any:
+        return decoder.decode(data)
+
+    return loads, encoder.encode
+
+
+BACKENDS = {
+    'orjson': (lambda: orjson is not None, _orjson_backend),
+    'msgspec': (lambda: msgspec is not None, _msgspec_backend),
+    'json': (lambda: True, _stdlib_backend),
+}
+
+
+def get_backend(name: Optional[str] = None) -> tuple:
+    """(имя, loads, dumps) выбранной или первой доступной реализации"""
+    names = [name] if name else list(BACKENDS)
+    for candidate in names:
+        available, factory = BACKENDS[candidate]
+        if available():
+            return (candidate, *factory())
+    raise RuntimeError(f"JSON backend {name} is not installed")
+
+
+BACKEND, loads, dumps = get_backend(os.environ.get('WB_JSON_BACKEND') or None)
+
+
+def dumps_str(value: Any) -> str:
+    return dumps(value).decode('utf-8')
@@ -30,6 +30,14 @@ FEEDS = {
     }
 }
 
+# Потоковые форматы лент, например для поиска:
+# FEEDS = {'scrapy_data/search.ndjson.zst': {'format': 'ndjson',
+#          'postprocessing': ['wildberries_parser.exporters.ZstdPlugin']}}
+# или {'scrapy_data/search.parquet': {'format': 'parquet'}}
+FEED_EXPORTERS = {
+    'ndjson': 'wildberries_parser.exporters.TypedJsonLinesItemExporter',
+    'parquet': 'wildberries_parser.exporters.ParquetItemExporter',
+}
 
 # Настройки логирования
 LOG_LEVEL = 'DEBUG'
@@ -43,12 +51,26 @@ DOWNLOADER_MIDDLEWARES = {
     'wildberries_parser.middlewares.WildberriesParserDownloaderMiddleware': 543,
 }
 
+# Адаптивное ограничение скорости при 429/403 (CustomRetryMiddleware)
+THROTTLE_FALLBACK_DELAY_MIN = 5  # пауза, если нет заголовка Retry-After
+THROTTLE_FALLBACK_DELAY_MAX = 15
+THROTTLE_MAX_RETRY_AFTER = 120
+THROTTLE_INCREASE_EVERY = 10  # успешных ответов на +1 к concurrency хоста
+
 # Pipelines
 ITEM_PIPELINES = {
     'wildberries_parser.pipelines.WildberriesPipeline': 300,
+    'wildberries_parser.pipelines.ProductStorePipeline': 350,
+    'wildberries_parser.pipelines.PriceHistoryPipeline': 360,
     'wildberries_parser.pipelines.WildberriesPhotosPipeline': 400,
 }
 
+# Индексированное хранилище товаров
+PRODUCT_STORE_PATH = str(PROJECT_ROOT / 'scrapy_data' / 'products.sqlite3')
+PRODUCT_STORE_BATCH_SIZE = 100
+PRODUCT_STORE_RETENTION_DAYS = 30  # 0 - хранить результаты краулов бессрочно
+PRICE_HISTORY_PATH = str(PROJECT_ROOT / 'scrapy_data' / 'price_history.sqlite3')
+
 # Настройки для изображений
 IMAGES_STORE = str(PROJECT_ROOT / 'scrapy_data' / 'photos')
 
@@ -1,6 +1,7 @@
 import scrapy
 from urllib.parse import quote, urlencode
 from wildberries_parser.items import WildberriesProductItem
+from wildberries_parser.serialization import loads
 
 
 class BaseSpider(scrapy.Spider):
@@ -72,7 +73,7 @@ class BaseSpider(scrapy.Spider):
         }
 
     def parse(self, response):
-        data = response.json()
+        data = loads(response.body)
         products = data.get('data', {}).get('products', [])
 
         if not products:
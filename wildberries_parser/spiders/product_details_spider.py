@@ -1,6 +1,8 @@
 import scrapy
 from urllib.parse import urljoin
+from wildberries_parser.baskets import BasketProbe, card_url
 from wildberries_parser.items import WildberriesProductDetailsItem
+from wildberries_parser.serialization import loads
 
 
 class WildberriesProductDetailsSpider(scrapy.Spider):
@@ -8,10 +10,11 @@ class WildberriesProductDetailsSpider(scrapy.Spider):
     custom_settings = {
         'ITEM_PIPELINES': {
             'wildberries_parser.pipelines.WildberriesPipeline': 300,
+            'wildberries_parser.pipelines.ProductStorePipeline': 350,
         },
         'DOWNLOAD_TIMEOUT': 30,
         'RETRY_TIMES': 5,
-        'RETRY_HTTP_CODES': [500, 502, 503, 504, 408, 429, 404],
+        'RETRY_HTTP_CODES': [500, 502, 503, 504, 408, 429],
         'CONCURRENT_REQUESTS': 16,  # Оптимальное количество параллельных запросов
         'DOWNLOAD_DELAY': 0.1,  # Небольшая задержка между запросами
     }
@@ -19,6 +22,7 @@ class WildberriesProductDetailsSpider(scrapy.Spider):
     def __init__(self, product_ids=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.product_ids = self._parse_product_ids(product_ids)
+        self.probes = {}
 
     def _parse_product_ids(self, product_ids):
         if not product_ids:
@@ -27,33 +31,39 @@ class WildberriesProductDetailsSpider(scrapy.Spider):
 
     def start_requests(self):
         for product_id in self.product_ids:
-            # Пробуем несколько basket-серверов
-            for basket_num in range(1, 11):
-                url = self._build_details_url(product_id, basket_num)
-                yield scrapy.Request(
-                    url=url,
-                    callback=self.parse_details,
-                    errback=self.errback,
-                    meta={
-                        'product_id': product_id,
-                        'basket_num': basket_num,
-                        'retry_times': 0,
-                        'handle_httpstatus_list': [404]
-                    },
-                    dont_filter=True
-                )
-
-    def _build_details_url(self, product_id, basket_num):
-        return f"https://basket-{basket_num:02d}.wbbasket.ru/vol{product_id[:4]}/part{product_id[:6]}/{product_id}/info/ru/card.json"
+            # Начинаем с наиболее вероятной корзины, остальные перебираем только при 404
+            probe = self.probes[product_id] = BasketProbe(product_id)
+            yield from self._basket_requests(product_id, probe.next_batch())
+
+    def _basket_requests(self, product_id, baskets):
+        for basket_num in baskets:
+            yield scrapy.Request(
+                url=card_url(product_id, basket_num),
+                callback=self.parse_details,
+                errback=self.errback,
+                meta={
+                    'product_id': product_id,
+                    'basket_num': basket_num,
+                    'handle_httpstatus_list': [404]
+                },
+                dont_filter=True
+            )
 
     def parse_details(self, response):
         product_id = response.meta['product_id']
+        probe = self.probes[product_id]
         if response.status == 404:
-            self.logger.warning(f"Product {product_id} not found on basket-{response.meta['basket_num']}")
+            self.logger.debug(f"Product {product_id} not found on basket-{response.meta['basket_num']:02d}")
+            yield from self._basket_requests(product_id, probe.failed())
+            if probe.exhausted:
+                self.logger.warning(f"Product {product_id} not found on any basket")
+            return
+
+        if not probe.found(response.meta['basket_num']):
             return
 
         try:
-            data = response.json()
+            data = loads(response.body)
             if not data:
                 raise ValueError("Empty response data")
 
@@ -63,6 +73,12 @@ class WildberriesProductDetailsSpider(scrapy.Spider):
         except Exception as e:
             self.logger.error(f"Failed to parse details for {product_id}: {str(e)}")
 
+    def errback(self, failure):
+        request = failure.request
+        product_id = request.meta['product_id']
+        self.logger.warning(f"Request to basket-{request.meta['basket_num']:02d} failed for {product_id}: {failure.value}")
+        yield from self._basket_requests(product_id, self.probes[product_id].failed())
+
     def _create_item(self, product_id, data):
         item = WildberriesProductDetailsItem()
         item['product_id'] = product_id
@@ -1,5 +1,9 @@
 import scrapy
 from scrapy import Request
+from wildberries_parser.baskets import (
+    MAX_PHOTOS, PHOTO_SIZE, BasketProbe, card_url, photo_count_from_card, photo_items, photo_url
+)
+from wildberries_parser.serialization import loads
 
 
 class WildberriesProductPhotosSpider(scrapy.Spider):
@@ -26,66 +30,82 @@ class WildberriesProductPhotosSpider(scrapy.Spider):
     def __init__(self, product_id=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.product_id = str(product_id).strip()
-        self.image_sizes = ['c516x688']
+        self.image_size = PHOTO_SIZE
         self.photo_count = 0
-        self.active_basket = None  # Текущая активная корзина с найденными фото
+        self.active_basket = None  # Корзина, в которой лежит товар
+        self.probe = None
 
     def start_requests(self):
-        # Сначала проверяем первые фото во всех корзинах
-        for basket_num in range(1, 30):
-            base_url = self._generate_base_url(basket_num)
-            url = f"{base_url}/{self.image_sizes[0]}/1.webp"
+        # Число фото берем из card.json: ищем его в наиболее вероятной корзине,
+        # остальные перебираем только при неудаче. Сами изображения не скачиваются
+        self.probe = BasketProbe(self.product_id)
+        yield from self._card_requests(self.probe.next_batch())
+
+    def _card_requests(self, baskets):
+        for basket_num in baskets:
             yield Request(
-                url=url,
-                callback=self.parse_first_photo,
-                meta={'basket_num': basket_num, 'base_url': base_url},
+                url=card_url(self.product_id, basket_num),
+                callback=self.parse_card,
+                errback=self.card_failed,
+                meta={'basket_num': basket_num, 'handle_httpstatus_list': [404]},
                 dont_filter=True
             )
 
-    def _generate_base_url(self, basket_num):
-        return f"https://basket-{basket_num:02d}.wbbasket.ru/vol{self.product_id[:4]}/part{self.product_id[:6]}/{self.product_id}/images"
+    def card_failed(self, failure):
+        self.logger.debug(f"card.json request failed in basket {failure.request.meta['basket_num']}")
+        yield from self._card_requests(self.probe.failed())
 
-    def parse_first_photo(self, response):
+    def parse_card(self, response):
+        basket_num = response.meta['basket_num']
         if response.status != 200:
-            self.logger.debug(f"First photo not found in basket {response.meta['basket_num']}")
+            self.logger.debug(f"card.json not found in basket {basket_num}")
+            yield from self._card_requests(self.probe.failed())
+            if self.probe.exhausted:
+                self.logger.warning(f"Product {self.product_id} not found on any basket")
             return
 
-        basket_num = response.meta['basket_num']
-        base_url = response.meta['base_url']
+        if not self.probe.found(basket_num):
+            return
 
-        # Запоминаем активную корзину
         self.active_basket = basket_num
         self.logger.info(f"Found active basket: {basket_num}")
 
-        # Обрабатываем найденное первое фото
-        yield self._create_photo_item(response.url, 1, basket_num)
+        try:
+            count = photo_count_from_card(loads(response.body))
+        except ValueError:
+            count = None
 
-        # Запускаем проверку следующих фото в этой корзине
-        for img_num in range(2, 11):  # Проверяем фото с 2 по 10
-            next_url = f"{base_url}/{self.image_sizes[0]}/{img_num}.webp"
+        if count is not None:
+            for item in photo_items(self.product_id, basket_num, count, self.image_size):
+                yield self._count_photo(item)
+            return
+
+        # В карточке нет числа фото - проверяем наличие HEAD-запросами без скачивания
+        for img_num in range(1, MAX_PHOTOS + 1):
             yield Request(
-                url=next_url,
-                callback=self.parse_subsequent_photo,
-                meta={'img_num': img_num, 'basket_num': basket_num},
+                url=photo_url(self.product_id, basket_num, img_num, self.image_size),
+                method='HEAD',
+                callback=self.parse_photo_head,
+                meta={'img_num': img_num, 'basket_num': basket_num, 'handle_httpstatus_list': [404]},
                 dont_filter=True
             )
 
-    def parse_subsequent_photo(self, response):
+    def parse_photo_head(self, response):
         if response.status != 200:
             self.logger.debug(f"Photo {response.meta['img_num']} not found in basket {response.meta['basket_num']}")
             return
 
-        yield self._create_photo_item(response.url, response.meta['img_num'], response.meta['basket_num'])
+        yield self._count_photo({
+            'product_id': self.product_id,
+            'image_url': response.url,
+            'image_num': response.meta['img_num'],
+            'basket_num': response.meta['basket_num']
+        })
 
-    def _create_photo_item(self, url, img_num, basket_num):
+    def _count_photo(self, item):
         self.photo_count += 1
-        return {
-            'product_id': self.product_id,
-            'image_url': url,
-            'image_num': img_num,
-            'basket_num': basket_num
-        }
+        return item
 
     def closed(self, reason):
         if reason == 'finished':
-            self.logger.info(f"Found {self.photo_count} photos for product {self.product_id}")
\ No newline at end of file
+            self.logger.info(f"Found {self.photo_count} photos for product {self.product_id}")
@@ -1,10 +1,17 @@
+import hashlib
 import scrapy
 from scrapy import signals
+from scrapy.exceptions import DontCloseSpider
 from scrapy.utils.project import get_project_settings
 from urllib.parse import quote, urlencode
 import re
-from wildberries_parser.items import WildberriesProductItem
+from wildberries_parser.items import WildberriesProductItem, WildberriesProductTombstoneItem
+from wildberries_parser.search_api import decode_search_products
 from wildberries_parser.spiders.base_spider import BaseSpider
+from wildberries_parser.storage import get_product_store
+
+PAGE_SIZE = 100  # товаров на полной странице поиска WB
+FINGERPRINT_FIELDS = ('price', 'sale_price', 'in_stock', 'rating', 'reviews_count')
 
 
 class WildberriesSpider(BaseSpider):
@@ -18,22 +25,34 @@ class WildberriesSpider(BaseSpider):
     }
 
     def __init__(self, queries=None, categories=None, pages=1, limit=100,
-                 min_price=None, max_price=None, *args, **kwargs):
+                 min_price=None, max_price=None, delta=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.wb_api_url = "https://search.wb.ru/exactmatch/ru/common/v13/search"
         self.queries = self._parse_input(queries)
         self.categories = self._parse_input(categories)
-        self.pages = int(pages)
-        self.limit = int(limit)
+        self.pages = int(pages)    # максимум страниц на запрос
+        self.limit = int(limit)    # максимум товаров на запрос по всем страницам и категориям
+        self.taken = {}            # query -> уже отданные product_id
         self.settings = get_project_settings()
 
         # Обработка ценового диапазона
         self.price_range = self._validate_price_range(min_price, max_price)
 
+        # Инкрементальный режим: отдаются только новые и изменившиеся товары,
+        # а для пропавших из выдачи - tombstone-записи
+        self.delta = str(delta).lower() in ('1', 'true', 'yes') if delta is not None else False
+        self.snapshots = {}      # scope -> {product_id: fingerprint} прошлого краула
+        self.seen = {}           # scope -> {product_id: fingerprint} текущего краула
+        self.unchanged = {}      # (query, category) -> product_id, не отданные как неизменные
+        self.failed_scopes = set()
+        self.tombstones_scheduled = False
+
     def _parse_input(self, input_str):
         if not input_str:
             return []
-        return [item.strip() for item in input_str.split(',') if item.strip()]
+        # Из API список можно передать как есть: в запросах бывают запятые
+        items = input_str if isinstance(input_str, (list, tuple)) else input_str.split(',')
+        return [item.strip() for item in items if item.strip()]
 
     def _validate_price_range(self, min_price, max_price):
         """Валидация и преобразование ценового диапазона"""
@@ -57,15 +76,16 @@ class WildberriesSpider(BaseSpider):
             self.logger.error("No queries provided for spider!")
             return
 
+        # Следующая страница запрашивается только после полной предыдущей,
+        # поэтому на каждый запрос в работе не больше одной страницы
         for query in self.queries:
             categories = self.categories if self.categories else [None]
             for category in categories:
-                for page in range(1, self.pages + 1):
-                    yield self.make_wb_request(
-                        query=query,
-                        category=category,
-                        page=page
-                    )
+                yield self.make_wb_request(
+                    query=query,
+                    category=category,
+                    page=1
+                )
 
     def make_wb_request(self, query, category=None, page=1):
         """Формирование запроса к API Wildberries с учетом всех параметров"""
@@ -108,16 +128,40 @@ class WildberriesSpider(BaseSpider):
             meta={
                 'query': query,
                 'category': category,
-                'page': page
+                'page': page,
+                'scope': self.delta_scope(query, category)
             },
             dont_filter=True
         )
 
+    def delta_scope(self, query, category=None):
+        """Ключ снимка: набор товаров зависит от всех параметров поиска"""
+        return '|'.join(str(v) for v in (query, category or '', self.price_range or '', self.pages, self.limit))
+
+    @staticmethod
+    def fingerprint(item):
+        raw = '|'.join(str(item.get(f)) for f in FINGERPRINT_FIELDS)
+        return hashlib.blake2b(raw.encode(), digest_size=8).hexdigest()
+
+    def is_changed(self, item, meta):
+        """Запоминает отпечаток товара; True, если товар новый или изменился"""
+        scope = meta['scope']
+        product_id = item.get('product_id')
+        seen = self.seen.setdefault(scope, {})
+        if product_id is None or product_id in seen:
+            return product_id is None
+        if scope not in self.snapshots:
+            self.snapshots[scope] = get_product_store().get_fingerprints(scope)
+        seen[product_id] = fp = self.fingerprint(item)
+        if self.snapshots[scope].get(product_id) == fp:
+            self.unchanged.setdefault((meta['query'], meta.get('category')), []).append(product_id)
+            return False
+        return True
+
     def parse_api_response(self, response):
         """Обработка ответа от API Wildberries"""
         try:
-            data = response.json()
-            products = data.get('data', {}).get('products', [])
+            products = decode_search_products(response.body)
 
             if not products:
                 self.logger.warning(
@@ -126,45 +170,92 @@ class WildberriesSpider(BaseSpider):
                 )
                 return
 
-            for product in products[:self.limit]:
-                yield self.extract_product_data(
-                    product,
-                    response.meta['query'],
-                    response.meta.get('category')
-                )
+            query, category, page = response.meta['query'], response.meta.get('category'), response.meta['page']
+            # Квота общая для всех категорий запроса: limit - число товаров на запрос
+            taken = self.taken.setdefault(query, set())
+            for product in products:
+                if len(taken) >= self.limit:
+                    break
+                # WB иногда повторяет товар на соседних страницах и в разных категориях
+                if product.id in taken:
+                    continue
+                taken.add(product.id)
+                item = self.extract_product_data(product, query, category)
+                if not self.delta or self.is_changed(item, response.meta):
+                    yield item
+
+            if len(products) >= PAGE_SIZE and len(taken) < self.limit and page < self.pages:
+                yield self.make_wb_request(query=query, category=category, page=page + 1)
 
         except ValueError as e:
             self.logger.error(f"Invalid JSON: {e}. Response: {response.text[:200]}")
 
-    def extract_product_data(self, product_data, query, category=None):
-        """Извлечение данных о продукте из ответа API"""
-        size_data = product_data.get('sizes', [{}])[0]
-        price_data = size_data.get('price', {})
-
+    def extract_product_data(self, product, query, category=None):
+        """Item из декодированного товара (SearchProduct); точные цены - в копейках"""
         return WildberriesProductItem(
-            product_id=product_data.get('id'),
-            name=product_data.get('name'),
-            brand=product_data.get('brand'),
-            price=float(price_data.get('product', 0)) / 100,
-            sale_price=float(price_data.get('basic', 0)) / 100,
-            rating=product_data.get('reviewRating', 0),
-            reviews_count=product_data.get('feedbacks', 0),
+            product_id=product.id,
+            name=product.name,
+            brand=product.brand,
+            price=product.price / 100,
+            sale_price=product.sale_price / 100,
+            price_kopecks=product.price,
+            sale_price_kopecks=product.sale_price,
+            rating=product.review_rating or 0,
+            reviews_count=product.feedbacks or 0,
             query=query,
-            category=category or product_data.get('entity'),
-            seller_id=product_data.get('supplierId'),
-            in_stock=product_data.get('totalQuantity', 0) > 0,
-            url=f"https://www.wildberries.ru/catalog/{product_data['id']}/detail.aspx"
+            category=category or product.entity,
+            seller_id=product.supplier_id,
+            in_stock=(product.total_quantity or 0) > 0,
+            url=f"https://www.wildberries.ru/catalog/{product.id}/detail.aspx"
         )
 
     def handle_error(self, failure):
         """Обработка ошибок запросов"""
         self.logger.error(f"Request failed: {failure.value}")
+        # Без полной выдачи нельзя понять, какие товары пропали
+        scope = failure.request.meta.get('scope') if hasattr(failure, 'request') else None
+        if scope:
+            self.failed_scopes.add(scope)
+
+    def emit_tombstones(self, response):
+        """Товары из прошлого снимка, которых нет в текущей выдаче"""
+        for query in self.queries:
+            for category in (self.categories or [None]):
+                scope = self.delta_scope(query, category)
+                if scope in self.failed_scopes:
+                    continue
+                if scope not in self.snapshots:
+                    self.snapshots[scope] = get_product_store().get_fingerprints(scope)
+                vanished = self.snapshots[scope].keys() - self.seen.get(scope, {}).keys()
+                for product_id in vanished:
+                    yield WildberriesProductTombstoneItem(
+                        product_id=product_id, query=query, category=category, deleted=True
+                    )
 
     @classmethod
     def from_crawler(cls, crawler, *args, **kwargs):
         spider = super().from_crawler(crawler, *args, **kwargs)
+        crawler.signals.connect(spider.spider_idle, signal=signals.spider_idle)
         crawler.signals.connect(spider.spider_closed, signal=signals.spider_closed)
         return spider
 
-    def spider_closed(self, spider):
-        self.logger.info(f"Spider closed. Processed queries: {self.queries}")
\ No newline at end of file
+    def spider_idle(self, spider):
+        # Выдача собрана полностью - последним запросом отдаем tombstone-записи
+        if not self.delta or self.tombstones_scheduled:
+            return
+        self.tombstones_scheduled = True
+        self.crawler.engine.crawl(scrapy.Request('data:,', callback=self.emit_tombstones, dont_filter=True))
+        raise DontCloseSpider
+
+    def spider_closed(self, spider, reason):
+        self.logger.info(f"Spider closed. Processed queries: {self.queries}")
+        # Прерванный краул снимок не обновляет: изменения будут отданы повторно
+        if self.delta and reason == 'finished':
+            store = get_product_store()
+            for scope in self.seen.keys() | self.snapshots.keys():
+                fingerprints = self.seen.get(scope, {})
+                removed = () if scope in self.failed_scopes else (
+                    self.snapshots.get(scope, {}).keys() - fingerprints.keys())
+                store.save_fingerprints(scope, fingerprints, removed)
+            for (query, category), product_ids in self.unchanged.items():
+                store.touch_search_results(query, category, product_ids)
\ No newline at end of file
@@ -0,0 +1,267 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from wildberries_parser.serialization import dumps_str, loads
+
+PROJECT_ROOT = Path(__file__).parent.parent
+PRODUCT_STORE_PATH = PROJECT_ROOT / 'scrapy_data' / 'products.sqlite3'
+
+PRODUCT_COLUMNS = ['name', 'brand', 'price', 'sale_price', 'rating', 'reviews_count', 'in_stock']
+RETENTION_DAYS = 30
+
+
+class ProductStore:
+    """Индексированное хранилище результатов краулов в SQLite (WAL).
+
+    products - последняя версия товара из поиска, search_results - какие товары
+    и когда находились по запросу, product_details - характеристики из card.json.
+    Поиск по product_id идет по первичному ключу, а WAL позволяет паукам
+    писать, не блокируя чтение из API. Соединение создается на каждый поток.
+    """
+
+    def __init__(self, path=PRODUCT_STORE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            # Действует только для новой базы: освобожденные страницы можно вернуть ФС
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS products ("
+            "product_id INTEGER PRIMARY KEY, "
+            "name TEXT, brand TEXT, price REAL, sale_price REAL, "
+            "rating REAL, reviews_count INTEGER, in_stock INTEGER, "
+            "data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_products_updated ON products (updated_at)")
+        # category хранится как '' вместо NULL, иначе ON CONFLICT не срабатывает
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_results ("
+            "query TEXT NOT NULL, category TEXT NOT NULL DEFAULT '', "
+            "product_id INTEGER NOT NULL, position INTEGER, crawled_at REAL NOT NULL, "
+            "PRIMARY KEY (query, category, product_id))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_search_results_product ON search_results (product_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_search_results_crawled ON search_results (crawled_at)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS product_details ("
+            "product_id INTEGER PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_product_details_updated ON product_details (updated_at)")
+        # Отпечатки товаров последнего краула для инкрементального режима, scope - параметры поиска
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS crawl_fingerprints ("
+            "scope TEXT NOT NULL, product_id INTEGER NOT NULL, fingerprint TEXT NOT NULL, "
+            "seen_at REAL NOT NULL, PRIMARY KEY (scope, product_id)) WITHOUT ROWID"
+        )
+        # compact() удаляет устаревшие отпечатки по seen_at
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_crawl_fingerprints_seen ON crawl_fingerprints (seen_at)")
+        conn.commit()
+
+    def upsert_many(self, products: Iterable[Dict[str, Any]]) -> int:
+        """Вставляет или обновляет товары одной транзакцией"""
+        now = time.time()
+        rows = [
+            (int(p['product_id']), *(p.get(c) for c in PRODUCT_COLUMNS),
+             dumps_str(p), now)
+            for p in products if p.get('product_id') is not None
+        ]
+        if not rows:
+            return 0
+
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT INTO products (product_id, name, brand, price, sale_price, rating, "
+                "reviews_count, in_stock, data, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(product_id) DO UPDATE SET "
+                "name=excluded.name, brand=excluded.brand, price=excluded.price, "
+                "sale_price=excluded.sale_price, rating=excluded.rating, "
+                "reviews_count=excluded.reviews_count, in_stock=excluded.in_stock, "
+                "data=excluded.data, updated_at=excluded.updated_at",
+                rows
+            )
+        return len(rows)
+
+    def record_search_results(self, products: Iterable[Dict[str, Any]]) -> int:
+        """Запоминает, по каким запросам и когда найдены товары"""
+        now = time.time()
+        rows = [
+            (p.get('query') or '', p.get('category') or '', int(p['product_id']), p.get('position'), now)
+            for p in products
+            if p.get('product_id') is not None and (p.get('query') or p.get('category'))
+        ]
+        if not rows:
+            return 0
+
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT INTO search_results (query, category, product_id, position, crawled_at) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT(query, category, product_id) DO UPDATE SET "
+                "position=excluded.position, crawled_at=excluded.crawled_at",
+                rows
+            )
+        return len(rows)
+
+    def remove_search_results(self, products: Iterable[Dict[str, Any]]) -> int:
+        """Убирает товары из выдачи запроса; без категории - из всех категорий запроса"""
+        rows = [
+            (p.get('query') or '', int(p['product_id']), p.get('category') or '')
+            for p in products if p.get('product_id') is not None
+        ]
+        if not rows:
+            return 0
+
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "DELETE FROM search_results WHERE query = ?1 AND product_id = ?2 "
+                "AND (category = ?3 OR ?3 = '')",
+                rows
+            )
+        return len(rows)
+
+    def touch_search_results(self, query: str, category: Optional[str], product_ids: Iterable[int]):
+        """Продлевает срок хранения товаров, которые не изменились (инкрементальный краул)"""
+        now = time.time()
+        ids = [int(product_id) for product_id in product_ids]
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "UPDATE search_results SET crawled_at = ?1 WHERE query = ?2 AND product_id = ?3 "
+                "AND (category = ?4 OR ?4 = '')",
+                [(now, query or '', product_id, category or '') for product_id in ids]
+            )
+            conn.executemany(
+                "UPDATE products SET updated_at = ? WHERE product_id = ?", [(now, product_id) for product_id in ids]
+            )
+
+    def get_fingerprints(self, scope: str) -> Dict[int, str]:
+        return dict(self._connect().execute(
+            "SELECT product_id, fingerprint FROM crawl_fingerprints WHERE scope = ?", (scope,)
+        ))
+
+    def save_fingerprints(self, scope: str, fingerprints: Dict[int, str], removed: Iterable[int] = ()):
+        """Обновляет снимок scope: пишет отпечатки увиденных товаров и удаляет исчезнувшие"""
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT INTO crawl_fingerprints (scope, product_id, fingerprint, seen_at) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT(scope, product_id) DO UPDATE SET "
+                "fingerprint=excluded.fingerprint, seen_at=excluded.seen_at",
+                [(scope, product_id, fp, now) for product_id, fp in fingerprints.items()]
+            )
+            conn.executemany(
+                "DELETE FROM crawl_fingerprints WHERE scope = ? AND product_id = ?",
+                [(scope, product_id) for product_id in removed]
+            )
+
+    def upsert_details(self, details: Iterable[Dict[str, Any]]) -> int:
+        now = time.time()
+        rows = [
+            (int(d['product_id']), dumps_str(d), now)
+            for d in details if d.get('product_id') is not None
+        ]
+        if not rows:
+            return 0
+
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT INTO product_details (product_id, data, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(product_id) DO UPDATE SET data=excluded.data, updated_at=excluded.updated_at",
+                rows
+            )
+        return len(rows)
+
+    def get(self, product_id) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT data FROM products WHERE product_id = ?", (int(product_id),)
+        ).fetchone()
+        return loads(row['data']) if row else None
+
+    def get_many(self, product_ids: Iterable) -> List[Dict[str, Any]]:
+        """Товары по списку id в том же порядке; отсутствующих (удаленных compact) нет в ответе"""
+        ids = [int(product_id) for product_id in product_ids]
+        data = {}
+        conn = self._connect()
+        for start in range(0, len(ids), 500):  # лимит параметров SQLite
+            chunk = ids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            for row in conn.execute(
+                f"SELECT product_id, data FROM products WHERE product_id IN ({placeholders})", chunk
+            ):
+                data[row['product_id']] = row['data']
+        return [loads(data[product_id]) for product_id in ids if product_id in data]
+
+    def get_details(self, product_id) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT data FROM product_details WHERE product_id = ?", (int(product_id),)
+        ).fetchone()
+        return loads(row['data']) if row else None
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def compact(self, max_age_days: float = RETENTION_DAYS) -> Dict[str, int]:
+        """Удаляет записи, не обновлявшиеся дольше max_age_days, и возвращает место ФС"""
+        cutoff = time.time() - max_age_days * 86400
+        conn = self._connect()
+        with conn:
+            deleted = {
+                table: conn.execute(f"DELETE FROM {table} WHERE {column} < ?", (cutoff,)).rowcount
+                for table, column in (('search_results', 'crawled_at'),
+                                      ('products', 'updated_at'),
+                                      ('product_details', 'updated_at'),
+                                      ('crawl_fingerprints', 'seen_at'))
+            }
+        if any(deleted.values()):
+            conn.execute("PRAGMA incremental_vacuum")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return deleted
+
+    def import_json_file(self, path) -> int:
+        """Одноразовый импорт старого экспорта Scrapy (JSON-массив товаров)"""
+        path = Path(path)
+        if not path.exists():
+            return 0
+        with open(path, 'r', encoding='utf-8') as f:
+            products = loads(f.read())
+        return self.upsert_many(p for p in products if isinstance(p, dict))
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+_store: Optional[ProductStore] = None
+_store_lock = threading.Lock()
+
+
+def get_product_store(path=None) -> ProductStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ProductStore(path or PRODUCT_STORE_PATH)
+    return _store
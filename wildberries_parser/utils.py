@@ -1,12 +1,16 @@
 import json
 from pathlib import Path
-from typing import Dict, List, Union
+from typing import Dict, Iterable, List, Union
+
+def parse_queries(lines: Iterable[str]) -> List[str]:
+    """Непустые запросы без повторов в исходном порядке"""
+    return list(dict.fromkeys(line.strip() for line in lines if line.strip()))
 
 def load_queries_from_file(filepath: str) -> List[str]:
     """Загрузка поисковых запросов из файла"""
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
-            return [line.strip() for line in f if line.strip()]
+            return parse_queries(f)
     except FileNotFoundError:
         print(f"File not found: {filepath}")
         return []